@@ -0,0 +1,80 @@
+import csv
+import os
+import random
+import sqlite3
+from csv_import import import_csv
+
+# Набор столбцов синтетических таблиц: узкая - несколько столбцов разных типов, широкая - много столбцов
+SHAPES = {'narrow': 6, 'wide': 40}
+
+# Повторяющиеся строковые значения (как категории в реальных таблицах)
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta', 'iota', 'kappa']
+
+
+def titles(shape: str) -> list[str]:
+    return [f'c{i}' for i in range(SHAPES[shape])]
+
+
+def row_values(rnd: random.Random, row: int, width: int) -> list:
+    """
+    Один ряд: по кругу идут целое, дробное, категория, текст и пустая ячейка (в 5% рядов)
+    """
+
+    values = list()
+    for col in range(width):
+        kind = col % 4
+        if col == 0:
+            values.append(row)
+        elif kind == 1:
+            values.append('' if rnd.random() < 0.05 else round(rnd.uniform(-1000, 1000), 3))
+        elif kind == 2:
+            values.append(rnd.choice(WORDS))
+        elif kind == 3:
+            values.append(f'text {rnd.getrandbits(32):08x}')
+        else:
+            values.append(rnd.randint(-10 ** 6, 10 ** 6))
+    return values
+
+
+def csv_fixture(folder: str, shape: str, rows: int, seed: int) -> str:
+    """
+    Создаёт csv файл (если его ещё нет) с rows рядами.
+    Содержимое зависит только от shape, rows и seed, поэтому замеры разных версий сравнимы
+    :return: Путь к файлу
+    """
+
+    path = os.path.join(folder, f'{shape}_{rows}_{seed}.csv')
+    if os.path.exists(path):
+        return path
+    rnd = random.Random(seed)
+    width = SHAPES[shape]
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(titles(shape))
+        for row in range(rows):
+            writer.writerow(row_values(rnd, row, width))
+    os.replace(tmp, path)
+    return path
+
+
+def db_fixture(folder: str, shape: str, rows: int, seed: int) -> str:
+    """
+    Создаёт БД SQLite (если её ещё нет) с таблицей shape из того же csv файла
+    :return: Путь к файлу БД
+    """
+
+    path = os.path.join(folder, f'{shape}_{rows}_{seed}.sqlite')
+    if os.path.exists(path):
+        return path
+    source = csv_fixture(folder, shape, rows, seed)
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = sqlite3.connect(tmp)
+    try:
+        import_csv(con, source, shape, 'utf-8', ',')
+    finally:
+        con.close()
+    os.replace(tmp, path)
+    return path
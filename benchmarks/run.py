@@ -0,0 +1,365 @@
+"""
+Замеры скорости основных операций TIPY на синтетических таблицах.
+
+Запуск из корня проекта:
+    python -m benchmarks.run --sizes 10000 100000 --out report.json
+    python -m benchmarks.run --compare old.json --out new.json
+
+Окна создаются с QT_QPA_PLATFORM=offscreen, поэтому экран не нужен.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.fixtures import SHAPES, csv_fixture, db_fixture
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+# Размеры таблиц по умолчанию и полный набор (--full)
+DEFAULT_SIZES = [10_000, 100_000]
+FULL_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Сколько ячеек изменяется при замере db_table_cell_changed
+CELL_EDITS = 1000
+
+# Подстрока для замера поиска: начало значения текстового столбца синтетических таблиц
+SEARCH_TEXT = 'text 1a2b'
+
+# Сколько секунд ждать окончания фоновой операции
+WAIT_TIMEOUT = 3600
+
+# Сколько раз запускается программа при замере времени запуска (берётся лучший результат)
+STARTUP_RUNS = 3
+
+# Запускается в отдельном процессе: импорт программы, главное окно и EntryForm.
+# Выводит время от загрузки profiling до показа окон и загружен ли seaborn
+STARTUP_SCRIPT = '''
+import sys, time
+import project548
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+window = project548.TableInspector()
+window.show()
+app.processEvents()
+print(time.perf_counter() - project548.profiling.STARTED, 'seaborn' in sys.modules)
+'''
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def rss_mb() -> float | None:
+    """
+    Пиковый объём памяти процесса с начала работы, МБ
+    """
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS - в байтах
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_version() -> str | None:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Bench:
+    """
+    Запускает замеры и копит их результаты.
+
+    Атрибуты
+    ------
+    app : QApplication
+        Приложение Qt, в котором работают окна.
+    trace_memory : bool
+        True, если пик памяти каждой операции меряется через tracemalloc (замедляет замеры).
+    results : list
+        Результаты замеров.
+
+    Методы
+    ------
+    measure() :
+        Замеряет одну операцию.
+    wait() :
+        Обрабатывает события Qt, пока не выполнится условие.
+    """
+
+    def __init__(self, app, trace_memory: bool):
+        self.app = app
+        self.trace_memory = trace_memory
+        self.results = list()
+
+    def wait(self, done):
+        start = time.perf_counter()
+        while not done():
+            if time.perf_counter() - start > WAIT_TIMEOUT:
+                raise BenchmarkError('Операция не закончилась вовремя')
+            self.app.processEvents()
+
+    def measure(self, op: str, fixture: str, rows: int, action, done=None):
+        """
+        :param action: Замеряемая операция
+        :param done: Условие окончания фоновой части операции (события Qt обрабатываются, пока оно не выполнится)
+        """
+
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        action()
+        if done is not None:
+            self.wait(done)
+        elapsed = time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            peak = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+            tracemalloc.stop()
+        result = {'op': op, 'fixture': fixture, 'rows': rows, 'seconds': round(elapsed, 4),
+                  'peak_mb': peak, 'rss_mb': rss_mb()}
+        self.results.append(result)
+        print(f'{op:<28} {fixture:<20} {elapsed:10.3f} s', file=sys.stderr)
+
+
+def run_startup(bench: Bench):
+    """
+    Замер холодного запуска программы до показа EntryForm в отдельных процессах
+    """
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = list()
+    for _ in range(STARTUP_RUNS):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output=True, text=True, cwd=root,
+                                check=True).stdout.split()
+        runs.append(float(output[0]))
+    # Библиотеки для графиков не должны загружаться при запуске
+    plotting_loaded = output[1] == 'True'
+    bench.results.append({'op': 'startup', 'fixture': 'EntryForm', 'rows': 0, 'seconds': round(min(runs), 4),
+                          'peak_mb': None, 'rss_mb': None, 'plotting_loaded': plotting_loaded})
+    print(f'{"startup":<28} {"EntryForm":<20} {min(runs):10.3f} s' +
+          (' (seaborn загружен при запуске)' if plotting_loaded else ''), file=sys.stderr)
+
+
+def run_csv(bench: Bench, tipy, inspector_class, workdir: str, source: str, shape: str, rows: int):
+    """
+    Замеры для csv файла: открытие, чтение всех ячеек, поиск, заполнение таблицы, сохранение, график
+    """
+
+    from PyQt5.QtWidgets import QTableView
+    fixture = f'csv/{shape}/{rows}'
+    path = os.path.join(workdir, os.path.basename(source))
+    shutil.copyfile(source, path)
+
+    window = inspector_class()
+    window.mode = 'Редактирование'
+    window.csv_del = ','
+    window.csv_encoding = 'utf-8'
+
+    def open_csv():
+        window.init_table(path)
+        window.paths.append(path)
+
+    bench.measure('init_table', fixture, rows, open_csv, lambda: not window.loaders)
+    model = window.tableView.model()
+    # get_data_from_table() заменён моделями таблиц - меряем чтение всех ячеек через модель
+    bench.measure('read_table', fixture, rows,
+                  lambda: [model.row_values(row) for row in range(model.total_row_count())])
+    bench.measure('search', fixture, rows, lambda: model.search(SEARCH_TEXT))
+    bench.measure('save_csv_file', fixture, rows, window.save_csv_file, lambda: not window.loaders)
+
+    with open(source, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        titles = next(reader)
+        data = list(reader)
+    table = QTableView()
+    # Ряды передаются аргументом по умолчанию, чтобы лямбда не ссылалась на переменную, удаляемую ниже
+    bench.measure('fill_table', fixture, rows, lambda data=data: tipy.fill_table(table, titles, data))
+    del data
+    run_plot(bench, tipy, window, fixture, rows)
+    table.model().deleteLater()
+    window.close()
+    window.deleteLater()
+    os.remove(path)
+
+
+def run_csv_files(bench: Bench, inspector_class, workdir: str, sources: list[str], rows: int):
+    """
+    Открытие нескольких csv файлов сразу: файлы читаются параллельно в пуле процессов
+    """
+
+    paths = list()
+    for source in sources:
+        paths.append(os.path.join(workdir, os.path.basename(source)))
+        shutil.copyfile(source, paths[-1])
+    window = inspector_class()
+    window.mode = 'Редактирование'
+    window.csv_del = ','
+    window.csv_encoding = 'utf-8'
+
+    def open_files():
+        window.init_table(paths[0], paths[1:])
+        window.paths.extend(paths)
+
+    bench.measure('load_csv_files', f'csv/{len(paths)} files/{rows}', rows * len(paths), open_files,
+                  lambda: not window.loaders)
+    window.close()
+    window.deleteLater()
+    for path in paths:
+        os.remove(path)
+
+
+def run_db(bench: Bench, tipy, inspector_class, workdir: str, source: str, shape: str, rows: int):
+    """
+    Замеры для БД: открытие, изменение ячеек, индекс для поиска и поиск, SQL запрос, график
+    """
+
+    fixture = f'db/{shape}/{rows}'
+    path = os.path.join(workdir, os.path.basename(source))
+    shutil.copyfile(source, path)
+
+    window = inspector_class()
+    window.mode = 'Редактирование'
+
+    def open_db():
+        window.init_table(path)
+        window.paths.append(path)
+
+    bench.measure('init_table', fixture, rows, open_db)
+    model = window.tableView.model()
+
+    def edit_cells():
+        # Меняем целочисленный столбец c4 в уже подгруженных рядах
+        for i in range(CELL_EDITS):
+            model.setData(model.index(i % model.rowCount(), 4), str(i))
+        window.flush_changes()
+
+    bench.measure('db_table_cell_changed', fixture, CELL_EDITS, edit_cells)
+    window.searchLine.setText(SEARCH_TEXT)
+    bench.measure('search_index', fixture, rows, window.run_search, lambda: not window.search_indexers)
+    bench.measure('search', fixture, rows, lambda: model.search(SEARCH_TEXT))
+
+    form = tipy.SQLForm(window.con, window.cur, window)
+    form.sqlTextEdit.setPlainText(f'SELECT c2, count(*), avg(c1) FROM {shape} GROUP BY c2')
+    bench.measure('SQLForm.send_sql_query', fixture, rows, form.send_sql_query,
+                  lambda: form.worker is None or form.enterButton.isEnabled())
+    form.close()
+    run_plot(bench, tipy, window, fixture, rows)
+    window.close()
+    window.deleteLater()
+    os.remove(path)
+
+
+def run_plot(bench: Bench, tipy, window, fixture: str, rows: int):
+    window.plot_cache.clear()
+    form = tipy.PlotForm(window)
+    form.axisXComboBox.setCurrentText('c0')
+    form.axisYComboBox.setCurrentText('c1')
+    bench.measure('PlotForm.build_plot', fixture, rows, form.build_plot)
+    for plot in window.plot_cache.values():
+        plot.close()
+        plot.deleteLater()
+    window.plot_cache.clear()
+
+
+def compare(old: dict, new: dict):
+    """
+    Печатает, во сколько раз изменилось время каждой операции
+    """
+
+    before = {(x['op'], x['fixture']): x['seconds'] for x in old['results']}
+    print(f'{"операция":<28} {"таблица":<20} {"было, с":>10} {"стало, с":>10} {"x":>7}')
+    for result in new['results']:
+        key = (result['op'], result['fixture'])
+        if key in before:
+            ratio = result['seconds'] / before[key] if before[key] else float('inf')
+            print(f'{key[0]:<28} {key[1]:<20} {before[key]:10.3f} {result["seconds"]:10.3f} {ratio:7.2f}')
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='benchmarks.run', description='Замеры скорости TIPY')
+    parser.add_argument('--sizes', type=int, nargs='+', help=f'Количество рядов (по умолчанию {DEFAULT_SIZES})')
+    parser.add_argument('--full', action='store_true', help=f'Все размеры: {FULL_SIZES}')
+    parser.add_argument('--shapes', nargs='+', choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'tipy_bench_fixtures'),
+                        help='Папка для синтетических таблиц (создаются один раз и переиспользуются)')
+    parser.add_argument('--trace-memory', action='store_true', help='Мерить пик памяти операций через tracemalloc')
+    parser.add_argument('--out', help='JSON файл для результатов (рядом с ним пишется журнал операций .log)')
+    parser.add_argument('--compare', help='JSON файл с результатами другой версии')
+    args = parser.parse_args(argv)
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+
+    os.makedirs(args.fixtures, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix='tipy_bench_')
+    # История SQL запросов пишется в домашнюю папку - подменяем её, чтобы не засорять настоящую
+    os.environ['HOME'] = os.environ['USERPROFILE'] = workdir
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    import project548 as tipy
+    import profiling
+
+    # Без обработчика долгие операции попадали бы в stderr вперемешку с замерами
+    profiling.logger.addHandler(logging.NullHandler())
+    if args.out:
+        profiling.setup_log(os.path.splitext(args.out)[0] + '.log')
+
+    def fail(*args, **kwargs):
+        raise BenchmarkError(args[2] if len(args) > 2 else 'QMessageBox')
+
+    # Диалоги с ошибками остановили бы замеры - вместо них бросаем исключение
+    QMessageBox.critical = QMessageBox.warning = staticmethod(fail)
+
+    class Inspector(tipy.TableInspector):
+        def open_file(self):
+            pass
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    bench = Bench(app, args.trace_memory)
+    run_startup(bench)
+    # Библиотеки для графиков загружаются заранее, чтобы первый замер графика не включал их импорт
+    import plotting
+    bench.measure('plotting.preload', 'import', 0, plotting.preload)
+    try:
+        for shape in args.shapes:
+            for rows in sizes:
+                run_csv(bench, tipy, Inspector, workdir, csv_fixture(args.fixtures, shape, rows, args.seed), shape,
+                        rows)
+                run_db(bench, tipy, Inspector, workdir, db_fixture(args.fixtures, shape, rows, args.seed), shape,
+                       rows)
+        if len(args.shapes) > 1:
+            for rows in sizes:
+                run_csv_files(bench, Inspector, workdir,
+                              [csv_fixture(args.fixtures, shape, rows, args.seed) for shape in args.shapes], rows)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'version': git_version(), 'python': platform.python_version(), 'platform': platform.platform(),
+              'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': args.seed, 'results': bench.results}
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
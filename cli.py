@@ -0,0 +1,170 @@
+import argparse
+import csv
+import io
+import sqlite3
+import sys
+from itertools import islice
+from column_store import Column
+from csv_import import IMPORT_BATCH, csv_rows, import_csv
+from csv_index import save_atomically
+from plotting import PLOT_BINS, plot_columns, plot_database
+from sqlite_schema import quote_name
+
+# Сколько рядов результата запроса достаётся из БД за один раз при выгрузке
+EXPORT_BATCH = 10000
+
+
+def write_cursor(cursor: sqlite3.Cursor, f, encoding: str, delimiter: str) -> int:
+    """
+    Записывает результат запроса в csv файл порциями по EXPORT_BATCH рядов
+    :param f: Файл, открытый на запись в двоичном режиме
+    :return: Количество записанных рядов
+    """
+
+    text = io.TextIOWrapper(f, encoding=encoding, newline='')
+    writer = csv.writer(text, delimiter=delimiter)
+    writer.writerow([x[0] for x in cursor.description])
+    count = 0
+    while rows := cursor.fetchmany(EXPORT_BATCH):
+        writer.writerows(['' if x is None else x for x in row] for row in rows)
+        count += len(rows)
+    text.flush()
+    # Файл закрывает тот, кто его открыл
+    text.detach()
+    return count
+
+
+def export_query(con: sqlite3.Connection, sql: str, output: str | None, encoding: str, delimiter: str):
+    """
+    Выполняет запрос. Результат SELECT записывается в output (или выводится, если output не задан),
+    для остальных запросов выводится количество изменённых рядов
+    """
+
+    cursor = con.execute(sql)
+    if cursor.description is None:
+        con.commit()
+        print(f'Изменено рядов: {cursor.rowcount}', file=sys.stderr)
+    elif output:
+        save_atomically(output, lambda f: write_cursor(cursor, f, encoding, delimiter))
+    else:
+        write_cursor(cursor, sys.stdout.buffer, encoding, delimiter)
+        sys.stdout.buffer.flush()
+
+
+def csv_columns(path: str, encoding: str, delimiter: str, x: str, y: str) -> tuple[Column, Column]:
+    """
+    Читает из csv файла только два столбца, сразу в типизированном виде
+    :raise ValueError: Если столбца нет в файле
+    """
+
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        rows = csv_rows(f, delimiter)
+        titles = next(rows, [])
+        col_x, col_y = titles.index(x), titles.index(y)
+        column_x, column_y = Column(), Column()
+        while batch := list(islice(rows, IMPORT_BATCH)):
+            column_x.extend(row[col_x] if col_x < len(row) else '' for row in batch)
+            column_y.extend(row[col_y] if col_y < len(row) else '' for row in batch)
+    return column_x, column_y
+
+
+def render_plot(args):
+    """
+    Рисует график так же, как окно программы, и сохраняет его в файл.
+    Для csv файла читаются только нужные столбцы, для БД значения агрегируются в SQLite
+    """
+
+    # matplotlib нужен только этой команде, остальные запускаются без него
+    from matplotlib.figure import Figure
+    figure = Figure()
+    axes = figure.add_subplot()
+    try:
+        if args.table is None:
+            note = plot_columns(axes, *csv_columns(args.source, args.encoding, args.delimiter, args.x, args.y))[1]
+        else:
+            con = sqlite3.connect(args.source)
+            try:
+                note = plot_database(axes, con, args.table, args.x, args.y, args.bins)[1]
+            finally:
+                con.close()
+    except TypeError:
+        raise ValueError('Ни один столбец не заполнен числами полностью')
+    axes.set_xlabel(args.x)
+    axes.set_ylabel(args.y)
+    figure.savefig(args.output)
+    if note:
+        print(note, file=sys.stderr)
+
+
+def run(args):
+    if args.command == 'plot':
+        render_plot(args)
+        return
+    con = sqlite3.connect(args.db)
+    try:
+        if args.command == 'csv2db':
+            count = import_csv(con, args.csv, args.table, args.encoding, args.delimiter)
+            print(f'Загружено рядов: {count}', file=sys.stderr)
+        elif args.command == 'db2csv':
+            export_query(con, f'SELECT * FROM {quote_name(args.table)}', args.csv, args.encoding, args.delimiter)
+        elif args.command == 'script':
+            with open(args.script, 'r', encoding=args.encoding) as f:
+                con.executescript(f.read())
+        elif args.command == 'query':
+            export_query(con, args.sql, args.output, args.encoding, args.delimiter)
+    finally:
+        con.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='tipy', description='TIPY без графического интерфейса')
+    parser.add_argument('-e', '--encoding', default='utf-8', help='Кодировка csv файлов')
+    parser.add_argument('-d', '--delimiter', default=',', help='Разделитель csv файлов')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('csv2db', help='Загрузить csv файл в новую таблицу БД')
+    command.add_argument('csv')
+    command.add_argument('db')
+    command.add_argument('table')
+
+    command = commands.add_parser('db2csv', help='Выгрузить таблицу БД в csv файл')
+    command.add_argument('db')
+    command.add_argument('table')
+    command.add_argument('csv')
+
+    command = commands.add_parser('script', help='Выполнить SQL скрипт')
+    command.add_argument('db')
+    command.add_argument('script')
+
+    command = commands.add_parser('query', help='Выполнить SQL запрос и выгрузить результат в csv')
+    command.add_argument('db')
+    command.add_argument('sql')
+    command.add_argument('-o', '--output', help='csv файл для результата (по умолчанию - вывод в консоль)')
+
+    command = commands.add_parser('plot', help='Построить график и сохранить его в файл')
+    command.add_argument('source', help='csv файл или БД (вместе с --table)')
+    command.add_argument('x')
+    command.add_argument('y')
+    command.add_argument('-o', '--output', required=True, help='Файл для графика (png, svg, pdf...)')
+    command.add_argument('-t', '--table', help='Таблица БД')
+    command.add_argument('--bins', type=int, default=PLOT_BINS, help='Количество интервалов для числового X')
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    """
+    Запуск из командной строки
+    :return: Код завершения
+    """
+
+    args = build_parser().parse_args(argv)
+    try:
+        run(args)
+    except (OSError, UnicodeError, LookupError, ValueError, csv.Error, sqlite3.Error) as e:
+        print(f'Ошибка: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
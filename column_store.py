@@ -0,0 +1,438 @@
+from array import array
+from bisect import bisect_left
+import numpy as np
+from text_search import TrigramIndex
+
+# Типы столбцов - они же коды типов array, в которых хранятся значения
+INT, FLOAT, TEXT = 'q', 'd', 'I'
+
+# Границы целых чисел, которые помещаются в array('q')
+INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def kept_ranges(count: int, rows: list[int]):
+    """
+    Диапазоны рядов, которые остаются после удаления rows.
+    Нужны, чтобы удалять много рядов срезами, а не по одному
+    :param count: Количество рядов
+    :param rows: Номера удаляемых рядов
+    :return: Генератор пар (начало, конец) для срезов
+    """
+
+    start = 0
+    for row in sorted(set(rows)):
+        if row > start:
+            yield start, row
+        start = row + 1
+    if start < count:
+        yield start, count
+
+
+def without_rows(seq, rows: list[int]):
+    """
+    Копия списка или массива без рядов rows
+    """
+
+    result = seq[:0]
+    for start, stop in kept_ranges(len(seq), rows):
+        result += seq[start:stop]
+    return result
+
+
+def format_float(value: float) -> str:
+    text = repr(value)
+    return text[:-2] if text.endswith('.0') else text
+
+
+class Column:
+    """
+    Столбец таблицы, хранящийся в одном типизированном массиве.
+    Тип определяется по значениям: сначала столбец целочисленный, при первом дробном значении
+    становится вещественным, а при первом нечисловом - текстовым. Текстовые значения хранятся
+    словарём: каждая разная строка хранится один раз, а в массиве лежат её номера.
+    Пустые ячейки отмечаются в битовой маске nulls.
+    Если текст числа отличается от того, как число записывается обратно ("1.50", "007"),
+    исходный текст запоминается, чтобы при сохранении файл не изменился.
+
+    Атрибуты
+    ------
+    kind : str
+        Тип столбца: INT, FLOAT или TEXT.
+    data : array
+        Значения (для TEXT - номера строк в словаре).
+    nulls : bytearray
+        Битовая маска пустых ячеек.
+    size : int
+        Количество значений.
+    texts : dict
+        Исходный текст чисел, которые записываются иначе: номер ряда -> текст.
+    strings : list
+        Словарь строк текстового столбца.
+    dictionary : tuple | None
+        Словарь разных значений для поиска подстроки (см. build_dictionary()). Строится при первом поиске.
+
+    Методы
+    ------
+    extend() :
+        Добавляет значения в конец столбца.
+    append() :
+        Добавляет одно значение.
+    value() :
+        Возвращает текст ячейки.
+    set() :
+        Изменяет значение ячейки, при необходимости меняя тип столбца.
+    values() :
+        Текст всех ячеек.
+    numeric() :
+        Значения числового столбца одним массивом NumPy.
+    ranks() :
+        Места значений при сортировке столбца.
+    search() :
+        Ищет подстроку в тексте ячеек.
+    build_dictionary() :
+        Строит словарь разных значений для поиска.
+    remove() :
+        Удаляет значения.
+    copy() :
+        Копия столбца.
+    """
+
+    def __init__(self, values=()):
+        self.kind = INT
+        self.data = array(INT)
+        self.nulls = bytearray()
+        self.size = 0
+        self.texts = dict()
+        self.strings = list()
+        self.codes = dict()
+        self.dictionary = None
+        self.extend(values)
+
+    @classmethod
+    def empty(cls, size: int):
+        """
+        Столбец из size пустых ячеек
+        """
+
+        column = cls()
+        column.data = array(INT, bytes(8 * size))
+        column.nulls = bytearray(b'\xff' * (size // 8))
+        if size % 8:
+            # Биты после последнего ряда должны оставаться нулевыми
+            column.nulls.append((1 << size % 8) - 1)
+        column.size = size
+        return column
+
+    def is_null(self, row: int) -> bool:
+        return bool(self.nulls[row >> 3] >> (row & 7) & 1)
+
+    def set_null(self, row: int, null: bool):
+        if null:
+            self.nulls[row >> 3] |= 1 << (row & 7)
+        else:
+            self.nulls[row >> 3] &= ~(1 << (row & 7))
+
+    def resize_nulls(self):
+        need = (self.size + 7) // 8
+        if len(self.nulls) < need:
+            self.nulls.extend(bytes(need - len(self.nulls)))
+
+    def format(self, value) -> str:
+        return str(value) if self.kind == INT else format_float(value)
+
+    def parse(self, text: str):
+        """
+        Переводит текст в значение для массива текущего типа
+        :raise ValueError: Если текст нельзя сохранить в столбце такого типа
+        """
+
+        if self.kind == TEXT:
+            code = self.codes.get(text)
+            if code is None:
+                code = self.codes[text] = len(self.strings)
+                self.strings.append(text)
+            return code
+        if self.kind == INT:
+            value = int(text)
+            if not INT_MIN <= value <= INT_MAX:
+                raise ValueError(text)
+            return value
+        return float(text)
+
+    def extend(self, values):
+        """
+        Добавляет порцию значений целиком: числа переводятся в массив одним вызовом array(),
+        а если порция не помещается в текущий тип, тип столбца меняется один раз на всю порцию
+        """
+
+        values = list(values)
+        if not values:
+            return
+        nulls = [i for i, text in enumerate(values) if text == ''] if '' in values else []
+        if self.kind == TEXT:
+            data = array(TEXT, map(self.parse, values))
+        else:
+            numbers = [text or '0' for text in values] if nulls else values
+            try:
+                data = array(self.kind, map(int if self.kind == INT else float, numbers))
+            except (ValueError, OverflowError):
+                kind = TEXT
+                if self.kind == INT:
+                    try:
+                        array(FLOAT, map(float, numbers))
+                        kind = FLOAT
+                    except ValueError:
+                        pass
+                self.promote(kind)
+                self.extend(values)
+                return
+        start = self.size
+        self.data.extend(data)
+        self.size += len(values)
+        self.resize_nulls()
+        for i in nulls:
+            self.set_null(start + i, True)
+        if self.kind != TEXT and not all(map(str.__eq__, map(self.format, data), values)):
+            for i, (value, text) in enumerate(zip(data, values)):
+                if text and self.format(value) != text:
+                    self.texts[start + i] = text
+
+    def append(self, text: str):
+        self.size += 1
+        self.resize_nulls()
+        self.data.append(0)
+        self.set(self.size - 1, text)
+
+    def set(self, row: int, text: str):
+        text = str(text)
+        self.texts.pop(row, None)
+        self.set_null(row, text == '')
+        if text == '':
+            self.data[row] = 0
+            return
+        while True:
+            try:
+                value = self.parse(text)
+                break
+            except ValueError:
+                self.promote(FLOAT if self.kind == INT else TEXT)
+        self.data[row] = value
+        if self.kind != TEXT and self.format(value) != text:
+            self.texts[row] = text
+
+    def promote(self, kind: str):
+        """
+        Меняет тип столбца на более общий, сохраняя текст всех ячеек
+        """
+
+        if kind == FLOAT:
+            old = self.data
+            self.kind, self.data = FLOAT, array(FLOAT, old)
+            for row, value in enumerate(old):
+                if row not in self.texts and not self.is_null(row) and format_float(float(value)) != str(value):
+                    self.texts[row] = str(value)
+        else:
+            values = self.values()
+            self.kind, self.data, self.texts = TEXT, array(TEXT), dict()
+            self.data.extend(map(self.parse, values))
+        self.dictionary = None
+
+    def value(self, row: int) -> str:
+        if self.is_null(row):
+            return ''
+        text = self.texts.get(row)
+        if text is not None:
+            return text
+        if self.kind == TEXT:
+            return self.strings[self.data[row]]
+        return self.format(self.data[row])
+
+    def values(self) -> list[str]:
+        return [self.value(row) for row in range(self.size)]
+
+    def null_mask(self) -> np.ndarray:
+        bits = np.unpackbits(np.frombuffer(bytes(self.nulls), dtype=np.uint8), bitorder='little')
+        return bits[:self.size].astype(bool)
+
+    def numeric(self) -> np.ndarray | None:
+        """
+        :return: Копия значений в float64, пустые ячейки - NaN. None, если столбец текстовый
+        """
+
+        if self.kind == TEXT:
+            return None
+        values = np.frombuffer(self.data, dtype=np.int64 if self.kind == INT else np.float64).astype(np.float64)
+        values[self.null_mask()] = np.nan
+        return values
+
+    def ranks(self) -> np.ndarray:
+        """
+        Место каждого значения в отсортированном столбце: равные значения получают одно место,
+        пустые ячейки - место -1 (как NULL в SQLite, они идут первыми).
+        Числа сравниваются как числа, строки - посимвольно. Для текстового столбца сортируется
+        только словарь разных строк, а не все ячейки
+        :return: Массив int64 длиной size
+        """
+
+        if self.kind == TEXT:
+            codes = np.frombuffer(self.data, dtype=np.uint32)
+            by_text = sorted(range(len(self.strings)), key=self.strings.__getitem__)
+            places = np.empty(len(self.strings), dtype=np.int64)
+            places[by_text] = np.arange(len(self.strings))
+            ranks = places[codes] if len(self.strings) else np.zeros(self.size, dtype=np.int64)
+        else:
+            values = np.frombuffer(self.data, dtype=np.int64 if self.kind == INT else np.float64)
+            ranks = np.unique(values, return_inverse=True)[1].astype(np.int64).reshape(-1)
+        ranks[self.null_mask()] = -1
+        return ranks
+
+    def search(self, text: str) -> np.ndarray:
+        """
+        Ищет подстроку в тексте ячеек (с учётом регистра). Просматриваются не ячейки, а словарь разных
+        значений с индексом триграмм, и найденные значения переводятся в ряды одной операцией NumPy.
+        Значения, появившиеся после построения словаря, проверяются по одному, а если их стало
+        больше четверти, словарь строится заново
+        :return: Массив bool: True для ячеек, в тексте которых есть text
+        """
+
+        found = np.zeros(self.size, dtype=bool)
+        if not text or '\0' in text or self.kind == TEXT and not self.strings:
+            return found
+        data = np.frombuffer(self.data, dtype=np.uint32 if self.kind == TEXT else
+                             np.int64 if self.kind == INT else np.float64)
+        for _ in range(2):
+            if self.dictionary is None:
+                self.build_dictionary()
+            index, starts, values = self.dictionary
+            if self.kind == TEXT:
+                fresh = range(len(starts) - 1, len(self.strings))
+                stale = len(fresh) > len(self.strings) // 4
+            else:
+                fresh = np.flatnonzero(~np.isin(data, values))
+                stale = len(fresh) > self.size // 4
+            if not stale:
+                break
+            self.dictionary = None
+        pattern = text.encode('utf-8', 'surrogatepass')
+        hits = np.unique(np.searchsorted(starts, index.positions(pattern), side='right') - 1)
+        if self.kind == TEXT:
+            matched = np.zeros(len(self.strings), dtype=bool)
+            matched[hits] = True
+            for code in fresh:
+                matched[code] = text in self.strings[code]
+            found = matched[data]
+        else:
+            found = np.isin(data, values[hits])
+            # Исходный текст чисел ("007", "1.50") отличается от текста в словаре
+            for row in fresh.tolist() + list(self.texts):
+                found[row] = text in self.value(row)
+        return found & ~self.null_mask()
+
+    def build_dictionary(self):
+        """
+        Словарь для поиска: строки словаря текстового столбца или разные числа числового столбца
+        в виде текста, склеенные через нулевой байт в одну строку байт с индексом триграмм.
+        Сохраняется в dictionary как (TrigramIndex, смещения начала значений и конца последнего,
+        массив чисел или None)
+        """
+
+        if self.kind == TEXT:
+            values, texts = None, self.strings
+        else:
+            values = np.unique(np.frombuffer(self.data, dtype=np.int64 if self.kind == INT else np.float64))
+            texts = map(self.format, values.tolist())
+        encoded = [x.encode('utf-8', 'surrogatepass') for x in texts]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        starts = np.concatenate([[0], np.cumsum(lengths + 1)])
+        index = TrigramIndex(b'\0'.join(encoded))
+        for _ in index.build():
+            pass
+        self.dictionary = index, starts, values
+
+    def remove(self, rows: list[int]):
+        removed = set(rows)
+        rows = sorted(removed)
+        mask = np.delete(self.null_mask(), rows)
+        self.data = without_rows(self.data, rows)
+        self.nulls = bytearray(np.packbits(mask, bitorder='little').tobytes())
+        self.texts = {row - bisect_left(rows, row): text for row, text in self.texts.items() if row not in removed}
+        self.size = len(self.data)
+
+    def copy(self) -> 'Column':
+        """
+        Массивы копируются целиком, без перевода значений в текст и обратно
+        """
+
+        column = Column()
+        column.kind, column.data, column.nulls, column.size = self.kind, self.data[:], self.nulls[:], self.size
+        column.texts, column.strings, column.codes = dict(self.texts), list(self.strings), dict(self.codes)
+        return column
+
+
+class ColumnStore:
+    """
+    Таблица, хранящаяся по столбцам (Column)
+
+    Атрибуты
+    ------
+    titles : list
+        Названия столбцов.
+    columns : list
+        Столбцы.
+    size : int
+        Количество рядов.
+
+    Методы
+    ------
+    append_rows() :
+        Добавляет ряды в конец таблицы.
+    set_titles() :
+        Задаёт названия столбцов, добавляя пустые столбцы или убирая лишние.
+    insert_column() :
+        Добавляет пустой столбец.
+    value() :
+        Возвращает текст ячейки.
+    set_value() :
+        Изменяет ячейку.
+    row_values() :
+        Возвращает текст всех ячеек ряда.
+    remove_rows() :
+        Удаляет ряды.
+    """
+
+    def __init__(self, titles: list[str], rows: list[list] = ()):
+        self.titles = list(titles)
+        self.columns = [Column() for _ in self.titles]
+        self.size = 0
+        self.append_rows(rows)
+
+    def append_rows(self, rows: list[list]):
+        if not rows:
+            return
+        width = len(self.titles)
+        rows = [row if len(row) == width else (list(row[:width]) + [''] * (width - len(row))) for row in rows]
+        for column, values in zip(self.columns, zip(*rows)):
+            column.extend(values)
+        self.size += len(rows)
+
+    def set_titles(self, titles: list[str]):
+        self.titles = list(titles)
+        self.columns = self.columns[:len(self.titles)]
+        self.columns.extend(Column.empty(self.size) for _ in range(len(self.titles) - len(self.columns)))
+
+    def insert_column(self, title: str):
+        self.set_titles(self.titles + [title])
+
+    def value(self, row: int, col: int) -> str:
+        return self.columns[col].value(row)
+
+    def set_value(self, row: int, col: int, text: str):
+        self.columns[col].set(row, text)
+
+    def row_values(self, row: int) -> list[str]:
+        return [column.value(row) for column in self.columns]
+
+    def remove_rows(self, rows: list[int]):
+        for column in self.columns:
+            column.remove(rows)
+        self.size -= len(set(rows))
@@ -0,0 +1,82 @@
+import csv
+import os
+import sqlite3
+from itertools import islice
+from column_store import Column, INT, FLOAT
+from sqlite_schema import quote_name
+
+# Сколько рядов csv файла записывается в БД одним executemany
+IMPORT_BATCH = 10000
+
+# Типы столбцов SQLite для типов столбцов Column
+SQL_TYPES = {INT: 'INTEGER', FLOAT: 'REAL'}
+
+# Настройки SQLite на время загрузки: не ждать записи на диск, журнал и временные данные держать в памяти
+IMPORT_PRAGMAS = {'synchronous': 'OFF', 'journal_mode': 'MEMORY', 'temp_store': 'MEMORY', 'cache_size': -65536}
+
+
+def csv_rows(f, delimiter: str):
+    """
+    Читает открытый csv файл ряд за рядом так же, как при открытии файла в окне программы.
+    Пустые строки пропускаются
+    :return: Генератор рядов, первый ряд - названия столбцов
+    """
+
+    for row in csv.reader(f, delimiter=delimiter, skipinitialspace=True):
+        if row:
+            yield row
+
+
+def column_types(titles: list[str], rows: list[list]) -> list[str]:
+    """
+    Определяет типы столбцов SQLite по первым рядам файла (как ColumnStore)
+    """
+
+    width = len(titles)
+    rows = [row[:width] + [''] * (width - len(row)) for row in rows]
+    return [SQL_TYPES.get(Column(values).kind, 'TEXT') for values in zip(*rows)] if rows else ['TEXT'] * width
+
+
+def import_csv(con: sqlite3.Connection, path: str, table: str, encoding: str, delimiter: str,
+               on_batch=None) -> int:
+    """
+    Загружает csv файл в новую таблицу БД.
+    Файл читается потоком и записывается порциями по IMPORT_BATCH рядов (executemany) в одной транзакции
+    с настройками IMPORT_PRAGMAS, после загрузки прежние настройки возвращаются.
+    Типы столбцов определяются по первой порции, пустые ячейки записываются как NULL
+    :param on_batch: Вызывается после каждой порции с количеством загруженных рядов и долей прочитанного файла.
+    Если он бросит исключение, загрузка отменяется целиком
+    :return: Количество загруженных рядов
+    """
+
+    size = os.path.getsize(path) or 1
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        rows = csv_rows(f, delimiter)
+        titles = next(rows, None)
+        if titles is None:
+            raise ValueError(f'Файл {path} пуст')
+        width = len(titles)
+        batch = list(islice(rows, IMPORT_BATCH))
+        columns = ', '.join(f'{quote_name(title)} {type_}'
+                            for title, type_ in zip(titles, column_types(titles, batch)))
+        insert = f'INSERT INTO {quote_name(table)} VALUES ({", ".join(["?"] * width)})'
+
+        old = {name: con.execute(f'PRAGMA {name}').fetchone()[0] for name in IMPORT_PRAGMAS}
+        for name, value in IMPORT_PRAGMAS.items():
+            con.execute(f'PRAGMA {name}={value}')
+        count = 0
+        try:
+            with con:
+                con.execute(f'CREATE TABLE {quote_name(table)} ({columns})')
+                while batch:
+                    con.executemany(insert, ([x or None for x in row] if len(row) == width else
+                                             [x or None for x in row[:width]] + [None] * (width - len(row))
+                                             for row in batch))
+                    count += len(batch)
+                    if on_batch is not None:
+                        on_batch(count, f.buffer.tell() / size)
+                    batch = list(islice(rows, IMPORT_BATCH))
+        finally:
+            for name, value in old.items():
+                con.execute(f'PRAGMA {name}={value}')
+    return count
@@ -0,0 +1,357 @@
+import codecs
+import csv
+import io
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from array import array
+from collections import OrderedDict
+from functools import cache
+import numpy as np
+from text_search import TrigramIndex
+
+# Сколько разобранных рядов хранится в кэше CsvIndex
+ROW_CACHE_SIZE = 2048
+
+# Через сколько найденных рядов CsvIndex.build() сообщает о прогрессе
+INDEX_BLOCK = 50000
+
+# Сколько байт за раз копируется из исходного файла при сохранении
+COPY_BLOCK = 1 << 20
+
+# Сколько рядов за раз разбирается при чтении целого столбца
+COLUMN_BLOCK = 100000
+
+# Для файлов больше стольких байт индекс триграмм не строится: его битовые карты занимают 1/8 размера файла
+TRIGRAM_MAX_FILE = 2 << 30
+
+# Символы, на которых CsvIndex.supports() проверяет кодировку: латиница, греческий, кириллица,
+# знаки и азбука CJK, иероглифы, хангыль и полноширинные формы
+ENCODING_PROBE = ''.join(map(chr, [*range(0x80, 0x250), *range(0x370, 0x530), *range(0x3000, 0x3100),
+                                   *range(0x4E00, 0x4F00), *range(0xAC00, 0xAC80), *range(0xFF00, 0xFF70)]))
+
+# Сколько первых байт файла просматривает CsvIndex.supports(), чтобы узнать, чем заканчиваются строки
+NEWLINE_PROBE = 1 << 16
+
+
+@cache
+def byte_compatible(name: str) -> bool:
+    """
+    Проверяет, что в кодировке кавычка и переводы строки записываются своими байтами ASCII, байты других
+    символов с ними не совпадают, а байты символа не зависят от соседних символов. Кодировки
+    с переключением состояния (iso2022, hz, utf-7) не подходят: в них байт 0x22 бывает частью иероглифа
+    :param name: Каноническое название кодировки (codecs.lookup().name)
+    """
+
+    try:
+        if '\r\n"'.encode(name) != b'\r\n"':
+            return False
+        for char in ENCODING_PROBE:
+            try:
+                raw = char.encode(name)
+            except UnicodeEncodeError:
+                continue
+            if any(x in raw for x in b'"\r\n') or (char * 2).encode(name) != raw * 2:
+                return False
+    except LookupError:
+        # Кодек преобразует байты в байты (base64, zlib и т.п.), а не текст
+        return False
+    return True
+
+
+class CsvIndex:
+    """
+    Индекс csv файла: смещения (в байтах) начала каждого ряда.
+    Файл отображается в память через mmap, и любой ряд читается и разбирается только тогда,
+    когда он понадобился, поэтому переход к ряду 5 000 000 стоит столько же, сколько к ряду 1.
+
+    Атрибуты
+    ------
+    path : str
+        Путь к csv файлу.
+    encoding : str
+        Кодировка csv файла.
+    delimiter : str
+        Разделитель csv файла.
+    titles : list
+        Названия столбцов (первый непустой ряд файла).
+    offsets : array
+        Смещения начала рядов с данными. После окончания build() последним
+        элементом записывается размер файла, так что ряд i занимает байты offsets[i]:offsets[i + 1].
+    complete : bool
+        True, если весь файл проиндексирован.
+    trigrams : TrigramIndex
+        Индекс триграмм байтов файла для поиска подстроки. Строится после offsets (TrigramIndexer),
+        если файл не больше TRIGRAM_MAX_FILE.
+
+    Методы
+    ------
+    supports() :
+        Проверяет, можно ли искать границы рядов в файле побайтово.
+    build() :
+        Один последовательный проход по файлу, заполняющий offsets.
+    row() :
+        Читает и разбирает ряд по его номеру.
+    column() :
+        Читает один столбец первых count рядов.
+    search() :
+        Ищет ряды, в значениях которых есть подстрока.
+    adopt() :
+        Подключает границы рядов, найденные в другом процессе.
+    line_terminator() :
+        Перевод строки, которым в файле заканчиваются ряды.
+    copy_bytes() :
+        Копирует байты исходного файла в другой файл.
+    copy_rows() :
+        Копирует ряды исходного файла в другой файл без разбора.
+    close() :
+        Закрывает файл.
+    """
+
+    def __init__(self, path: str, encoding: str, delimiter: str):
+        self.path = path
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.titles = list()
+        self.offsets = array('Q')
+        self.complete = False
+        self.cache = OrderedDict()
+        self.file = open(path, 'rb')
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Пустой файл нельзя отобразить в память
+            self.mm = b''
+        # Ряд с названиями столбцов. Сохраняется в файле как есть, поэтому запоминаем его границы
+        self.header_start, self.data_start = self.next_record(3 if self.mm[:3] == codecs.BOM_UTF8 else 0)
+        self.titles = self.parse(self.mm[self.header_start:self.data_start])
+        self.trigrams = TrigramIndex(self.mm)
+
+    def __len__(self) -> int:
+        """
+        Количество рядов, для которых уже известны и начало, и конец
+        """
+
+        return max(len(self.offsets) - 1, 0)
+
+    @staticmethod
+    def supports(encoding: str, path: str = None) -> bool:
+        """
+        Кодировка должна подходить для побайтового поиска (byte_compatible()), а ряды файла - заканчиваться
+        на \n или \r\n. Файлы, где строки заканчиваются одним \r (старый Mac), читаются целиком (CsvLoader)
+        :param path: Путь к файлу. Если не указан, проверяется только кодировка
+        """
+
+        try:
+            name = codecs.lookup(encoding).name
+        except LookupError:
+            return False
+        if not byte_compatible('utf-8' if name == 'utf-8-sig' else name):
+            return False
+        if path is not None:
+            with open(path, 'rb') as f:
+                head = f.read(NEWLINE_PROBE)
+            lf = head.find(b'\n')
+            if -1 < head.find(b'\r') < (len(head) + 1 if lf == -1 else lf) - 1:
+                return False
+        return True
+
+    def next_record(self, pos: int) -> tuple[int, int]:
+        """
+        Ищет ряд, начинающийся не раньше pos, пропуская пустые строки.
+        Перевод строки внутри кавычек концом ряда не считается
+        :return: Смещения начала ряда и байта сразу после него
+        """
+
+        mm, size = self.mm, len(self.mm)
+        while pos < size and mm[pos:pos + 1] in (b'\n', b'\r'):
+            pos += 1
+        start = pos
+        quotes = 0
+        while pos < size:
+            nl = mm.find(b'\n', pos)
+            end = size if nl == -1 else nl + 1
+            quotes += mm[pos:end].count(b'"')
+            pos = end
+            if quotes % 2 == 0:
+                break
+        return start, pos
+
+    def build(self):
+        """
+        Проход по файлу. Генератор: после каждых INDEX_BLOCK рядов отдаёт текущее смещение,
+        чтобы вызывающий код мог показать прогресс или прервать индексацию
+        """
+
+        mm, size = self.mm, len(self.mm)
+        offsets = self.offsets
+        pos = self.data_start
+        start = None
+        quotes = 0
+        while pos < size:
+            nl = mm.find(b'\n', pos)
+            end = size if nl == -1 else nl + 1
+            if start is None:
+                # Пустые строки между рядами пропускаются, как и при обычном чтении
+                if mm[pos:end] in (b'\n', b'\r\n'):
+                    pos = end
+                    continue
+                start = pos
+                quotes = 0
+            quotes += mm[pos:end].count(b'"')
+            pos = end
+            if quotes % 2 == 0:
+                offsets.append(start)
+                start = None
+                if len(offsets) % INDEX_BLOCK == 0:
+                    yield pos
+        if start is not None:
+            offsets.append(start)
+        offsets.append(size)
+        self.complete = True
+        yield size
+
+    def adopt(self, offsets: array):
+        """
+        Вместо build(): результат index_csv_file() для того же файла
+        """
+
+        self.offsets = offsets
+        self.complete = True
+
+    def parse(self, raw: bytes) -> list[str]:
+        text = raw.decode(self.encoding, errors='replace')
+        return next(csv.reader(io.StringIO(text, newline=''), delimiter=self.delimiter, skipinitialspace=True), [])
+
+    def row(self, i: int) -> list[str]:
+        row = self.cache.get(i)
+        if row is None:
+            row = self.parse(self.mm[self.offsets[i]:self.offsets[i + 1]])
+            self.cache[i] = row
+            if len(self.cache) > ROW_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return row
+
+    def column(self, col: int, count: int) -> list[str]:
+        """
+        Читает столбец подряд идущими блоками по COLUMN_BLOCK рядов. В блоке без кавычек значения
+        находятся одним регулярным выражением, блок с кавычками разбирается одним вызовом csv.reader.
+        Это намного быстрее, чем count вызовов row()
+        """
+
+        values = list()
+        for first in range(0, count, COLUMN_BLOCK):
+            last = min(first + COLUMN_BLOCK, count)
+            text = self.mm[self.offsets[first]:self.offsets[last]].decode(self.encoding, errors='replace')
+            if '"' in text:
+                rows = [row[col] if col < len(row) else '' for row in
+                        csv.reader(io.StringIO(text, newline=''), delimiter=self.delimiter, skipinitialspace=True)
+                        if row]
+            else:
+                rows = self.column_pattern(col).findall(text)
+            if len(rows) != last - first:
+                # Границы рядов в блоке разошлись с индексом (например, из-за перевода строки \r
+                # внутри ряда) - такой блок читается по рядам
+                rows = [self.parse(self.mm[self.offsets[i]:self.offsets[i + 1]]) for i in range(first, last)]
+                rows = [row[col] if col < len(row) else '' for row in rows]
+            values.extend(rows)
+        return values
+
+    def search(self, text: str, limit: int = None) -> np.ndarray:
+        """
+        Подстрока ищется прямо в байтах файла: блоки, где нет её триграмм, пропускаются (TrigramIndex),
+        а смещения совпадений переводятся в номера рядов по offsets. Если подстрока может захватить
+        соседнюю ячейку или кавычки (в ней есть разделитель, кавычка, перевод строки или пробел в начале),
+        найденные ряды проверяются разбором
+        :param limit: Сколько первых совпадений искать (None - все)
+        :return: Номера рядов по возрастанию (int64)
+        """
+
+        name = codecs.lookup(self.encoding).name
+        count = len(self)
+        try:
+            pattern = text.encode('utf-8' if name == 'utf-8-sig' else name)
+        except UnicodeEncodeError:
+            return np.zeros(0, dtype=np.int64)
+        if not pattern or not count:
+            return np.zeros(0, dtype=np.int64)
+        # Срез - копия, поэтому индексатор может дописывать offsets, пока идёт поиск
+        offsets = np.frombuffer(self.offsets[:count + 1], dtype=np.uint64).astype(np.int64)
+        positions = self.trigrams.positions(pattern, limit)
+        if '"' in text:
+            # В значениях в кавычках кавычка записана дважды
+            positions = np.concatenate([positions, self.trigrams.positions(pattern.replace(b'"', b'""'), limit)])
+        rows = np.unique(np.searchsorted(offsets, positions, side='right') - 1)
+        rows = rows[(rows >= 0) & (rows < count)]
+        if text.startswith(' ') or any(x in text for x in (self.delimiter, '"', '\r', '\n')):
+            rows = rows[np.fromiter((any(text in value for value in self.row(row)) for row in rows.tolist()),
+                                    dtype=bool, count=len(rows))]
+        return rows
+
+    def column_pattern(self, col: int) -> re.Pattern:
+        """
+        Регулярное выражение, которое находит значение столбца col в каждой строке без кавычек.
+        Как при skipinitialspace, пробелы в начале значения в него не входят.
+        Строки, в которых меньше столбцов, не находятся - тогда блок читается по рядам
+        """
+
+        d = re.escape(self.delimiter)
+        # Пустые строки между рядами пропускаются, как и при индексации
+        skip = f'(?:[^{d}\\n]*{d}){{{col}}} *' if col else '(?=[^\\r\\n]) *'
+        return re.compile(f'^{skip}([^{d}\\r\\n]*)', re.MULTILINE)
+
+    def line_terminator(self) -> str:
+        header = self.mm[self.header_start:self.data_start]
+        return '\n' if header.endswith(b'\n') and not header.endswith(b'\r\n') else '\r\n'
+
+    def copy_bytes(self, f, start: int, stop: int):
+        """
+        Копирует байты start:stop порциями по COPY_BLOCK, не читая их в память целиком.
+        Если последний ряд файла не заканчивался переводом строки, он дописывается
+        """
+
+        for pos in range(start, stop, COPY_BLOCK):
+            f.write(self.mm[pos:min(pos + COPY_BLOCK, stop)])
+        if stop > start and self.mm[stop - 1:stop] != b'\n':
+            f.write(self.line_terminator().encode('ascii'))
+
+    def copy_rows(self, f, first: int, last: int):
+        """
+        Копирует ряды first:last так, как они записаны в файле
+        """
+
+        self.copy_bytes(f, self.offsets[first], self.offsets[last])
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.file.close()
+
+
+def save_atomically(path: str, write, before_replace=None):
+    """
+    Записывает файл через временный файл в той же папке, который потом заменяет исходный (os.replace).
+    Если запись прервётся, исходный файл останется нетронутым
+    :param path: Путь к сохраняемому файлу
+    :param write: Функция, которая пишет содержимое в открытый двоичный файл
+    :param before_replace: Вызывается перед заменой файла (например, чтобы закрыть отображение исходного файла)
+    """
+
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+        if before_replace is not None:
+            before_replace()
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,56 @@
+import csv
+import time
+from array import array
+from column_store import ColumnStore
+from csv_index import CsvIndex
+
+# Сколько рядов csv файла добавляется в ColumnStore за один раз при чтении в отдельном процессе
+PARSE_CHUNK = 5000
+
+# Функции этого модуля выполняются в процессах ProcessPoolExecutor (см. CsvPoolLoader), поэтому
+# модуль не импортирует PyQt, а результаты - компактные массивы, которые передаются в окно через pickle
+
+
+def index_csv_file(path: str, encoding: str, delimiter: str) -> tuple[array, float]:
+    """
+    Строит CsvIndex файла. Индекс триграмм для поиска окно строит потом само (TrigramIndexer)
+    :return: (границы рядов, время работы в секундах).
+        Окно подключает их к своему CsvIndex через CsvIndex.adopt()
+    """
+
+    start = time.perf_counter()
+    index = CsvIndex(path, encoding, delimiter)
+    try:
+        for _ in index.build():
+            pass
+        result = index.offsets
+    finally:
+        index.close()
+    return result, time.perf_counter() - start
+
+
+def parse_csv_file(path: str, delimiter: str, encoding: str) -> tuple[ColumnStore, float]:
+    """
+    Читает файл целиком в ColumnStore (для файлов, которые CsvIndex не поддерживает).
+    Ряды разбираются так же, как в CsvLoader
+    :return: (данные таблицы, время работы в секундах)
+    """
+
+    start = time.perf_counter()
+    store = None
+    chunk = list()
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        for row in csv.reader(f, delimiter=delimiter, skipinitialspace=True):
+            if not row:
+                continue
+            if store is None:
+                store = ColumnStore(row)
+                continue
+            chunk.append(row)
+            if len(chunk) >= PARSE_CHUNK:
+                store.append_rows(chunk)
+                chunk = []
+    if store is None:
+        store = ColumnStore([])
+    store.append_rows(chunk)
+    return store, time.perf_counter() - start
@@ -0,0 +1,66 @@
+import numpy as np
+
+# Сколько точек линейного графика передаётся в seaborn
+MAX_PLOT_POINTS = 4000
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Прореживание ряда точек методом Largest-Triangle-Three-Buckets.
+    Точки делятся на threshold - 2 корзины, и из каждой берётся точка, образующая самый большой
+    треугольник с точкой, выбранной в предыдущей корзине, и средней точкой следующей корзины.
+    Пики и провалы при этом сохраняются, поэтому форма графика не меняется
+    :param x: Значения по оси X, отсортированные по возрастанию
+    :param y: Значения по оси Y
+    :param threshold: Сколько точек нужно оставить
+    :return: Номера оставленных точек по возрастанию
+    """
+
+    count = len(x)
+    if count <= threshold or threshold < 3:
+        return np.arange(count)
+    # Первая и последняя точки остаются всегда, остальные делятся на корзины
+    edges = (np.arange(threshold - 1) * ((count - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = count - 1
+    sizes = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / sizes, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / sizes, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def clean_series(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Готовит точки линейного графика: убирает пустые значения и сортирует по X
+    :return: Пара массивов (X, Y)
+    """
+
+    known = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[known], y[known]
+    order = np.argsort(x, kind='stable')
+    return x[order], y[order]
+
+
+def visible_points(x: np.ndarray, y: np.ndarray, x_min: float = -np.inf, x_max: float = np.inf,
+                   limit: int = MAX_PLOT_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Точки, попадающие в диапазон [x_min, x_max], прореженные до limit штук.
+    По одной точке с каждой стороны диапазона тоже берётся, чтобы линия доходила до краёв графика
+    :param x: Значения по оси X, отсортированные по возрастанию (см. clean_series)
+    :param y: Значения по оси Y
+    :return: Пара массивов (X, Y)
+    """
+
+    lo = max(int(np.searchsorted(x, x_min, 'left')) - 1, 0)
+    hi = min(int(np.searchsorted(x, x_max, 'right')) + 1, len(x))
+    x, y = x[lo:hi], y[lo:hi]
+    selected = lttb(x, y, limit)
+    return x[selected], y[selected]
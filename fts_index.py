@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import tempfile
+from functools import cache
+from sqlite_schema import quote_name
+
+# Название, под которым временная БД с полнотекстовыми индексами подключается к открытой БД
+SEARCH_SCHEMA = 'tipy_search'
+
+# Сколько рядов таблицы БД за раз добавляется в полнотекстовый индекс
+FTS_CHUNK = 20000
+
+
+@cache
+def fts_available() -> bool:
+    """
+    Проверяет, собран ли SQLite с FTS5 и токенизатором trigram (SQLite 3.34+)
+    """
+
+    con = sqlite3.connect(':memory:')
+    try:
+        con.execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+        return True
+    except sqlite3.Error:
+        return False
+    finally:
+        con.close()
+
+
+def fts_columns(count: int) -> list[str]:
+    return [f'c{col}' for col in range(count)]
+
+
+def fts_values(prefix: str, titles: list[str]) -> str:
+    """
+    Значения столбцов ряда для индекса - текст, как его показывает таблица
+    :param prefix: 'old.' или 'new.' в триггерах, '' в SELECT
+    """
+
+    return ', '.join(f'CAST({prefix}{quote_name(title)} AS TEXT)' for title in titles)
+
+
+def build_fts(path: str, search_path: str, table: str, name: str, titles: list[str]):
+    """
+    Строит полнотекстовый индекс таблицы БД через собственное соединение (вызывается в потоке).
+    Индекс без копии данных (content=''): в нём хранятся только триграммы и rowid рядов.
+    Ряды добавляются порциями по FTS_CHUNK, каждая порция - отдельная транзакция, поэтому
+    чтение не мешает записи изменений из программы. Генератор, отдающий процент готовности
+    :param path: Путь к открытой БД
+    :param search_path: Путь к временной БД с индексами
+    :param name: Название индекса во временной БД
+    """
+
+    con = sqlite3.connect(path)
+    try:
+        con.execute(f'ATTACH DATABASE ? AS {SEARCH_SCHEMA}', (search_path,))
+        source = quote_name(table)
+        con.execute(f'DROP TABLE IF EXISTS {SEARCH_SCHEMA}.{name}')
+        con.execute(f"CREATE VIRTUAL TABLE {SEARCH_SCHEMA}.{name} USING fts5({', '.join(fts_columns(len(titles)))}, "
+                    f"content='', tokenize='trigram case_sensitive 1')")
+        con.commit()
+        last = con.execute(f'SELECT max(rowid) FROM main.{source}').fetchone()[0] or 0
+        rowid = None
+        while True:
+            bound = 'WHERE rowid > ?' if rowid is not None else ''
+            params = [rowid] if rowid is not None else []
+            con.execute(f'INSERT INTO {SEARCH_SCHEMA}.{name}(rowid, {", ".join(fts_columns(len(titles)))}) '
+                        f'SELECT rowid, {fts_values("", titles)} FROM main.{source} {bound} '
+                        f'ORDER BY rowid LIMIT ?', params + [FTS_CHUNK])
+            end = con.execute(f'SELECT max(rowid) FROM (SELECT rowid FROM main.{source} {bound} '
+                              f'ORDER BY rowid LIMIT ?)', params + [FTS_CHUNK]).fetchone()[0]
+            con.commit()
+            if end is None:
+                break
+            rowid = end
+            yield int(rowid * 100 / last) if last > 0 else 100
+    except BaseException:
+        con.rollback()
+        try:
+            con.execute(f'DROP TABLE IF EXISTS {SEARCH_SCHEMA}.{name}')
+            con.commit()
+        except sqlite3.Error:
+            pass
+        raise
+    finally:
+        con.close()
+    yield 100
+
+
+class SearchDatabase:
+    """
+    Временная БД с полнотекстовыми индексами (FTS5) таблиц открытой БД.
+    Файл пользователя не меняется: индексы лежат в отдельном временном файле, который подключается
+    к соединению программы (ATTACH), а изменения из программы попадают в индекс через временные
+    триггеры (TEMP TRIGGER), которые тоже не записываются в файл пользователя.
+    Индекс таблицы строится один раз и используется до конца сеанса
+
+    Атрибуты
+    ------
+    con : sqlite3.Connection
+        Соединение программы с открытой БД.
+    path : str
+        Путь к временной БД.
+    names : dict
+        Названия индексов во временной БД: название таблицы -> название индекса.
+    tables : dict
+        Таблицы, индекс которых готов и подключён: название таблицы -> название индекса вместе с названием БД
+        (None, если индекс построить не удалось).
+    attached : bool
+        True, если временная БД уже подключена к con.
+
+    Методы
+    ------
+    index_name() :
+        Название индекса для таблицы.
+    activate() :
+        Подключает готовый индекс таблицы к соединению программы и создаёт триггеры.
+    drop() :
+        Удаляет индекс таблицы (например, после изменения таблицы SQL запросом).
+    close() :
+        Отключает временную БД и удаляет её файл.
+    """
+
+    def __init__(self, con: sqlite3.Connection):
+        self.con = con
+        fd, self.path = tempfile.mkstemp(prefix='tipy_search_', suffix='.sqlite')
+        os.close(fd)
+        self.names = dict()
+        self.tables = dict()
+        self.attached = False
+
+    def index_name(self, table: str) -> str:
+        """
+        Индекс называется tipy_fts_<номер>: в триггерах таблица указывается без названия БД,
+        поэтому имя не должно совпадать ни с одной таблицей открытой БД
+        """
+
+        name = self.names.get(table)
+        if name is None:
+            taken = set(self.names.values())
+            taken.update(x[0].lower() for x in self.con.execute('SELECT name FROM main.sqlite_master'))
+            number = len(self.names)
+            while f'tipy_fts_{number}' in taken:
+                number += 1
+            name = self.names[table] = f'tipy_fts_{number}'
+        return name
+
+    def activate(self, table: str, titles: list[str]):
+        """
+        Вызывается, когда в соединении программы нет открытой транзакции (после записи очереди изменений)
+        """
+
+        name = self.index_name(table)
+        if not self.attached:
+            self.con.execute(f'ATTACH DATABASE ? AS {SEARCH_SCHEMA}', (self.path,))
+            self.attached = True
+        source = quote_name(table)
+        columns = ', '.join(fts_columns(len(titles)))
+        delete = f"INSERT INTO {name}({name}, rowid, {columns}) VALUES('delete', old.rowid, {fts_values('old.', titles)});"
+        insert = f"INSERT INTO {name}(rowid, {columns}) VALUES(new.rowid, {fts_values('new.', titles)});"
+        for event, body in (('INSERT', insert), ('UPDATE', delete + insert), ('DELETE', delete)):
+            self.con.execute(f'DROP TRIGGER IF EXISTS temp.{name}_{event.lower()}')
+            self.con.execute(f'CREATE TEMP TRIGGER {name}_{event.lower()} AFTER {event} ON main.{source} '
+                             f'BEGIN {body} END')
+        self.con.commit()
+        self.tables[table] = f'{SEARCH_SCHEMA}.{name}'
+
+    def drop(self, table: str):
+        """
+        Название индекса остаётся за таблицей: при следующем построении он создаётся заново
+        """
+
+        name = self.names.get(table)
+        self.tables.pop(table, None)
+        if name is None or not self.attached:
+            return
+        for event in ('insert', 'update', 'delete'):
+            self.con.execute(f'DROP TRIGGER IF EXISTS temp.{name}_{event}')
+        self.con.execute(f'DROP TABLE IF EXISTS {SEARCH_SCHEMA}.{name}')
+        self.con.commit()
+
+    def close(self):
+        if self.attached:
+            try:
+                for name in self.names.values():
+                    for event in ('insert', 'update', 'delete'):
+                        self.con.execute(f'DROP TRIGGER IF EXISTS temp.{name}_{event}')
+                self.con.commit()
+                self.con.execute(f'DETACH DATABASE {SEARCH_SCHEMA}')
+            except sqlite3.Error:
+                pass
+            self.attached = False
+        self.tables = dict()
+        self.names = dict()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,276 @@
+import math
+import sqlite3
+from itertools import permutations
+from sqlite_schema import estimated_rows, quote_name
+from workers import is_full_scan
+from write_queue import PendingRowid
+
+# Сколько раз операции должны просмотреть таблицу целиком из-за одних и тех же столбцов условия,
+# прежде чем программа предложит индекс
+ADVICE_REPEATS = 3
+
+# Сколько столбцов условия перебирается при подборе составного индекса
+ADVICE_COLUMNS = 3
+
+# Название пробного индекса в копии схемы
+TRIAL_INDEX = 'tipy_trial_index'
+
+
+def index_statement(table: str, columns: list[str]) -> str:
+    """
+    CREATE INDEX для индекса, который предлагает программа (tipy_<таблица>_<столбцы>)
+    """
+
+    name = '_'.join(['tipy', table] + list(columns))
+    return (f'CREATE INDEX IF NOT EXISTS {quote_name(name)} ON {quote_name(table)}'
+            f'({", ".join(map(quote_name, columns))})')
+
+
+def search_terms(plan: list, index: str) -> int | None:
+    """
+    :param plan: Шаги EXPLAIN QUERY PLAN
+    :param index: Название индекса
+    :return: Сколько условий запроса проверяется поиском по индексу (SEARCH ... USING INDEX index (a=? AND b>?)),
+        None, если индекс не используется для поиска
+    """
+
+    for step in plan:
+        detail = str(step[-1])
+        marker = f' INDEX {index} ('
+        if detail.startswith('SEARCH ') and marker in detail:
+            terms = detail[detail.index(marker) + len(marker):].rstrip(')').split(' AND ')
+            return sum(1 for term in terms if not term.startswith('rowid'))
+    return None
+
+
+class IndexAdvice:
+    """
+    Индекс, который помог бы операциям, просматривающим таблицу целиком
+
+    Атрибуты
+    ------
+    table : str
+        Название таблицы.
+    columns : tuple
+        Столбцы индекса.
+    rows : int | None
+        Примерное количество рядов таблицы.
+    count : int
+        Сколько раз операции просмотрели таблицу целиком.
+    seconds : float
+        Сколько времени заняли эти операции (там, где оно известно).
+    sources : set
+        Какие операции просматривали таблицу (SQL запрос, изменение ячеек, удаление рядов).
+
+    Методы
+    ------
+    statement() :
+        Текст CREATE INDEX.
+    benefit() :
+        На сколько рядов меньше прочитали бы операции с индексом.
+    """
+
+    def __init__(self, table: str, columns: tuple, rows: int | None):
+        self.table = table
+        self.columns = columns
+        self.rows = rows
+        self.count = 0
+        self.seconds = 0.0
+        self.sources = set()
+
+    def statement(self) -> str:
+        return index_statement(self.table, list(self.columns))
+
+    def benefit(self) -> int | None:
+        """
+        Без индекса операция читает все ряды таблицы, с индексом - примерно log2(рядов) страниц дерева
+        """
+
+        if self.rows is None:
+            return None
+        return self.count * max(self.rows - math.ceil(math.log2(self.rows + 1)), 0)
+
+
+class IndexAdvisor:
+    """
+    Советчик индексов: смотрит планы запросов, которые выполняет программа (изменения ячеек,
+    удаление рядов, SQL запросы), и запоминает, какие столбцы условий заставляют SQLite
+    просматривать таблицу целиком и сколько раз это происходило.
+    Подходящий индекс подбирается на копии схемы БД без данных: в неё добавляется пробный индекс,
+    и по EXPLAIN QUERY PLAN видно, находит ли запрос ряды поиском по нему вместо полного просмотра.
+    План каждого текста запроса разбирается один раз (до изменения схемы БД)
+
+    Атрибуты
+    ------
+    con : sqlite3.Connection
+        Соединение с базой данных.
+    plans : dict
+        Разобранные запросы: текст запроса -> список пар (таблица, столбцы индекса).
+    advice : dict
+        Наблюдения: (таблица, столбцы индекса) -> IndexAdvice.
+    schema_version : int | None
+        Версия схемы БД, для которой разобраны запросы.
+
+    Методы
+    ------
+    observe() :
+        Учитывает выполненную операцию и возвращает советы, которые набрали ADVICE_REPEATS повторов.
+    analyze() :
+        Подбирает индексы, которые убрали бы полные просмотры таблиц в запросе.
+    schema_copy() :
+        Копия схемы БД в памяти.
+    best_index() :
+        Подбирает столбцы и их порядок для индекса одной таблицы.
+    created() :
+        Убирает наблюдения, которые покрывает созданный индекс.
+    """
+
+    def __init__(self, con: sqlite3.Connection):
+        self.con = con
+        self.plans = dict()
+        self.advice = dict()
+        self.schema_version = None
+
+    def observe(self, sql: str, params=(), source: str = '', seconds: float = None) -> list[IndexAdvice]:
+        """
+        :param params: Параметры запроса (могут содержать PendingRowid)
+        :param source: Название операции для сообщения
+        :param seconds: Время выполнения операции, если оно известно
+        :return: Советы, которые этой операцией набрали ADVICE_REPEATS повторов
+        """
+
+        ready = list()
+        for table, columns in self.analyze(sql, params):
+            advice = self.advice.get((table, columns))
+            if advice is None:
+                advice = self.advice[table, columns] = IndexAdvice(table, columns, estimated_rows(self.con, table))
+            advice.count += 1
+            advice.seconds += seconds or 0.0
+            advice.sources.add(source)
+            if advice.count == ADVICE_REPEATS:
+                ready.append(advice)
+        return ready
+
+    def analyze(self, sql: str, params=()) -> list[tuple[str, tuple]]:
+        """
+        :return: Пары (таблица, столбцы индекса) для таблиц, которые запрос просматривает целиком,
+            а с индексом находил бы ряды поиском
+        """
+
+        try:
+            version = self.con.execute('PRAGMA schema_version').fetchone()[0]
+        except sqlite3.Error:
+            return []
+        if version != self.schema_version:
+            self.plans = dict()
+            self.schema_version = version
+        if sql in self.plans:
+            return self.plans[sql]
+        params = [None if isinstance(x, PendingRowid) else x for x in params]
+        found = self.plans[sql] = list()
+        try:
+            plan = self.con.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        except sqlite3.Error:
+            return found
+        if not any(is_full_scan(step[-1]) for step in plan):
+            return found
+        copy = self.schema_copy()
+        try:
+            # Столбцы, которые запрос читает, собираются при подготовке EXPLAIN в копии схемы
+            read = dict()
+
+            def authorize(action, table, column, db_name, trigger):
+                if action == sqlite3.SQLITE_READ and db_name == 'main' and column:
+                    read.setdefault(table, list())
+                    if column not in read[table]:
+                        read[table].append(column)
+                return sqlite3.SQLITE_OK
+
+            copy.set_authorizer(authorize)
+            try:
+                scans = sum(is_full_scan(step[-1]) for step in copy.execute('EXPLAIN QUERY PLAN ' + sql, params))
+            except sqlite3.Error:
+                return found
+            copy.set_authorizer(None)
+            tables = {x[0] for x in copy.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                                 "AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE 'CREATE VIRTUAL%'")}
+            for table, columns in read.items():
+                if table in tables:
+                    columns = self.best_index(copy, sql, params, table, columns, scans)
+                    if columns:
+                        found.append((table, columns))
+        finally:
+            copy.close()
+        return found
+
+    def schema_copy(self) -> sqlite3.Connection:
+        """
+        Таблицы, индексы и представления открытой БД без данных. Статистика ANALYZE тоже переносится,
+        чтобы SQLite выбирал план так же, как для настоящей БД
+        """
+
+        copy = sqlite3.connect(':memory:')
+        schema = self.con.execute("SELECT type, sql FROM main.sqlite_master WHERE sql IS NOT NULL "
+                                  "AND name NOT LIKE 'sqlite_%' AND type IN ('table', 'index', 'view')").fetchall()
+        for kind in ('table', 'index', 'view'):
+            for _, sql in (x for x in schema if x[0] == kind):
+                try:
+                    copy.execute(sql)
+                except sqlite3.Error:
+                    # Например, виртуальная таблица модуля, которого нет в этой сборке SQLite
+                    pass
+        try:
+            stats = self.con.execute('SELECT tbl, idx, stat FROM main.sqlite_stat1').fetchall()
+        except sqlite3.Error:
+            stats = []
+        if stats:
+            copy.execute('ANALYZE')
+            copy.execute('DELETE FROM sqlite_stat1')
+            copy.executemany('INSERT INTO sqlite_stat1 VALUES(?, ?, ?)', stats)
+            copy.execute('ANALYZE sqlite_schema')
+        copy.commit()
+        return copy
+
+    def best_index(self, copy: sqlite3.Connection, sql: str, params: list, table: str, columns: list[str],
+                   scans: int) -> tuple | None:
+        """
+        Пробует индексы по одному столбцу, а затем составные из подошедших столбцов во всех порядках.
+        Лучший индекс проверяет поиском больше всего условий, при равенстве - короче
+        :param scans: Сколько полных просмотров в плане без пробного индекса
+        :return: Столбцы индекса или None, если запрос не находит ряды таблицы поиском ни по одному индексу
+        """
+
+        def trial(candidate: tuple) -> int | None:
+            copy.execute(f'CREATE INDEX {TRIAL_INDEX} ON {quote_name(table)}({", ".join(map(quote_name, candidate))})')
+            try:
+                plan = copy.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+            finally:
+                copy.execute(f'DROP INDEX {TRIAL_INDEX}')
+            # В соединениях индекс может перенести полный просмотр на другую таблицу, но не добавить новый
+            if sum(is_full_scan(step[-1]) for step in plan) > scans:
+                return None
+            return search_terms(plan, TRIAL_INDEX)
+
+        scores = dict()
+        for column in columns:
+            score = trial((column,))
+            if score:
+                scores[(column,)] = score
+        useful = sorted((x[0] for x in scores), key=lambda x: -scores[(x,)])[:ADVICE_COLUMNS]
+        for size in range(2, len(useful) + 1):
+            for candidate in permutations(useful, size):
+                score = trial(candidate)
+                if score:
+                    # Индекс используется только первыми score столбцами
+                    scores[candidate[:score]] = score
+        if not scores:
+            return None
+        return max(scores, key=lambda x: (scores[x], -len(x)))
+
+    def created(self, table: str, columns: list[str]):
+        """
+        Индекс покрывает наблюдения, столбцы которых - начало его столбцов
+        """
+
+        for key in [key for key in self.advice if key[0] == table and tuple(columns[:len(key[1])]) == key[1]]:
+            del self.advice[key]
@@ -0,0 +1,115 @@
+import sqlite3
+import numpy as np
+from column_store import Column
+from downsampling import clean_series, visible_points
+from sqlite_schema import quote_name
+
+# На сколько интервалов делится числовая ось X при построении графика по таблице БД
+PLOT_BINS = 1000
+
+
+def preload():
+    """
+    Загружает seaborn и matplotlib. Они нужны только для графиков, а их импорт (вместе с pandas и scipy)
+    занимает секунды, поэтому они загружаются при первом графике или заранее в фоне (см. PlotPreloader)
+    """
+
+    import seaborn
+    import matplotlib.figure
+
+
+def plot_columns(axes, column_x: Column, column_y: Column) -> tuple[tuple | None, str]:
+    """
+    Рисует график по столбцам таблицы, загруженной в память.
+    Если оба столбца числовые, рисуется линия, иначе - столбчатая диаграмма
+    :return: Все точки линейного графика (или None для столбчатой диаграммы) и сообщение для окна
+    :raise TypeError: Если Y нечисловой (так делает seaborn)
+    """
+
+    import seaborn as sns
+
+    # Числовые столбцы приходят одним массивом NumPy, текстовые - списком строк
+    numeric_x = column_x.numeric()
+    numeric_y = column_y.numeric()
+    if numeric_x is None or numeric_y is None:
+        sns.barplot(x=column_x.values() if numeric_x is None else numeric_x,
+                    y=column_y.values() if numeric_y is None else numeric_y, ax=axes)
+        return None, ''
+    # Линейный график прореживается: больше точек, чем пикселей, всё равно не видно.
+    # Весь ряд возвращается, чтобы при приближении прорядить заново только видимую часть
+    series = clean_series(numeric_x, numeric_y)
+    data_x, data_y = visible_points(*series)
+    sns.lineplot(x=data_x, y=data_y, estimator=None, ax=axes)
+    return series, ''
+
+
+def numeric_columns(con: sqlite3.Connection, table: str, *columns: str) -> list[bool]:
+    """
+    Проверяет за один проход по таблице внутри SQLite, что все непустые значения столбцов - числа.
+    В программу передаётся только результат проверки
+    """
+
+    checks = ', '.join(f"coalesce(min(typeof({quote_name(col)}) IN ('integer', 'real', 'null')), 1)"
+                       for col in columns)
+    return [bool(x) for x in con.execute(f'SELECT {checks} FROM {quote_name(table)}').fetchone()]
+
+
+def grouped_means(con: sqlite3.Connection, table: str, x: str, y: str) -> tuple[list[str], list[float]]:
+    """
+    Средние значения столбца y для каждого значения столбца x.
+    Значения x, у которых все y пустые, пропускаются: avg() для них вернул бы NULL
+    :return: Пара списков (значения x, средние y)
+    """
+
+    x, y = quote_name(x), quote_name(y)
+    rows = con.execute(f'SELECT {x}, avg({y}) FROM {quote_name(table)} WHERE {y} IS NOT NULL '
+                       f'GROUP BY {x} ORDER BY {x}').fetchall()
+    return ['' if row[0] is None else str(row[0]) for row in rows], [row[1] for row in rows]
+
+
+def binned_means(con: sqlite3.Connection, table: str, x: str, y: str, bins: int) -> tuple[np.ndarray, ...]:
+    """
+    Делит диапазон значений числового столбца x на bins равных интервалов
+    и считает по каждому интервалу средние X и Y, минимум и максимум Y.
+    Из БД передаётся не больше bins рядов, сколько бы рядов ни было в таблице
+    :return: Массивы (средний X, средний Y, минимальный Y, максимальный Y), упорядоченные по X
+    """
+
+    table, x, y = quote_name(table), quote_name(x), quote_name(y)
+    where = f'WHERE {x} IS NOT NULL AND {y} IS NOT NULL'
+    lo, hi = con.execute(f'SELECT min({x}), max({x}) FROM {table} {where}').fetchone()
+    if lo is None:
+        return tuple(np.empty(0) for _ in range(4))
+    width = float(hi - lo) / bins or 1.0
+    rows = con.execute(f'SELECT min(CAST(({x} - ?) / ? AS INTEGER), ?) AS bin, avg({x}), avg({y}), '
+                       f'min({y}), max({y}) FROM {table} {where} GROUP BY bin ORDER BY bin',
+                       (lo, width, bins - 1)).fetchall()
+    return tuple(np.array([row[i] for row in rows], dtype=np.float64) for i in range(1, 5))
+
+
+def plot_database(axes, con: sqlite3.Connection, table: str, x: str, y: str,
+                  bins: int = PLOT_BINS) -> tuple[None, str]:
+    """
+    Рисует график по таблице БД, не загружая её: значения агрегируются запросами к SQLite,
+    и в программу передаются только их результаты.
+    Для нечислового X считается среднее Y по каждому значению X (GROUP BY),
+    для числового - средние по bins равным интервалам X вместе с разбросом Y
+    :return: None (точки графика не хранятся) и сообщение для окна
+    :raise TypeError: Если Y нечисловой
+    """
+
+    import seaborn as sns
+
+    numeric_x, numeric_y = numeric_columns(con, table, x, y)
+    if not numeric_y:
+        # Как и seaborn, среднее по нечисловому столбцу не считаем
+        raise TypeError
+    if not numeric_x:
+        labels, means = grouped_means(con, table, x, y)
+        if labels:
+            sns.barplot(x=labels, y=means, ax=axes)
+        return None, f'Среднее по {len(labels)} значениям, посчитано в SQLite'
+    mean_x, mean_y, min_y, max_y = binned_means(con, table, x, y, bins)
+    axes.fill_between(mean_x, min_y, max_y, alpha=0.2)
+    sns.lineplot(x=mean_x, y=mean_y, estimator=None, ax=axes)
+    return None, f'Среднее по {len(mean_x)} интервалам, посчитано в SQLite'
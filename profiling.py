@@ -0,0 +1,179 @@
+import atexit
+import cProfile
+import json
+import logging
+import os
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Файл, в который пишется время выполнения операций (по строке JSON на операцию)
+LOG_PATH = os.path.join(os.path.expanduser('~'), '.tipy_timings.log')
+
+# Операции дольше стольких секунд записываются в журнал как предупреждения
+SLOW_OPERATION = 0.5
+
+# Переменная окружения, включающая профилирование всего сеанса.
+# Значение - папка для результатов ("1" - текущая папка)
+PROFILE_ENV = 'TIPY_PROFILE'
+
+# Сколько строк статистики памяти записывается при профилировании
+MEMORY_TOP = 30
+
+# Время загрузки модуля - от него отсчитывается время запуска программы
+STARTED = time.perf_counter()
+
+logger = logging.getLogger('tipy')
+
+# Операции, которые начались, но ещё не закончились
+active = list()
+
+# Последние операции, прерванные исключением
+interrupted = deque(maxlen=16)
+
+# Функции, которые вызываются после каждой операции с её названием и временем (например, строка состояния)
+listeners = list()
+
+
+class Operation:
+    """
+    Замеряемая операция.
+
+    Атрибуты
+    ------
+    name : str
+        Название операции.
+    details : dict
+        Подробности (путь к файлу, количество рядов и т.п.), попадают в журнал.
+    start : float
+        Время начала (time.perf_counter()).
+    error : BaseException | None
+        Исключение, прервавшее операцию.
+    """
+
+    def __init__(self, name: str, details: dict):
+        self.name = name
+        self.details = details
+        self.start = time.perf_counter()
+        self.error = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+
+def setup_log(path: str = LOG_PATH):
+    """
+    Включает запись времени операций в файл. Без этого операции только показываются слушателям
+    """
+
+    try:
+        handler = logging.FileHandler(path, encoding='utf-8')
+    except OSError:
+        return
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def write(level: int, entry: dict):
+    entry = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), **entry}
+    logger.log(level, json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def record(name: str, seconds: float, **details):
+    """
+    Записывает уже закончившуюся операцию (например, выполненную в другом потоке)
+    """
+
+    write(logging.WARNING if seconds > SLOW_OPERATION else logging.INFO,
+          {'op': name, 'seconds': round(seconds, 4), **details})
+    for listener in listeners:
+        listener(name, seconds)
+
+
+def begin(name: str, **details) -> Operation:
+    """
+    Начинает операцию, которая закончится позже (например, после работы фонового потока)
+    """
+
+    operation = Operation(name, details)
+    active.append(operation)
+    return operation
+
+
+def end(operation: Operation, **details) -> float:
+    """
+    Заканчивает операцию и записывает её время
+    :return: Время выполнения в секундах
+    """
+
+    seconds = operation.elapsed()
+    if operation in active:
+        active.remove(operation)
+    record(operation.name, seconds, **operation.details, **details)
+    return seconds
+
+
+@contextmanager
+def timed(name: str, **details):
+    """
+    Замеряет операцию внутри блока with.
+    Операция, прерванная исключением, тоже записывается и запоминается,
+    чтобы log_exception показал, во время какой операции возникло исключение
+    """
+
+    operation = begin(name, **details)
+    try:
+        yield operation
+    except BaseException as e:
+        operation.error = e
+        end(operation, error=f'{type(e).__name__}: {e}')
+        interrupted.append(operation)
+        raise
+    end(operation)
+
+
+def log_exception(cls, exception):
+    """
+    Записывает необработанное исключение вместе с операцией, которую оно прервало,
+    и операциями, которые в этот момент выполнялись в фоне
+    """
+
+    operations = [x for x in interrupted if x.error is exception] + active
+    write(logging.ERROR, {'op': 'exception', 'error': f'{cls.__name__}: {exception}',
+                          'operations': [{'op': x.name, 'seconds': round(x.elapsed(), 4), **x.details}
+                                         for x in operations]})
+
+
+def start_profiling() -> bool:
+    """
+    Если задана переменная окружения PROFILE_ENV, запускает cProfile и tracemalloc на весь сеанс,
+    а при выходе из программы записывает статистику в файлы tipy_<время>.prof и tipy_<время>_memory.txt.
+    cProfile замеряет только главный поток
+    :return: True, если профилирование включено
+    """
+
+    folder = os.environ.get(PROFILE_ENV)
+    if not folder:
+        return False
+    if folder == '1':
+        folder = os.getcwd()
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    atexit.register(dump_profile, profiler, folder, time.strftime('%Y%m%d_%H%M%S'))
+    return True
+
+
+def dump_profile(profiler: cProfile.Profile, folder: str, stamp: str):
+    profiler.disable()
+    base = os.path.join(folder, f'tipy_{stamp}')
+    profiler.dump_stats(base + '.prof')
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with open(base + '_memory.txt', 'w', encoding='utf-8') as f:
+        f.write(f'Текущий объём: {current / 2 ** 20:.1f} МБ, пик: {peak / 2 ** 20:.1f} МБ\n\n')
+        for stat in snapshot.statistics('lineno')[:MEMORY_TOP]:
+            f.write(f'{stat}\n')
@@ -1,15 +1,35 @@
+# Время запуска отсчитывается от загрузки profiling, поэтому он импортируется первым
+import profiling
 import sqlite3
 import sys
 import csv
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
-from PIL import Image
+import tempfile
+import time
+import cli
+from typing import TYPE_CHECKING
 from ui_files import tableinsp_design, entryform_design, sqlform_design, plotform_design
-from PyQt5.QtCore import Qt, QObject
-from PyQt5.QtGui import QKeySequence, QPixmap
+from csv_index import CsvIndex, TRIGRAM_MAX_FILE, save_atomically
+from plotting import plot_columns, plot_database
+from table_models import ListTableModel, ColumnStoreModel, SQLiteTableModel, CsvIndexModel, QueryResultModel, \
+    HistoryModel, FULL_SCAN_COLOR
+from workers import CsvLoader, CsvIndexer, CsvPoolLoader, CsvImporter, QueryWorker, PlotSampler, PlotPreloader, \
+    SearchIndexer, TrigramIndexer, is_full_scan
+from csv_pool import index_csv_file, parse_csv_file
+from fts_index import SearchDatabase, fts_available
+from text_search import SEARCH_LIMIT
+from index_advisor import IndexAdvisor, index_statement
+from query_history import QueryHistory
+from sqlite_schema import quote_name
+from write_queue import WriteQueue, PendingRowid
+from PyQt5.QtCore import Qt, QModelIndex, QTimer
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import QApplication, QDialog, QFileDialog, QWidget, QPushButton, QMessageBox, QShortcut, QLabel, \
-    QMainWindow, QTableWidgetItem, QTableWidget
+    QMainWindow, QTableView, QProgressBar, QTreeWidgetItem, QComboBox, QLineEdit, QVBoxLayout, QHBoxLayout, \
+    QAbstractItemView
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
 # Все возможные кодировки в python 3.11
 ENCODINGS = ['ascii', 'big5', 'big5hkscs', 'cp037', 'cp273', 'cp424', 'cp437', 'cp500', 'cp720', 'cp737', 'cp775',
@@ -26,6 +46,24 @@ ENCODINGS = ['ascii', 'big5', 'big5hkscs', 'cp037', 'cp273', 'cp424', 'cp437', '
              'utf8', 'utf8sig', 'utf-16', 'utf16', 'utf16le', 'utf16be', 'utf-32', 'utf32', 'utf32be', 'utf32le']
 
 
+# Сколько последних построенных графиков хранится, чтобы повторно открываться мгновенно
+PLOT_CACHE_SIZE = 8
+
+
+# Через сколько миллисекунд после последнего приближения или сдвига графика его точки прореживаются заново
+RESAMPLE_DELAY = 150
+
+# Во сколько раз меняется видимый диапазон графика за одно нажатие стрелки или прокрутку колёсика
+ZOOM_STEP = 1.25
+
+# Через сколько миллисекунд после последнего изменения строки поиска запускается поиск
+SEARCH_DELAY = 150
+
+# Если выбранные csv файлы вместе меньше стольких байт, они читаются потоками без пула процессов:
+# запуск процессов занял бы больше времени, чем само чтение
+POOL_MIN_BYTES = 32 << 20
+
+
 # Ошибка, которая будет вызываться, если была введена неизвестная кодировка
 class UnknownEncodingError(Exception):
     pass
@@ -67,6 +105,35 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
     pages_count : int
         Количество открытых вкладок.
         Нужен для корректного отображения названий вкладок (стр. 1, стр. 2 и т.п.).
+    loaders : list
+        Потоки, которые сейчас читают csv файлы.
+    write_queue : WriteQueue | None
+        Очередь изменений открытой БД. Изменения записываются пачками, а не после каждой ячейки.
+    plot_cache : dict
+        Окна последних построенных графиков: (версия данных таблицы, столбец X, столбец Y) -> PlotWindow.
+    csv_db : str | None
+        Путь к временной БД, в которую загружены открытые csv файлы для SQL запросов.
+    csv_db_key : tuple | None
+        Пути и время изменения csv файлов, загруженных в csv_db.
+    csv_con : sqlite3.Connection | None
+        Соединение с csv_db.
+    sql_form : SQLForm | None
+        Окно SQL запросов.
+    search_db : SearchDatabase | None
+        Временная БД с полнотекстовыми индексами таблиц открытой БД для поиска.
+    search_indexers : list
+        Потоки, которые сейчас строят индексы для поиска: полнотекстовые для таблиц БД (SearchIndexer)
+        и индексы триграмм csv файлов (TrigramIndexer).
+    search_model : ListTableModel | None
+        Таблица, в которой был последний поиск.
+    search_hits : list | np.ndarray
+        Ряды, найденные последним поиском (см. ListTableModel.search()).
+    search_pos : int
+        Номер найденного ряда, к которому был последний переход, -1 - переходов ещё не было.
+    index_advisor : IndexAdvisor | None
+        Советчик индексов открытой БД: запоминает полные просмотры таблиц при изменениях и SQL запросах.
+    load_timings : list
+        Пары (путь к файлу, время чтения) для csv файлов, открытых последними.
 
     Методы
     ------
@@ -74,6 +141,42 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
         Инициализирует интерфейс главного окна.
     init_table() :
         После выбора режима и/или файла инициализирует таблицу.
+    load_db_table() :
+        Подключает к виджету модель, лениво подгружающую таблицу БД.
+    activate_tab() :
+        Начинает загрузку таблицы БД при первом открытии её вкладки.
+    reload_db_tables() :
+        Заново подключает модели к вкладкам изменённых таблиц БД.
+    load_csv() :
+        Запускает фоновое чтение csv файла в таблицу.
+    load_csv_files() :
+        Запускает чтение нескольких csv файлов в пуле процессов, по вкладке на файл.
+    loading_finished() :
+        Вызывается, когда поток закончил чтение csv файла.
+    csv_file_loaded() :
+        Заполняет вкладку файлом, прочитанным в пуле процессов.
+    csv_pool_finished() :
+        Вызывается, когда пул процессов прочитал все файлы.
+    loader_done() :
+        Убирает закончивший работу поток чтения.
+    show_file_timings() :
+        Показывает в строке состояния время чтения каждого файла.
+    cancel_loading() :
+        Останавливает чтение всех csv файлов.
+    open_csv_as_sql() :
+        Загружает открытые csv файлы во временную БД и открывает окно SQL запросов к ней.
+    csv_import_finished() :
+        Вызывается, когда поток закончил загрузку csv файлов в БД.
+    drop_csv_database() :
+        Удаляет временную БД с csv файлами.
+    flush_changes() :
+        Записывает в БД все изменения из очереди.
+    show_timing() :
+        Показывает в строке состояния время последней операции.
+    show_pending_changes() :
+        Показывает в строке состояния количество незаписанных изменений.
+    show_write_errors() :
+        Сообщает об изменениях, которые не удалось записать в БД.
     change_statusbar_message() :
         Изменяет сообщение в строке состояния.
     db_table_cell_changed() :
@@ -99,20 +202,78 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
     add_table() :
         Добавляет вкладку в QTabWidget.
         Работает только при просмотре csv файлов или создании своей таблицы.
+    new_tab() :
+        Создаёт пустую вкладку с таблицей.
     del_table() :
         Удаляет вкладку из QTabWidget.
         Работает при таких же условиях, что и add_table.
     show_instruction() :
         Открывает блокнот с руководством по использованию программы.
+    preload_plotting() :
+        Загружает библиотеки для графиков в фоне.
+    init_filter_bar() :
+        Создаёт панель фильтров.
+    update_filter_bar() :
+        Показывает на панели фильтров столбцы текущей таблицы.
+    init_view() :
+        Подключает сортировку по щелчку на заголовок столбца.
+    sort_table() :
+        Сортирует таблицу по столбцу: по возрастанию, по убыванию, без сортировки.
+    apply_filter() :
+        Применяет фильтр столбца, введённый на панели фильтров.
+    reset_view() :
+        Убирает сортировку и фильтры текущей таблицы.
+    change_view() :
+        Меняет сортировку или фильтры и предлагает индекс, если таблица БД просматривается целиком.
+    suggest_index() :
+        Предлагает создать индекс под сортировку и фильтры таблицы БД.
+    advise_indexes() :
+        Передаёт операции советчику индексов и предлагает индексы под повторяющиеся полные просмотры.
+    create_index() :
+        Создаёт предложенный индекс.
+    init_search_bar() :
+        Создаёт строку поиска.
+    focus_search() :
+        Переводит фокус в строку поиска (Ctrl+F).
+    run_search() :
+        Ищет текст строки поиска в текущей таблице.
+    show_hit() :
+        Переходит к следующему или предыдущему найденному ряду.
+    build_search_index() :
+        Запускает построение полнотекстового индекса таблицы БД.
+    search_index_built() :
+        Подключает построенный полнотекстовый индекс.
+    drop_search_database() :
+        Останавливает построение индексов и удаляет временную БД поиска.
     """
 
     def __init__(self):
         super().__init__()
         self.setupUi(self)
         self.init_vars()
+        self.progressBar = QProgressBar(self)
+        self.progressBar.setMaximumWidth(150)
+        self.progressBar.hide()
+        self.cancelButton = QPushButton('Отмена', self)
+        self.cancelButton.hide()
+        self.pendingLabel = QLabel(self)
+        self.pendingLabel.hide()
+        self.timingLabel = QLabel(self)
+        self.statusBar().addPermanentWidget(self.timingLabel)
+        profiling.listeners.append(self.show_timing)
+        self.statusBar().addPermanentWidget(self.pendingLabel)
+        self.statusBar().addPermanentWidget(self.progressBar)
+        self.statusBar().addPermanentWidget(self.cancelButton)
+        self.cancelButton.clicked.connect(self.cancel_loading)
+        self.init_filter_bar()
+        self.init_search_bar()
+        self.init_view(self.tableView)
         self.helpButton.clicked.connect(self.show_instruction)
         self.openButton.clicked.connect(self.open_file)
+        self.tabWidget.currentChanged.connect(self.activate_tab)
         self.tabWidget.currentChanged.connect(self.change_statusbar_message)
+        self.tabWidget.currentChanged.connect(self.update_filter_bar)
+        self.tabWidget.currentChanged.connect(lambda: self.run_search(jump=False))
         self.open_file()
 
     def init_vars(self):
@@ -130,16 +291,39 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
         self.new_file_opened = False
         self.files_opened = 0
         self.pages_count = 1
-
-    def init_table(self, source: str):
+        self.loaders = list()
+        self.write_queue = None
+        self.plot_cache = dict()
+        self.csv_db = None
+        self.csv_db_key = None
+        self.csv_con = None
+        self.sql_form = None
+        self.preloader = None
+        self.declined_indexes = set()
+        self.search_db = None
+        self.search_indexers = list()
+        self.search_model = None
+        self.search_hits = list()
+        self.search_pos = -1
+        self.index_advisor = None
+        self.load_timings = list()
+
+    def init_table(self, source: str, extra: list[str] = ()):
         """
         Подключаемся к ДБ (если выбрана ДБ), создаём такое же количество вкладок,
         какое количество таблиц есть в БД, заполняем их данными
         Если выбрана не БД, создаём одну вкладку,
         заполняем её данными из выбранного csv файла
+        :param extra: Ещё csv файлы, выбранные вместе с source: каждый открывается в своей вкладке
         """
 
         self.paths = []
+        self.cancel_loading()
+        self.flush_changes()
+        self.drop_csv_database()
+        self.drop_search_database()
+        self.write_queue = None
+        self.index_advisor = None
         if source or 'csv' in self.mode:
             self.files_opened += 1
         btn_txt = [i.text() for i in self.findChildren(QPushButton)]
@@ -148,8 +332,8 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
                 self.addTableButton.deleteLater()
                 if 'Удалить таблицу' in btn_txt:
                     self.delTableButton.deleteLater()
-            if self.tableWidget.receivers(self.tableWidget.cellChanged) > 0:
-                self.tableWidget.disconnect()
+            if source.split('.')[-1] != 'csv' and 'Открыть как SQL' in btn_txt:
+                self.csvSqlButton.deleteLater()
             for i in range(1, self.tabWidget.count()):
                 self.tabWidget.removeTab(1)
             if 'csv' == source.split('.')[-1] or not source:
@@ -173,7 +357,17 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
             self.plotButton.clicked.connect(self.build_plot)
         if source.split('/')[-1].split('.')[-1] != 'csv' and 'csv' not in self.mode:
             self.con = sqlite3.connect(source)
+            try:
+                self.con.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.OperationalError:
+                # БД открыта только для чтения - режим журнала не меняем
+                pass
             self.cur = self.con.cursor()
+            self.write_queue = WriteQueue(self.con, self)
+            self.write_queue.pending_changed.connect(self.show_pending_changes)
+            self.write_queue.failed.connect(self.show_write_errors)
+            self.index_advisor = IndexAdvisor(self.con)
+            self.shortcut.activated.connect(self.flush_changes)
             self.tables = self.cur.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
             if 'Ввести SQL запрос' not in [i.text() for i in self.findChildren(QPushButton)]:
                 self.sqlButton = QPushButton('Ввести SQL запрос', self)
@@ -183,16 +377,15 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
                 if i != 0:
                     cur_widget = QWidget(self)
                     self.tabWidget.addTab(cur_widget, self.tables[i][0])
-                    cur_table = QTableWidget(cur_widget)
+                    cur_table = QTableView(cur_widget)
+                    self.init_view(cur_table)
                 else:
                     self.tabWidget.setTabText(0, self.tables[0][0])
-                    cur_table = self.tableWidget
+                    cur_table = self.tableView
                 cur_table.setGeometry(0, 0, 831, 731)
-                titles = list([x[1] for x in self.cur.execute(f'PRAGMA table_info({self.tables[i][0]})').fetchall()])
-                data = self.cur.execute(f'SELECT * FROM {self.tables[i][0]}').fetchall()
-                fill_table(cur_table, titles, data)
-                cur_table.cellChanged.connect(self.db_table_cell_changed)
-                cur_table.resizeColumnsToContents()
+                self.load_db_table(cur_table, self.tables[i][0])
+                self.tabWidget.setTabToolTip(i, cur_table.model().schema_label())
+            self.activate_tab(self.tabWidget.currentIndex())
 
         elif 'csv' not in self.mode:
             if 'Добавить таблицу' not in btn_txt:
@@ -202,13 +395,14 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
                 self.verticalLayout.addWidget(self.delTableButton)
                 self.addTableButton.clicked.connect(self.add_table)
                 self.delTableButton.clicked.connect(self.del_table)
-            with open(source, 'r', encoding=self.csv_encoding) as f:
-                reader = [row for row in csv.reader(f, delimiter=self.csv_del, skipinitialspace=True) if row]
-                titles = reader[0]
-                rd = reader[1::]
-                fill_table(self.tableWidget, titles, rd)
-                self.tableWidget.resizeColumnsToContents()
-                self.tables = [rd.copy()]
+            if 'Открыть как SQL' not in btn_txt:
+                self.csvSqlButton = QPushButton('Открыть как SQL', self)
+                self.verticalLayout.addWidget(self.csvSqlButton)
+                self.csvSqlButton.clicked.connect(self.open_csv_as_sql)
+            self.tables = ['стр. 1']
+            self.pages_count = 1
+            tables = [self.tableView] + [self.new_tab() for _ in extra]
+            self.load_csv_files(tables, [source] + list(extra))
 
         else:
             self.tables = ['стр. 1']
@@ -221,81 +415,393 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
                 self.addColButton = QPushButton('Добавить столбец', self)
                 self.addColButton.clicked.connect(self.add_col)
             self.verticalLayout.insertWidget(1, self.addColButton)
-            self.tableWidget.clear()
-            self.tableWidget.setRowCount(0)
-            self.tableWidget.setColumnCount(0)
-            self.tableWidget.resizeColumnsToContents()
+            fill_table(self.tableView, [], [])
             self.tabWidget.setTabText(0, 'стр. 1')
 
         if 'csv' not in self.mode:
-            self.statusBar().showMessage(
-                f'Таблиц: {len(self.tables)} | '
-                f'Строк: {self.tabWidget.currentWidget().children()[0].rowCount()} | '
-                f'Столбцов: {self.tabWidget.currentWidget().children()[0].columnCount()}'
-            )
+            self.change_statusbar_message()
+        self.update_filter_bar()
         self.new_file_opened = False
 
+    def load_db_table(self, cur_table: QTableView, name: str):
+        """
+        Подключаем к виджету модель таблицы БД.
+        Пока вкладку не откроют, модель знает только схему таблицы и ничего из неё не читает
+        """
+
+        model = SQLiteTableModel(self.con, name, cur_table)
+        replace_model(cur_table, model)
+        model.cellChanged.connect(self.db_table_cell_changed)
+
+    def activate_tab(self, index: int):
+        """
+        При первом открытии вкладки с таблицей БД достаём первую порцию её рядов,
+        остальные подгружаются при прокрутке
+        """
+
+        widget = self.tabWidget.widget(index)
+        if widget is None or not widget.children():
+            return
+        cur_table = widget.children()[0]
+        model = cur_table.model()
+        if isinstance(model, SQLiteTableModel) and not model.active:
+            model.activate()
+            cur_table.resizeColumnsToContents()
+
+    def reload_db_tables(self, names: set[str]):
+        """
+        Перезагружаем вкладки таблиц, изменённых SQL запросом.
+        Вкладки, которые уже открывали, сразу подгружают первую порцию рядов
+        """
+
+        for i in range(self.tabWidget.count()):
+            cur_table = self.tabWidget.widget(i).children()[0]
+            model = cur_table.model()
+            if isinstance(model, SQLiteTableModel) and model.table.lower() in names:
+                # Запрос менял таблицу через своё соединение, мимо триггеров индекса для поиска
+                for indexer in self.search_indexers:
+                    if isinstance(indexer, SearchIndexer) and indexer.table == model.table:
+                        indexer.requestInterruption()
+                if self.search_db is not None:
+                    self.search_db.drop(model.table)
+                self.load_db_table(cur_table, model.table)
+                if model.active or i == self.tabWidget.currentIndex():
+                    self.activate_tab(i)
+        self.change_statusbar_message()
+        self.update_filter_bar()
+        self.run_search(jump=False)
+
+    def load_csv(self, cur_table: QTableView, source: str):
+        """
+        Читаем csv файл в отдельном потоке.
+        Если кодировка и переводы строк позволяют, файл только индексируется (CsvIndex), и ряды читаются с диска,
+        когда их нужно показать. Иначе ряды читаются целиком и добавляются в таблицу порциями.
+        Ход чтения показывается в строке состояния
+        """
+
+        if CsvIndex.supports(self.csv_encoding, source):
+            index = CsvIndex(source, self.csv_encoding, self.csv_del)
+            model = CsvIndexModel(index, cur_table)
+            replace_model(cur_table, model)
+            loader = CsvIndexer(index, self)
+            loader.rows_indexed.connect(model.rows_indexed)
+            loader.rows_indexed.connect(self.change_statusbar_message)
+        else:
+            fill_table(cur_table, [], [])
+            model = cur_table.model()
+            loader = CsvLoader(source, self.csv_del, self.csv_encoding, self)
+            loader.titles_loaded.connect(model.set_titles)
+            loader.rows_loaded.connect(model.append_rows)
+            loader.rows_loaded.connect(self.change_statusbar_message)
+        model.complete = False
+        loader.progress.connect(self.progressBar.setValue)
+        loader.failed.connect(lambda text: QMessageBox.critical(None, 'Error', text, QMessageBox.Ok))
+        loader.finished.connect(lambda: self.loading_finished(loader, cur_table, model))
+        self.loaders.append(loader)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.cancelButton.show()
+        loader.operation = profiling.begin('load_csv', path=source)
+        loader.start()
+
+    def load_csv_files(self, tables: list[QTableView], sources: list[str]):
+        """
+        Несколько файлов читаются параллельно в пуле процессов (CsvPoolLoader), а один файл, маленькие
+        файлы или файлы на одноядерном компьютере - потоками (load_csv()).
+        Вкладки сразу показывают названия столбцов (для CsvIndex) и заполняются, как только
+        прочитан их файл. Время чтения каждого файла показывается в строке состояния
+        """
+
+        self.load_timings = list()
+        if len(sources) == 1 or (os.cpu_count() or 1) == 1 or sum(map(os.path.getsize, sources)) < POOL_MIN_BYTES:
+            for cur_table, source in zip(tables, sources):
+                self.load_csv(cur_table, source)
+            return
+        jobs = list()
+        models = list()
+        for cur_table, source in zip(tables, sources):
+            if CsvIndex.supports(self.csv_encoding, source):
+                model = CsvIndexModel(CsvIndex(source, self.csv_encoding, self.csv_del), cur_table)
+                replace_model(cur_table, model)
+                jobs.append((index_csv_file, (source, self.csv_encoding, self.csv_del)))
+            else:
+                fill_table(cur_table, [], [])
+                model = cur_table.model()
+                jobs.append((parse_csv_file, (source, self.csv_del, self.csv_encoding)))
+            model.complete = False
+            models.append(model)
+            self.tabWidget.setTabToolTip(self.tabWidget.indexOf(cur_table.parent()), source)
+        loader = CsvPoolLoader(jobs, self)
+        loader.file_loaded.connect(
+            lambda number, result, seconds: self.csv_file_loaded(loader, tables[number], models[number],
+                                                                 sources[number], result, seconds))
+        loader.progress.connect(self.progressBar.setValue)
+        loader.failed.connect(lambda text: QMessageBox.critical(None, 'Error', text, QMessageBox.Ok))
+        loader.finished.connect(lambda: self.csv_pool_finished(loader, models))
+        self.loaders.append(loader)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.cancelButton.show()
+        loader.operation = profiling.begin('load_csv_files', files=len(sources))
+        loader.start()
+
+    def csv_file_loaded(self, loader: CsvPoolLoader, cur_table: QTableView, model: ListTableModel, source: str,
+                        result, seconds: float):
+        """
+        Подключаем к модели вкладки то, что построил процесс: границы рядов для CsvIndex
+        или готовый ColumnStore
+        """
+
+        if loader.isInterruptionRequested():
+            return
+        if isinstance(model, CsvIndexModel):
+            model.csv_index.adopt(result)
+            model.rows_indexed(len(model.csv_index))
+            self.build_trigram_index(model.csv_index)
+        else:
+            model.set_store(result)
+        model.complete = True
+        cur_table.resizeColumnsToContents()
+        profiling.record('load_csv', seconds, path=source, rows=model.total_row_count(), process=True)
+        self.load_timings.append((source, seconds))
+        self.show_file_timings()
+        self.change_statusbar_message()
+        self.update_filter_bar()
+
+    def csv_pool_finished(self, loader: CsvPoolLoader, models: list[ListTableModel]):
+        profiling.end(loader.operation, rows=sum(model.total_row_count() for model in models),
+                      complete=loader.complete)
+        self.show_file_timings()
+        self.loader_done(loader)
+
+    def show_file_timings(self):
+        self.timingLabel.setText(' | '.join(f'{os.path.basename(path)}: {seconds:.2f} с'
+                                            for path, seconds in self.load_timings))
+
+    def loading_finished(self, loader: CsvLoader | CsvIndexer, cur_table: QTableView, model: ListTableModel):
+        model.complete = loader.complete
+        if isinstance(loader, CsvIndexer) and loader.complete:
+            self.build_trigram_index(loader.index)
+        seconds = profiling.end(loader.operation, rows=model.total_row_count(), complete=loader.complete)
+        self.load_timings.append((loader.operation.details['path'], seconds))
+        if len(self.load_timings) > 1:
+            self.show_file_timings()
+        cur_table.resizeColumnsToContents()
+        self.loader_done(loader)
+
+    def loader_done(self, loader: CsvLoader | CsvIndexer | CsvPoolLoader):
+        """
+        Убираем закончивший работу поток и прячем индикатор загрузки, если больше ничего не читается
+        """
+
+        if loader in self.loaders:
+            self.loaders.remove(loader)
+        loader.deleteLater()
+        if not self.loaders:
+            self.progressBar.hide()
+            self.cancelButton.hide()
+        self.change_statusbar_message()
+        self.update_filter_bar()
+        self.run_search(jump=False)
+
+    def cancel_loading(self):
+        """
+        Останавливаем чтение csv файлов. Уже прочитанные ряды остаются в таблицах
+        """
+
+        for loader in self.loaders:
+            loader.requestInterruption()
+        for loader in self.loaders:
+            loader.wait()
+
+    def flush_changes(self):
+        """
+        Записываем накопившиеся изменения БД одной транзакцией
+        """
+
+        if self.write_queue is not None:
+            self.write_queue.flush()
+
+    def show_timing(self, name: str, seconds: float):
+        self.timingLabel.setText(f'{name}: {seconds:.3f} с')
+
+    def show_pending_changes(self, count: int):
+        self.pendingLabel.setText(f'Не записано изменений: {count}')
+        self.pendingLabel.setVisible(count > 0)
+
+    def show_write_errors(self, errors: list[str]):
+        QMessageBox.critical(None, 'Error',
+                             'Не удалось записать изменения:\n' + '\n'.join(errors),
+                             QMessageBox.Ok)
+
+    def open_csv_as_sql(self):
+        """
+        Загружаем все открытые csv файлы во временную БД SQLite (каждый файл - отдельная таблица)
+        и открываем окно SQL запросов к ней. Файлы берутся в том виде, в каком они сохранены на диске.
+        Пока файлы не изменились, повторно они не загружаются
+        """
+
+        if self.loaders:
+            QMessageBox.warning(None, 'Warning', 'Дождитесь окончания загрузки файла', QMessageBox.Ok)
+            return
+        paths = list(dict.fromkeys(path for path in self.paths if path.split('.')[-1] == 'csv'))
+        try:
+            key = tuple((path, os.path.getmtime(path)) for path in paths)
+        except OSError as e:
+            QMessageBox.critical(None, 'Error', f'Не удалось открыть файл\n{e}', QMessageBox.Ok)
+            return
+        if self.csv_db is not None and key == self.csv_db_key:
+            self.sql_form = SQLForm(self.csv_con, self.csv_con.cursor(), self)
+            self.sql_form.show()
+            return
+
+        self.drop_csv_database()
+        fd, self.csv_db = tempfile.mkstemp(prefix='tipy_', suffix='.sqlite')
+        os.close(fd)
+        sources = list()
+        names = set()
+        for path in paths:
+            # Таблица называется как файл, одинаковые названия различаются числом в конце
+            name = base = os.path.splitext(os.path.basename(path))[0]
+            while name.lower() in names:
+                name = f'{base}_{len(names)}'
+            names.add(name.lower())
+            sources.append((path, name))
+        importer = CsvImporter(self.csv_db, sources, self.csv_del, self.csv_encoding, self)
+        importer.progress.connect(self.progressBar.setValue)
+        importer.rows_imported.connect(lambda count: self.statusBar().showMessage(f'Загружено в БД рядов: {count}'))
+        importer.failed.connect(lambda text: QMessageBox.critical(None, 'Error', text, QMessageBox.Ok))
+        importer.finished.connect(lambda: self.csv_import_finished(importer, key))
+        self.loaders.append(importer)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.cancelButton.show()
+        importer.operation = profiling.begin('csv_import', files=len(sources))
+        importer.start()
+
+    def csv_import_finished(self, importer: CsvImporter, key: tuple):
+        """
+        Если все файлы загружены, подключаемся к временной БД и открываем окно SQL запросов
+        """
+
+        profiling.end(importer.operation, complete=importer.complete)
+        if importer in self.loaders:
+            self.loaders.remove(importer)
+        importer.deleteLater()
+        if not self.loaders:
+            self.progressBar.hide()
+            self.cancelButton.hide()
+        self.change_statusbar_message()
+        if not importer.complete or importer.db_path != self.csv_db:
+            return
+        self.csv_db_key = key
+        self.csv_con = sqlite3.connect(self.csv_db)
+        self.sql_form = SQLForm(self.csv_con, self.csv_con.cursor(), self)
+        self.sql_form.show()
+
+    def drop_csv_database(self):
+        """
+        Закрываем и удаляем временную БД с загруженными csv файлами
+        """
+
+        if self.csv_db is None:
+            return
+        if self.csv_con is not None:
+            if self.sql_form is not None and self.sql_form.con is self.csv_con:
+                self.sql_form.close()
+            self.csv_con.close()
+            self.csv_con = None
+        try:
+            os.remove(self.csv_db)
+        except OSError:
+            pass
+        self.csv_db = None
+        self.csv_db_key = None
+
+    def closeEvent(self, event):
+        self.cancel_loading()
+        self.flush_changes()
+        self.drop_csv_database()
+        self.drop_search_database()
+        if self.preloader is not None:
+            self.preloader.wait()
+        if self.show_timing in profiling.listeners:
+            profiling.listeners.remove(self.show_timing)
+        super().closeEvent(event)
+
     def change_statusbar_message(self):
         """
         Изменение сообщения в statusbar при изменении таблицы
         """
 
         x = self.tabWidget.currentWidget()
+        model = x.children()[0].model() if x is not None else None
         self.statusBar().showMessage(
             f'Таблиц: {len(self.tables)} | '
-            f'Строк: {x.children()[0].rowCount() if x is not None else 0} | '
-            f'Столбцов: {x.children()[0].columnCount() if x is not None else 0}'
+            f'Строк: {model.row_count_label() if model is not None else 0} | '
+            f'Столбцов: {model.columnCount() if model is not None else 0}'
         )
 
     def db_table_cell_changed(self, row: int, col: int):
         """
-        Запись в БД изменённой ячейки.
-        Тут ещё куча проверок на корректность введённых данных и создавался ли новый ряд
+        Постановка изменённой ячейки в очередь записи в БД.
+        Ряд, который уже есть в БД, находится по rowid (или первичному ключу), то есть по индексу,
+        без перебора таблицы. Новый ряд записывается, когда заполнены все его ячейки
         """
 
         if not self.row_added and not self.query_sent and not self.new_file_opened:
-            cur_table = self.tabWidget.tabText(self.tabWidget.currentIndex())
-            cur_table_widget = self.tabWidget.currentWidget().children()[0]
-            cur_col = cur_table_widget.horizontalHeaderItem(col).text()
-            new_val = cur_table_widget.item(row, col).text()
-            try:
-                if self.cur.execute(f"""SELECT Count(*) FROM {cur_table}""").fetchall()[0][0] == \
-                        cur_table_widget.rowCount() and \
-                        all([cur_table_widget.item(row, i).text() for i in range(cur_table_widget.columnCount())]):
-                    cond = ' AND '.join([
-                        f"{key} = '{val}'" for key, val in
-                        {cur_table_widget.horizontalHeaderItem(i).text(): cur_table_widget.item(row, i).text()
-                         for i in range(cur_table_widget.columnCount())
-                         if cur_table_widget.item(row, i).text() != new_val}.items()
-                    ])
-                    self.cur.execute(f"""UPDATE {cur_table}
-                                         SET {cur_col} = '{new_val}'
-                                         WHERE {cond}""")
-                    self.con.commit()
-                elif all([cur_table_widget.item(row, i).text() for i in range(cur_table_widget.columnCount())]):
-                    cur_table_headers = [cur_table_widget.horizontalHeaderItem(i).text()
-                                         for i in range(cur_table_widget.columnCount())]
-                    self.cur.execute(f"""INSERT INTO {cur_table}({','.join(cur_table_headers)})
-                                         VALUES({','.join([f"'{cur_table_widget.item(row, i).text()}'"
-                                                           for i in range(cur_table_widget.columnCount())])})""")
-                    self.con.commit()
-            except sqlite3.IntegrityError:
-                QMessageBox.critical(None, 'Error',
-                                     'Введены некорректные данные',
-                                     QMessageBox.Ok)
+            with profiling.timed('cell_commit', row=row, col=col):
+                cur_table = quote_name(self.tabWidget.tabText(self.tabWidget.currentIndex()))
+                model = self.tabWidget.currentWidget().children()[0].model()
+                values = model.row_values(row)
+                # Ряд уже есть в БД, если он был подгружен из неё или уже поставлен в очередь на запись
+                if not model.is_new_row(row):
+                    cond, params = model.key_condition(row)
+                    sql = f'UPDATE {cur_table} SET {quote_name(model.header(col))} = ? WHERE {cond}'
+                    params = [model.value(row, col)] + params
+                    self.write_queue.add(sql, params, f'Ряд {row + 1}, столбец {model.header(col)}')
+                    model.update_key(row, col)
+                    self.advise_indexes(self.index_advisor, [(sql, params)], 'изменение ячеек')
+                elif all(values):
+                    key = PendingRowid()
+                    self.write_queue.add(f'INSERT INTO {cur_table}({", ".join(map(quote_name, model.titles))}) '
+                                         f'VALUES({", ".join("?" * len(values))})', values,
+                                         f'Новый ряд {row + 1}',
+                                         lambda cursor: model.insert_done(key, cursor), creates=key)
+                    model.mark_inserted(row, key)
 
     def save_csv_file(self):
         """
-        Сохраняем УЖЕ СУЩЕСТВУЮЩИЙ в файл при нажатии Ctrl+S
+        Сохраняем УЖЕ СУЩЕСТВУЮЩИЙ в файл при нажатии Ctrl+S.
+        Файл записывается во временный файл, который затем заменяет исходный,
+        поэтому сбой во время сохранения не испортит файл
         """
 
+        if self.loaders:
+            QMessageBox.warning(None, 'Warning', 'Дождитесь окончания загрузки файла', QMessageBox.Ok)
+            return
         cur_table_widget = self.tabWidget.currentWidget().children()[0]
-        reader = [[cur_table_widget.horizontalHeaderItem(i).text()
-                   for i in range(cur_table_widget.columnCount())]] + get_data_from_table(cur_table_widget)
-        with open(self.paths[self.tabWidget.currentIndex()], 'w', encoding=self.csv_encoding) as f:
-            writer = csv.writer(f, delimiter=self.csv_del)
-            for i in reader:
-                writer.writerow(i)
+        model = cur_table_widget.model()
+        if not model.complete:
+            QMessageBox.warning(None, 'Warning', 'Файл был загружен не полностью, сохранение отменено',
+                                QMessageBox.Ok)
+            return
+        path = self.paths[self.tabWidget.currentIndex()]
+        indexed = isinstance(model, CsvIndexModel)
+        # Файл, открытый через индекс, отображён в память - перед заменой его нужно закрыть,
+        # а после замены проиндексировать заново
+        if indexed:
+            self.stop_trigram_index(model.csv_index)
+        try:
+            with profiling.timed('save_csv', path=path):
+                save_atomically(path, lambda f: model.write_csv(f, self.csv_encoding, self.csv_del),
+                                model.csv_index.close if indexed else None)
+        except (OSError, UnicodeError, csv.Error) as e:
+            QMessageBox.critical(None, 'Error', f'Не удалось сохранить файл\n{e}', QMessageBox.Ok)
+            if not indexed or not model.csv_index.file.closed:
+                return
+        if indexed:
+            self.load_csv(cur_table_widget, path)
 
     def save_new_csv_file(self):
         """
@@ -303,16 +809,13 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
         """
 
         file_name = QFileDialog.getSaveFileName(self, 'Выбрать файл для сохранения', '', 'csv files (*.csv)')[0]
-        cur_table_widget = self.tabWidget.currentWidget().children()[0]
-        data = get_data_from_table(cur_table_widget)
+        model = self.tabWidget.currentWidget().children()[0].model()
         if file_name:
-            with open(file_name, 'w', encoding=self.csv_encoding) as f:
-                cur_table_widget = self.tabWidget.currentWidget().children()[0]
-                data = [[cur_table_widget.horizontalHeaderItem(i).text()
-                         for i in range(cur_table_widget.columnCount())]] + data
-                writer = csv.writer(f, delimiter=self.csv_del)
-                for i in data:
-                    writer.writerow(i)
+            try:
+                with profiling.timed('save_csv', path=file_name):
+                    save_atomically(file_name, lambda f: model.write_csv(f, self.csv_encoding, self.csv_del))
+            except (OSError, UnicodeError, csv.Error) as e:
+                QMessageBox.critical(None, 'Error', f'Не удалось сохранить файл\n{e}', QMessageBox.Ok)
 
     def add_row(self):
         """
@@ -321,12 +824,8 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
 
         self.row_added = True
         cur_table_widget = self.tabWidget.currentWidget().children()[0]
-        cur_table_widget.setRowCount(cur_table_widget.rowCount() + 1)
-
-        # Заполняем созданные ячейки таблицы, чтобы в дальнейшем избежать ошибок в других методах,
-        # которые будут искать текст в этих ячейках, но получат None
-        for i in range(cur_table_widget.columnCount()):
-            cur_table_widget.setItem(cur_table_widget.rowCount() - 1, i, QTableWidgetItem(''))
+        row = cur_table_widget.model().append_row()
+        cur_table_widget.scrollTo(cur_table_widget.model().index(row, 0))
         self.row_added = False
         self.change_statusbar_message()
 
@@ -335,46 +834,42 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
         Метод добавления столбца
         """
 
-        cur_table_widget = self.tabWidget.currentWidget().children()[0]
-        cur_table_widget.setColumnCount(cur_table_widget.columnCount() + 1)
-        cur_table_widget.setHorizontalHeaderLabels([str(i + 1) for i in range(cur_table_widget.columnCount())])
-
-        # Заполняем созданные ячейки таблицы, чтобы в дальнейшем избежать ошибок в других методах,
-        # которые будут искать текст в этих ячейках, но получат None
-        for i in range(cur_table_widget.rowCount()):
-            cur_table_widget.setItem(cur_table_widget.columnCount() - 1, i, QTableWidgetItem(''))
+        model = self.tabWidget.currentWidget().children()[0].model()
+        model.insert_column(str(model.columnCount() + 1))
         self.change_statusbar_message()
+        self.update_filter_bar()
 
     def delete_row(self):
         """
-        Функция удаления ряда из таблицы
+        Функция удаления выделенных рядов из таблицы.
+        Ряды БД удаляются одним изменением в очереди записи (DELETE ... WHERE rowid IN (...)),
+        а таблица обновляется один раз, сколько бы рядов ни было выделено
         """
 
         try:
-            mb = QMessageBox.question(None, 'Question',
-                                      'Вы уверены, что хотите удалить этот ряд?',
-                                      QMessageBox.Ok | QMessageBox.Cancel)
             cur_table_widget = self.tabWidget.currentWidget().children()[0]
-            cur_table = self.tabWidget.tabText(self.tabWidget.currentIndex())
-            row = cur_table_widget.currentRow()
-            if mb == QMessageBox.Ok and 'csv' not in self.paths[self.tabWidget.indexOf(cur_table_widget)] and\
-                    len(cur_table_widget.selectedItems()) == cur_table_widget.columnCount() and \
-                    'csv' not in self.mode:
-                cond = ' AND '.join([
-                    f"{key} = '{val}'" for key, val in
-                    {cur_table_widget.horizontalHeaderItem(i).text(): cur_table_widget.item(row, i).text()
-                     for i in range(cur_table_widget.columnCount())}.items()
-                ])
-                cur_table_widget.removeRow(row)
-                self.cur.execute(f"""DELETE FROM {cur_table}
-                                     WHERE {cond}""")
-                self.con.commit()
-            elif 'csv' in self.path or mb == QMessageBox.Ok and \
-                    len(cur_table_widget.selectedItems()) == cur_table_widget.columnCount():
-                cur_table_widget.removeRow(row)
-            else:
+            model = cur_table_widget.model()
+            rows = sorted(index.row() for index in cur_table_widget.selectionModel().selectedRows())
+            if not rows:
                 QMessageBox.warning(None, 'Warning', 'Выберите ряд!', QMessageBox.Ok | QMessageBox.Cancel)
+                return
+            text = 'этот ряд' if len(rows) == 1 else f'выбранные ряды ({len(rows)})'
+            mb = QMessageBox.question(None, 'Question', f'Вы уверены, что хотите удалить {text}?',
+                                      QMessageBox.Ok | QMessageBox.Cancel)
+            if mb != QMessageBox.Ok:
+                return
+            if 'csv' not in self.paths[self.tabWidget.indexOf(cur_table_widget)] and 'csv' not in self.mode:
+                statements = model.delete_statements(rows)
+                if statements:
+                    self.write_queue.add_statements(statements, f'Удаление рядов ({len(rows)})', missing_ok=True)
+                    self.advise_indexes(self.index_advisor, statements, 'удаление рядов')
+            if len(rows) == 1:
+                model.remove_row(rows[0])
+            else:
+                model.remove_rows(rows)
+            cur_table_widget.clearSelection()
             self.change_statusbar_message()
+            self.run_search(jump=False)
 
         except AttributeError:
             QMessageBox.warning(None, 'Warning', 'Выберите ряд!', QMessageBox.Ok | QMessageBox.Cancel)
@@ -392,6 +887,7 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
         Вызов окна, в котором будет отображаться график
         """
 
+        self.flush_changes()
         self.plot_form = PlotForm(self)
         self.plot_form.show()
 
@@ -410,15 +906,21 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
         Добавляет вкладку
         """
 
+        self.new_tab()
+        if 'csv' not in self.mode:
+            self.entry = EntryForm(self)
+            self.entry.show()
+
+    def new_tab(self) -> QTableView:
         self.pages_count += 1
         cur_widget = QWidget(self)
-        cur_table = QTableWidget(cur_widget)
+        cur_table = QTableView(cur_widget)
         cur_table.setGeometry(0, 0, 831, 731)
+        self.init_view(cur_table)
+        fill_table(cur_table, [], [])
         self.tabWidget.addTab(cur_widget, f'стр. {self.pages_count}')
         self.tables.append(f'стр. {self.pages_count}')
-        if 'csv' not in self.mode:
-            self.entry = EntryForm(self)
-            self.entry.show()
+        return cur_table
 
     def del_table(self):
         """
@@ -434,8 +936,10 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
             del self.paths[self.tabWidget.currentIndex()]
         if not self.tabWidget.count():
             widget = QWidget(self)
-            self.tableWidget = QTableWidget(widget)
-            self.tableWidget.setGeometry(0, 0, 831, 731)
+            self.tableView = QTableView(widget)
+            self.tableView.setGeometry(0, 0, 831, 731)
+            self.init_view(self.tableView)
+            fill_table(self.tableView, [], [])
             self.tabWidget.addTab(widget, 'стр. 1')
 
     def show_instruction(self):
@@ -446,6 +950,432 @@ class TableInspector(QMainWindow, tableinsp_design.Ui_MainWindow):
         command = 'notepad.exe instruction.txt'
         os.system(command)
 
+    def preload_plotting(self):
+        """
+        Загружаем seaborn и matplotlib в фоне, пока пользователь выбирает файл,
+        чтобы первый график не ждал их импорта
+        """
+
+        self.preloader = PlotPreloader(self)
+        self.preloader.loaded.connect(lambda seconds: profiling.record('plot_preload', seconds))
+        self.preloader.start()
+
+    def init_filter_bar(self):
+        """
+        Панель фильтров под кнопками: столбец, текст фильтра и кнопка сброса
+        """
+
+        self.filterBox = QWidget(self.centralwidget)
+        self.filterBox.setGeometry(0, 560, 160, 150)
+        layout = QVBoxLayout(self.filterBox)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel('Фильтр столбца', self.filterBox))
+        self.filterColumnBox = QComboBox(self.filterBox)
+        self.filterLine = QLineEdit(self.filterBox)
+        self.filterLine.setPlaceholderText('текст, =5, >10, !=abc')
+        self.filterLine.setToolTip('Текст ищется в ячейках как подстрока.\n'
+                                   'Операторы =, !=, >, >=, <, <= сравнивают ячейки со значением '
+                                   '(числа - как числа).\nПустая строка убирает фильтр столбца')
+        self.resetViewButton = QPushButton('Сбросить фильтры', self.filterBox)
+        layout.addWidget(self.filterColumnBox)
+        layout.addWidget(self.filterLine)
+        layout.addWidget(self.resetViewButton)
+        layout.addStretch()
+        self.filterColumnBox.currentIndexChanged.connect(self.show_filter)
+        self.filterLine.returnPressed.connect(self.apply_filter)
+        self.resetViewButton.clicked.connect(self.reset_view)
+
+    def current_table(self) -> QTableView | None:
+        widget = self.tabWidget.currentWidget()
+        return widget.children()[0] if widget is not None and widget.children() else None
+
+    def update_filter_bar(self):
+        """
+        Показываем на панели фильтров столбцы текущей таблицы
+        """
+
+        cur_table = self.current_table()
+        model = cur_table.model() if cur_table is not None else None
+        titles = [str(x) for x in model.titles] if model is not None and model.sortable else []
+        if titles != [self.filterColumnBox.itemText(i) for i in range(self.filterColumnBox.count())]:
+            self.filterColumnBox.blockSignals(True)
+            self.filterColumnBox.clear()
+            self.filterColumnBox.addItems(titles)
+            self.filterColumnBox.blockSignals(False)
+        self.filterBox.setEnabled(bool(titles))
+        self.show_filter()
+
+    def show_filter(self):
+        """
+        Показываем фильтр выбранного столбца
+        """
+
+        cur_table = self.current_table()
+        col = self.filterColumnBox.currentIndex()
+        filters = cur_table.model().filters if cur_table is not None and cur_table.model() is not None else {}
+        self.filterLine.setText(filters[col].text if col in filters else '')
+
+    def init_view(self, cur_table: QTableView):
+        header = cur_table.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.sectionClicked.connect(self.sort_table)
+
+    def sort_table(self, section: int):
+        """
+        Щелчок по заголовку столбца сортирует таблицу по возрастанию, второй - по убыванию,
+        третий убирает сортировку
+        """
+
+        cur_table = self.current_table()
+        model = cur_table.model()
+        order = Qt.AscendingOrder
+        if model.sort_column == section:
+            if model.sort_order == Qt.AscendingOrder:
+                order = Qt.DescendingOrder
+            else:
+                section = -1
+        self.change_view(cur_table, lambda: model.sort(section, order))
+
+    def apply_filter(self):
+        cur_table = self.current_table()
+        col = self.filterColumnBox.currentIndex()
+        if cur_table is None or col < 0:
+            return
+        text = self.filterLine.text().strip()
+        self.change_view(cur_table, lambda: cur_table.model().set_filter(col, text))
+
+    def reset_view(self):
+        cur_table = self.current_table()
+        if cur_table is not None:
+            self.change_view(cur_table, cur_table.model().clear_view)
+
+    def change_view(self, cur_table: QTableView, action):
+        """
+        Перед сменой сортировки или фильтров таблицы БД записываем очередь изменений,
+        чтобы заново выбранные ряды их учитывали. Таблица не пересоздаётся: меняются только
+        выбранные ряды (для БД) или перестановка рядов (для csv файлов)
+        """
+
+        model = cur_table.model()
+        if not model.sortable:
+            return
+        if self.loaders:
+            QMessageBox.warning(None, 'Warning', 'Дождитесь окончания загрузки файла', QMessageBox.Ok)
+            self.update_sort_indicator(cur_table)
+            self.show_filter()
+            return
+        self.flush_changes()
+        with profiling.timed('sort_filter', rows=model.total_row_count(), sort=model.sort_column,
+                             filters=len(model.filters)):
+            action()
+        self.update_sort_indicator(cur_table)
+        self.show_filter()
+        self.change_statusbar_message()
+        self.run_search(jump=False)
+        if isinstance(model, SQLiteTableModel):
+            self.suggest_index(model)
+
+    def update_sort_indicator(self, cur_table: QTableView):
+        model = cur_table.model()
+        header = cur_table.horizontalHeader()
+        header.setSortIndicatorShown(model.sort_column >= 0)
+        if model.sort_column >= 0:
+            header.setSortIndicator(model.sort_column, model.sort_order)
+
+    def suggest_index(self, model: SQLiteTableModel):
+        """
+        Если для фильтров или сортировки таблица просматривается целиком (SCAN без индекса
+        или сортировка всех рядов во временном B-дереве), предлагаем создать индекс.
+        Отказ запоминается до конца сеанса
+        """
+
+        columns = model.index_columns()
+        key = (model.table, tuple(columns))
+        if not columns or key in self.declined_indexes:
+            return
+        try:
+            plan = model.view_plan()
+        except sqlite3.Error:
+            return
+        if not any(is_full_scan(detail) or 'USE TEMP B-TREE' in detail for detail in plan):
+            return
+        mb = QMessageBox.question(None, 'Question',
+                                  f'Для этих фильтров и сортировки таблица {model.table} просматривается целиком.\n'
+                                  f'Создать индекс по столбцам {", ".join(columns)}?',
+                                  QMessageBox.Ok | QMessageBox.Cancel)
+        if mb != QMessageBox.Ok:
+            self.declined_indexes.add(key)
+            return
+        if self.create_index(model.con, model.table, columns):
+            model.refresh_view()
+
+    def advise_indexes(self, advisor: IndexAdvisor | None, statements: list[tuple[str, list]], source: str,
+                       seconds: float = None):
+        """
+        Передаём выполненные запросы советчику индексов. Когда операции просмотрели таблицу целиком
+        ADVICE_REPEATS раз из-за одних и тех же столбцов условия, предлагаем CREATE INDEX с оценкой выгоды.
+        Отказ запоминается до конца сеанса
+        :param source: Название операции для сообщения
+        :param seconds: Время выполнения операции, если оно известно
+        """
+
+        if advisor is None:
+            return
+        ready = list()
+        for sql, params in statements:
+            ready.extend(advisor.observe(sql, params, source, seconds))
+        for advice in ready:
+            key = (advice.table, advice.columns)
+            if key in self.declined_indexes:
+                continue
+            lines = [f'Операции ({", ".join(sorted(advice.sources))}) уже {advice.count} раза просмотрели таблицу '
+                     f'{advice.table} целиком: для условия по столбцам {", ".join(advice.columns)} нет индекса.']
+            if advice.rows is not None:
+                lines.append(f'С индексом они прочитали бы примерно на {advice.benefit()} рядов меньше '
+                             f'(в таблице ~{advice.rows} рядов).')
+            if advice.seconds:
+                lines.append(f'Время этих операций: {advice.seconds:.2f} с.')
+            lines.append(f'Создать индекс?\n{advice.statement()}')
+            mb = QMessageBox.question(None, 'Question', '\n'.join(lines), QMessageBox.Ok | QMessageBox.Cancel)
+            if mb != QMessageBox.Ok:
+                self.declined_indexes.add(key)
+                continue
+            if self.create_index(advisor.con, advice.table, list(advice.columns)):
+                advisor.created(advice.table, list(advice.columns))
+
+    def create_index(self, con: sqlite3.Connection, table: str, columns: list[str]) -> bool:
+        """
+        :return: True, если индекс создан
+        """
+
+        if con is self.con:
+            self.flush_changes()
+        try:
+            with profiling.timed('create_index', table=table, columns=columns):
+                con.execute(index_statement(table, columns))
+                con.commit()
+        except sqlite3.Error as e:
+            QMessageBox.critical(None, 'Error', f'Не удалось создать индекс\n{e}', QMessageBox.Ok)
+            return False
+        return True
+
+    def init_search_bar(self):
+        """
+        Строка поиска над панелью фильтров: текст, переходы к предыдущему и следующему
+        найденному ряду и количество найденных рядов
+        """
+
+        self.searchBox = QWidget(self.centralwidget)
+        self.searchBox.setGeometry(0, 465, 160, 90)
+        layout = QVBoxLayout(self.searchBox)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel('Поиск', self.searchBox))
+        self.searchLine = QLineEdit(self.searchBox)
+        self.searchLine.setPlaceholderText('текст (Ctrl+F)')
+        self.searchLine.setToolTip('Текст ищется во всех столбцах текущей таблицы с учётом регистра.\n'
+                                   'Enter - следующий найденный ряд, Shift+Enter - предыдущий')
+        buttons = QHBoxLayout()
+        self.searchPrevButton = QPushButton('<', self.searchBox)
+        self.searchNextButton = QPushButton('>', self.searchBox)
+        self.searchPrevButton.setMaximumWidth(30)
+        self.searchNextButton.setMaximumWidth(30)
+        self.searchLabel = QLabel(self.searchBox)
+        buttons.addWidget(self.searchPrevButton)
+        buttons.addWidget(self.searchNextButton)
+        buttons.addWidget(self.searchLabel)
+        layout.addWidget(self.searchLine)
+        layout.addLayout(buttons)
+        layout.addStretch()
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(SEARCH_DELAY)
+        self.searchTimer.timeout.connect(self.run_search)
+        self.searchLine.textChanged.connect(lambda: self.searchTimer.start())
+        self.searchLine.returnPressed.connect(
+            lambda: self.show_hit(-1 if QApplication.keyboardModifiers() & Qt.ShiftModifier else 1))
+        self.searchPrevButton.clicked.connect(lambda: self.show_hit(-1))
+        self.searchNextButton.clicked.connect(lambda: self.show_hit(1))
+        self.searchShortcut = QShortcut(QKeySequence('Ctrl+F'), self)
+        self.searchShortcut.activated.connect(self.focus_search)
+
+    def focus_search(self):
+        self.searchLine.setFocus()
+        self.searchLine.selectAll()
+
+    def run_search(self, jump: bool = True):
+        """
+        Ищем текст строки поиска в текущей таблице (вызывается через SEARCH_DELAY мс после
+        последнего изменения строки, а также после смены вкладки, сортировки или фильтров).
+        Для таблиц БД при первом поиске в фоне строится полнотекстовый индекс, а пока его нет,
+        таблица просматривается целиком
+        :param jump: Перейти к первому найденному ряду
+        """
+
+        self.searchTimer.stop()
+        self.search_hits = list()
+        self.search_pos = -1
+        cur_table = self.current_table()
+        model = cur_table.model() if cur_table is not None else None
+        self.search_model = model
+        text = self.searchLine.text()
+        if model is None or not text:
+            self.searchLabel.setText('')
+            return
+        if isinstance(model, SQLiteTableModel):
+            self.flush_changes()
+            self.build_search_index(model)
+        try:
+            with profiling.timed('search', rows=model.total_row_count()) as operation:
+                self.search_hits = model.search(text)
+                operation.details['hits'] = len(self.search_hits)
+        except sqlite3.Error as e:
+            QMessageBox.critical(None, 'Error', f'Не удалось выполнить поиск\n{e}', QMessageBox.Ok)
+            self.searchLabel.setText('')
+            return
+        if jump:
+            self.show_hit(1)
+        else:
+            self.show_hit(0)
+
+    def show_hit(self, step: int):
+        """
+        Переходим к следующему (step=1) или предыдущему (step=-1) найденному ряду по кругу.
+        При step=0 только показываем количество найденных рядов.
+        Ряды, которых в таблице уже нет, пропускаются
+        """
+
+        cur_table = self.current_table()
+        model = cur_table.model() if cur_table is not None else None
+        if self.searchTimer.isActive() or model is not self.search_model:
+            self.run_search(jump=False)
+        total = len(self.search_hits)
+        more = '+' if total >= SEARCH_LIMIT else ''
+        if not total:
+            self.searchLabel.setText('не найдено' if self.searchLine.text() else '')
+            return
+        if step:
+            for _ in range(total):
+                self.search_pos = (self.search_pos + step) % total
+                row = model.hit_row(self.search_hits[self.search_pos])
+                if row is not None:
+                    column = max(cur_table.currentIndex().column(), 0)
+                    cur_table.selectRow(row)
+                    index = model.index(row, column)
+                    cur_table.setCurrentIndex(index)
+                    cur_table.scrollTo(index, QAbstractItemView.PositionAtCenter)
+                    break
+        if self.search_pos >= 0:
+            self.searchLabel.setText(f'{self.search_pos + 1} из {total}{more}')
+        else:
+            self.searchLabel.setText(f'Найдено: {total}{more}')
+
+    def build_trigram_index(self, index: CsvIndex):
+        """
+        Индекс триграмм csv файла строится в фоне, когда файл уже открыт: сохранение, сортировка и SQL
+        запросы его не ждут, а поиск до его готовности просматривает файл целиком.
+        Для файлов больше TRIGRAM_MAX_FILE индекс не строится, чтобы не занимать память
+        """
+
+        if len(index.mm) > TRIGRAM_MAX_FILE:
+            self.searchLabel.setToolTip(f'Файл больше {TRIGRAM_MAX_FILE >> 30} ГБ: индекс для поиска не строится, '
+                                        f'поиск просматривает файл целиком')
+            return
+        indexer = TrigramIndexer(index, self)
+        indexer.finished.connect(lambda: self.trigram_index_built(indexer))
+        self.search_indexers.append(indexer)
+        indexer.operation = profiling.begin('search_index', path=index.path)
+        indexer.start()
+
+    def trigram_index_built(self, indexer: TrigramIndexer):
+        profiling.end(indexer.operation, complete=indexer.complete)
+        if indexer in self.search_indexers:
+            self.search_indexers.remove(indexer)
+        indexer.deleteLater()
+
+    def stop_trigram_index(self, index: CsvIndex):
+        """
+        Останавливаем построение индекса триграмм, например перед тем, как закрыть файл при сохранении
+        """
+
+        for indexer in self.search_indexers:
+            if isinstance(indexer, TrigramIndexer) and indexer.index is index:
+                indexer.requestInterruption()
+                indexer.wait()
+
+    def build_search_index(self, model: SQLiteTableModel):
+        """
+        Запускаем построение полнотекстового индекса таблицы БД во временной БД, если его
+        ещё нет. Если SQLite собран без FTS5 или построить индекс не удалось, поиск остаётся
+        просмотром таблицы
+        """
+
+        if model.search_table is not None or not fts_available() or not model.with_rowid:
+            return
+        if self.search_db is not None and model.table in self.search_db.tables:
+            model.search_table = self.search_db.tables[model.table]
+            return
+        if any(isinstance(indexer, SearchIndexer) and indexer.table == model.table for indexer in self.search_indexers):
+            return
+        if self.search_db is None:
+            self.search_db = SearchDatabase(self.con)
+        path = next(x[2] for x in self.con.execute('PRAGMA database_list') if x[1] == 'main')
+        if not path:
+            return
+        name = self.search_db.index_name(model.table)
+        indexer = SearchIndexer(path, self.search_db.path, model.table, name, list(model.titles), self)
+        indexer.changes = self.con.total_changes
+        indexer.search_db = self.search_db
+        indexer.progress.connect(lambda value: self.searchLabel.setToolTip(f'Индекс для поиска: {value}%'))
+        indexer.failed.connect(self.statusBar().showMessage)
+        indexer.finished.connect(lambda: self.search_index_built(indexer))
+        self.search_indexers.append(indexer)
+        indexer.operation = profiling.begin('search_index', table=model.table)
+        indexer.start()
+
+    def search_index_built(self, indexer: SearchIndexer):
+        """
+        Подключаем индекс, если за время построения таблицу не меняли в обход триггеров.
+        Иначе индекс построится заново при следующем поиске
+        """
+
+        profiling.end(indexer.operation, complete=indexer.complete)
+        self.searchLabel.setToolTip('')
+        if indexer in self.search_indexers:
+            self.search_indexers.remove(indexer)
+        indexer.deleteLater()
+        if indexer.search_db is not self.search_db:
+            return
+        if not indexer.complete:
+            # Не построенный из-за ошибки индекс больше не пробуем строить, остаётся просмотр таблицы
+            if not indexer.isInterruptionRequested():
+                self.search_db.tables[indexer.table] = None
+            return
+        self.flush_changes()
+        if self.con.total_changes != indexer.changes:
+            return
+        try:
+            self.search_db.activate(indexer.table, indexer.titles)
+        except sqlite3.Error:
+            self.search_db.tables[indexer.table] = None
+            return
+        for i in range(self.tabWidget.count()):
+            model = self.tabWidget.widget(i).children()[0].model()
+            if isinstance(model, SQLiteTableModel) and model.table == indexer.table:
+                model.search_table = self.search_db.tables[indexer.table]
+
+    def drop_search_database(self):
+        for indexer in self.search_indexers:
+            indexer.requestInterruption()
+        for indexer in self.search_indexers:
+            indexer.wait()
+        self.search_indexers = list()
+        if self.search_db is not None:
+            self.search_db.close()
+            self.search_db = None
+        self.search_model = None
+        self.search_hits = list()
+        self.search_pos = -1
+
 
 class EntryForm(QDialog, entryform_design.Ui_entryForm):
     """
@@ -462,6 +1392,8 @@ class EntryForm(QDialog, entryform_design.Ui_entryForm):
         Нужен для вызова методов главного класса.
     source : str
         Путь к файлу, с которым нужно работать.
+    sources : list
+        Все выбранные файлы (несколько csv файлов открываются в отдельных вкладках и читаются параллельно).
     caller: NoneType | QPushButton
         Переменная, хранящая ссылку на объект, вызвавший этот класс.
 
@@ -482,6 +1414,7 @@ class EntryForm(QDialog, entryform_design.Ui_entryForm):
         self.setupUi(self)
         self.ref = ref
         self.source = str()
+        self.sources = list()
         self.caller = self.sender()
         self.openDialogButton.clicked.connect(self.load_path)
         self.buttonBox.rejected.connect(sys.exit)
@@ -491,8 +1424,9 @@ class EntryForm(QDialog, entryform_design.Ui_entryForm):
     def load_path(self):
         """Загрузка пути к нужному файлу"""
 
-        self.source = QFileDialog.getOpenFileName(self, 'Выбрать источник данных', '',
-                                                  'Data Sources (*.csv *.db *.sqlite)')[0]
+        self.sources = QFileDialog.getOpenFileNames(self, 'Выбрать источник данных', '',
+                                                    'Data Sources (*.csv *.db *.sqlite)')[0]
+        self.source = self.sources[0] if self.sources else str()
         if self.source.split('/')[-1].split('.')[-1] == 'csv':
             self.encodingLine.setEnabled(True)
             self.delLine.setEnabled(True)
@@ -507,6 +1441,10 @@ class EntryForm(QDialog, entryform_design.Ui_entryForm):
         """
 
         self.ref.mode = self.modesBox.currentText()
+        if len(self.sources) > 1 and any(source.split('/')[-1].split('.')[-1] != 'csv' for source in self.sources):
+            QMessageBox.critical(None, 'Error', 'Несколько файлов можно открыть, только если все они csv',
+                                 QMessageBox.Ok)
+            return
         if 'csv' in self.source or self.modesBox.currentText() != 'Редактирование':
             if self.delLine.text() and self.encodingLine.text():
 
@@ -515,18 +1453,18 @@ class EntryForm(QDialog, entryform_design.Ui_entryForm):
                     if not self.encodingLine.text() in ENCODINGS:
                         raise UnknownEncodingError
                     if self.modesBox.currentText() == 'Редактирование':
-                        with open(self.source, 'r', encoding=self.encodingLine.text()):
-                            pass
+                        for source in self.sources or [self.source]:
+                            with open(source, 'r', encoding=self.encodingLine.text()):
+                                pass
                     self.ref.csv_del = self.delLine.text()
                     self.ref.csv_encoding = self.encodingLine.text()
                     if self.caller is None or self.caller.text() != 'Добавить таблицу':
-                        self.ref.init_table(self.source)
+                        with profiling.timed('open_file', path=self.source, files=len(self.sources)):
+                            self.ref.init_table(self.source, self.sources[1:])
                     else:
                         table = self.ref.tabWidget.widget(self.ref.tabWidget.count() - 1).children()[0]
-                        with open(self.source, 'r', encoding=self.encodingLine.text()) as f:
-                            reader = [row for row in csv.reader(f, delimiter=self.delLine.text()) if row]
-                            titles = reader[0]
-                        fill_table(table, titles, reader[1::])
+                        tables = [table] + [self.ref.new_tab() for _ in self.sources[1:]]
+                        self.ref.load_csv_files(tables, self.sources)
                     self.close()
                 except UnknownEncodingError:
                     QMessageBox.critical(None, 'Error', 'Неизвестная кодировка', QMessageBox.Ok)
@@ -534,9 +1472,10 @@ class EntryForm(QDialog, entryform_design.Ui_entryForm):
                     QMessageBox.critical(None, 'Error', 'Невозможно прочитать файл в данной кодировке', QMessageBox.Ok)
             else:
                 QMessageBox.critical(None, 'Error', 'Нужно заполнить все поля!', QMessageBox.Ok)
-            self.ref.paths.append(self.source)
+            self.ref.paths.extend(self.sources if len(self.sources) > 1 else [self.source])
         elif self.source or self.modesBox.currentText() == 'Создание csv':
-            self.ref.init_table(self.source)
+            with profiling.timed('open_file', path=self.source):
+                self.ref.init_table(self.source)
             if self.modesBox.currentText() != 'Создание csv':
                 self.ref.paths.append(self.source)
             self.close()
@@ -559,6 +1498,11 @@ class EntryForm(QDialog, entryform_design.Ui_entryForm):
 class SQLForm(QMainWindow, sqlform_design.Ui_MainWindow):
     """
     Класс, реализующий окно для ввода SQL запроса.
+    Запрос выполняется в отдельном потоке, поэтому программа не зависает на долгих запросах,
+    а сам запрос можно отменить. Результат запроса показывается под полем ввода и подгружается
+    порциями по мере прокрутки. На вкладке "План запроса" показывается EXPLAIN QUERY PLAN
+    (шаги с полным просмотром таблицы выделены), на вкладке "История" - выполненные запросы
+    с их временем, самые дорогие - первыми.
 
     Дизайн
     ------
@@ -572,11 +1516,35 @@ class SQLForm(QMainWindow, sqlform_design.Ui_MainWindow):
         Объект курсора базы данных.
     ref : QMainWindow
         Ссылка на главный класс программы.
+    worker : QueryWorker | None
+        Поток, выполняющий текущий запрос.
+    history : QueryHistory
+        История выполненных запросов.
+    advisor : IndexAdvisor
+        Советчик индексов БД окна (общий с главным окном, если это та же БД).
 
     Методы
     ------
     send_sql_query() :
         Проверка ведённых данных на корректность и отправка SQL запроса.
+    cancel_sql_query() :
+        Прерывает выполняющийся запрос.
+    show_progress() :
+        Показывает время выполнения запроса и количество выполненных шагов.
+    show_result_info() :
+        Показывает количество рядов результата и время выполнения запроса.
+    query_executed() :
+        Вызывается, когда запрос выполнен и пришла первая порция результата.
+    query_failed() :
+        Сообщает об ошибке в запросе.
+    query_finished() :
+        Вызывается после закрытия курсора запроса, обновляет изменённые запросом таблицы.
+    show_plan() :
+        Показывает план запроса.
+    load_history() :
+        Заполняет таблицу истории запросов.
+    rerun_query() :
+        Выполняет запрос из истории ещё раз.
     """
 
     def __init__(self, con: sqlite3.Connection, cur: sqlite3.Cursor, ref: QMainWindow):
@@ -584,27 +1552,143 @@ class SQLForm(QMainWindow, sqlform_design.Ui_MainWindow):
         self.con = con
         self.cur = cur
         self.ref = ref
+        self.worker = None
+        self.history = QueryHistory()
+        if ref.index_advisor is not None and ref.index_advisor.con is con:
+            self.advisor = ref.index_advisor
+        else:
+            self.advisor = IndexAdvisor(con)
         self.setupUi(self)
         self.enterButton.clicked.connect(self.send_sql_query)
+        self.cancelButton.clicked.connect(self.cancel_sql_query)
+        self.historyView.doubleClicked.connect(self.rerun_query)
+        self.planTree.setHeaderHidden(True)
+        self.historyView.horizontalHeader().setSortIndicator(HistoryModel.ELAPSED_COL, Qt.DescendingOrder)
+        self.load_history()
 
     def send_sql_query(self):
         """
         Отправляем запрос
         """
 
+        # Курсор предыдущего запроса больше не нужен
+        self.cancel_sql_query()
         self.ref.query_sent = True
-        try:
-            self.cur.execute(self.sqlTextEdit.toPlainText())
-            cur_table_widget = self.ref.tabWidget.currentWidget().children()[0]
-            cur_table = self.ref.tabWidget.tabText(self.ref.tabWidget.currentIndex())
-            titles = list([x[1] for x in self.cur.execute(f'PRAGMA table_info({cur_table})').fetchall()])
-            data = self.cur.execute(f'SELECT * FROM {cur_table}').fetchall()
-            fill_table(cur_table_widget, titles, data)
-            self.con.commit()
-        except sqlite3.OperationalError:
-            QMessageBox.critical(None, 'Error', 'Неверный запрос', QMessageBox.Ok)
+        self.ref.flush_changes()
+        path = self.con.execute('PRAGMA database_list').fetchone()[2]
+        worker = QueryWorker(path, self.sqlTextEdit.toPlainText(), self)
+        model = QueryResultModel(worker, self.resultView)
+        replace_model(self.resultView, model)
+        worker.plan_ready.connect(self.show_plan)
+        worker.rows_ready.connect(self.show_result_info)
+        worker.progress.connect(self.show_progress)
+        worker.executed.connect(self.query_executed)
+        worker.failed.connect(self.query_failed)
+        worker.finished.connect(lambda: self.query_finished(worker))
+        self.worker = worker
+        self.enterButton.setEnabled(False)
+        self.cancelButton.setEnabled(True)
+        worker.start()
+
+    def cancel_sql_query(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+
+    def show_progress(self, elapsed: float, steps: int):
+        if self.sender() is self.worker and not self.enterButton.isEnabled():
+            self.statusBar().showMessage(f'Время: {elapsed:.2f} с | Шагов: {steps}')
+
+    def show_result_info(self):
+        if self.worker is None:
+            return
+        model = self.resultView.model()
+        if model.columnCount():
+            message = f'Рядов: {model.row_count_label()}'
+        else:
+            message = f'Изменено рядов: {self.worker.rows_changed}'
+        self.statusBar().showMessage(f'{message} | Время: {self.worker.elapsed:.3f} с')
+
+    def query_executed(self):
+        self.enterButton.setEnabled(True)
+        self.cancelButton.setEnabled(False)
+        self.resultView.resizeColumnsToContents()
+        self.show_result_info()
+
+    def query_failed(self, text: str):
+        if self.sender().cancelled:
+            self.statusBar().showMessage(text)
+        else:
+            QMessageBox.critical(None, 'Error', f'Неверный запрос\n{text}', QMessageBox.Ok)
+
+    def query_finished(self, worker: QueryWorker):
+        """
+        Курсор запроса закрыт: перезагружаем вкладки только тех таблиц, которые запрос изменил
+        """
+
+        if worker is self.worker:
+            self.show_result_info()
+            self.worker = None
+            self.enterButton.setEnabled(True)
+            self.cancelButton.setEnabled(False)
+        worker.deleteLater()
+        profiling.record('query', worker.elapsed, sql=worker.sql, rows=worker.rows_returned,
+                         changed=worker.rows_changed, error=worker.error)
+        if worker.error is None:
+            self.history.add(worker.path, worker.sql, worker.elapsed, worker.rows_returned, worker.rows_changed,
+                             worker.full_scan())
+            self.load_history()
+            if worker.full_scan():
+                self.ref.advise_indexes(self.advisor, [(worker.sql, [])], 'SQL запросы', worker.elapsed)
+        if worker.modified_tables:
+            self.ref.reload_db_tables(worker.modified_tables)
         self.ref.query_sent = False
 
+    def show_plan(self, plan: list):
+        """
+        Строим дерево плана: у каждого шага есть номер родительского шага
+        """
+
+        if self.sender() is not self.worker:
+            return
+        self.planTree.clear()
+        items = dict()
+        scans = 0
+        for step_id, parent_id, _, detail in plan:
+            parent = items.get(parent_id)
+            item = QTreeWidgetItem([str(detail)])
+            if parent is None:
+                self.planTree.addTopLevelItem(item)
+            else:
+                parent.addChild(item)
+            if is_full_scan(detail):
+                scans += 1
+                item.setBackground(0, FULL_SCAN_COLOR)
+                item.setToolTip(0, 'Полный просмотр таблицы: для условия может пригодиться индекс')
+            items[step_id] = item
+        self.planTree.expandAll()
+        self.resultTabs.setTabText(self.resultTabs.indexOf(self.planTab),
+                                   f'План запроса ({scans} полн. скан.)' if scans else 'План запроса')
+
+    def load_history(self):
+        header = self.historyView.horizontalHeader()
+        model = HistoryModel(QueryHistory.COLUMNS, self.history.entries(), self.historyView)
+        replace_model(self.historyView, model)
+        if header.sortIndicatorSection() < model.columnCount():
+            model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+        self.historyView.resizeColumnsToContents()
+        self.historyView.setColumnWidth(HistoryModel.SQL_COL, min(self.historyView.columnWidth(HistoryModel.SQL_COL), 250))
+
+    def rerun_query(self, index: QModelIndex):
+        self.sqlTextEdit.setPlainText(self.historyView.model().sql(index.row()))
+        self.resultTabs.setCurrentWidget(self.resultTab)
+        self.send_sql_query()
+
+    def closeEvent(self, event):
+        self.cancel_sql_query()
+        self.history.close()
+        super().closeEvent(event)
+
 
 class PlotForm(QWidget, plotform_design.Ui_Form):
     """
@@ -622,9 +1706,9 @@ class PlotForm(QWidget, plotform_design.Ui_Form):
     Методы
     ------
     build_plot() :
-        Строит, сохраняет график, построенный по выбранным столбцам.
+        Строит график по выбранным столбцам или берёт готовый из кэша.
     show_plot() :
-        Вызывает класс PlotWindow.
+        Показывает окно PlotWindow с графиком.
     """
 
     def __init__(self, ref: QMainWindow):
@@ -633,8 +1717,8 @@ class PlotForm(QWidget, plotform_design.Ui_Form):
         self.setupUi(self)
         self.buttonBox.accepted.connect(self.build_plot)
         self.buttonBox.rejected.connect(self.close)
-        self.curr = self.ref.tabWidget.currentWidget().children()[0]
-        self.headers = [self.curr.horizontalHeaderItem(i).text() for i in range(self.curr.columnCount())]
+        self.curr = self.ref.tabWidget.currentWidget().children()[0].model()
+        self.headers = [self.curr.header(i) for i in range(self.curr.columnCount())]
         for header in self.headers:
             self.axisXComboBox.addItem(header)
             self.axisYComboBox.addItem(header)
@@ -642,187 +1726,329 @@ class PlotForm(QWidget, plotform_design.Ui_Form):
     def build_plot(self):
         """
         Построение графика.
-        Выделяем данные из столбцов, передаём их в функции seaborn
+        Выделяем данные из столбцов, передаём их в функции seaborn.
+        График рисуется в памяти, а окно с ним запоминается: пока таблица не изменилась,
+        тот же график открывается без перерисовки
         """
 
         x = self.axisXComboBox.currentText()
         y = self.axisYComboBox.currentText()
-        col_x = self.headers.index(x)
-        data_x = [self.curr.item(row_x, col_x).text()
-                  if not self.curr.item(row_x, col_x).text().replace('.', '', 1).isdigit()
-                  else float(self.curr.item(row_x, col_x).text())
-                  for row_x in range(self.curr.rowCount())]
-
-        col_y = self.headers.index(y)
-        data_y = [self.curr.item(row_y, col_y).text()
-                  if not self.curr.item(row_y, col_y).text().replace('.', '', 1).isdigit()
-                  else float(self.curr.item(row_y, col_y).text())
-                  for row_y in range(self.curr.rowCount())]
-
-        check_int_values_y = all([type(i) in (int, float) for i in data_y])
-        check_int_values_x = all([type(j) in (int, float) for j in data_x])
-        name = f'./plots/{x}_to_{y}.png'
+        key = (self.curr.version, x, y)
+        if key in self.ref.plot_cache:
+            self.show_plot(self.ref.plot_cache[key])
+            self.close()
+            return
 
+        # matplotlib и seaborn загружаются только при первом графике (если не загрузились заранее в фоне)
+        from matplotlib.figure import Figure
+        figure = Figure()
+        axes = figure.add_subplot()
         try:
-            plot = sns.lineplot(x=data_x, y=data_y) \
-                if check_int_values_y and check_int_values_x \
-                else sns.barplot(x=data_x, y=data_y)
-            plot.set_xlabel(x)
-            plot.set_ylabel(y)
-            plt.savefig(name)
-            plt.close()
-            self.show_plot(name)
-            self.close()
+            if isinstance(self.curr, SQLiteTableModel):
+                # Очередь записи сначала сохраняется, чтобы график учитывал все изменения
+                self.ref.flush_changes()
+                with profiling.timed('plot', x=x, y=y, source='sqlite'):
+                    series, note = plot_database(axes, self.curr.con, self.curr.table, x, y)
+            else:
+                with profiling.timed('plot', x=x, y=y, rows=self.curr.total_row_count()):
+                    series, note = plot_columns(axes, self.curr.typed_column(self.headers.index(x)),
+                                                self.curr.typed_column(self.headers.index(y)))
+            axes.set_xlabel(x)
+            axes.set_ylabel(y)
         except TypeError:
             QMessageBox.critical(None, 'Error', 'Ни один столбец не заполнен числами полностью', QMessageBox.Ok)
-
-    def show_plot(self, name: str):
+            return
+        except sqlite3.Error as e:
+            # Например, БД заблокирована другой программой или таблицу удалили SQL запросом
+            QMessageBox.critical(None, 'Error', f'Не удалось построить график\n{e}', QMessageBox.Ok)
+            return
+
+        window = PlotWindow(figure, f'{x}_to_{y}', series, note)
+        self.ref.plot_cache[key] = window
+        if len(self.ref.plot_cache) > PLOT_CACHE_SIZE:
+            # Словарь помнит порядок добавления - первым удаляется самый старый график
+            old = self.ref.plot_cache.pop(next(iter(self.ref.plot_cache)))
+            old.close()
+            old.deleteLater()
+        self.show_plot(window)
+        self.close()
+
+    def show_plot(self, window: QMainWindow):
         """
         Показываем окно с графиком
         """
 
-        self.plot_window = PlotWindow(name)
-        self.plot_window.show()
+        window.show()
+        window.raise_()
+        window.activateWindow()
 
 
 class PlotWindow(QMainWindow):
     """
     Класс, реализующий окно для вывода графика на экран.
-
-    Дизайн
-    ------
-    ui файлы были конвертированы в код и подключаются из ui_files
+    График рисуется холстом matplotlib (Agg) прямо в окне, на диск он записывается только по Ctrl+S.
+    Приближение и сдвиг меняют видимый диапазон осей, и график перерисовывается в разрешении экрана.
+    Точки линейного графика после этого заново прореживаются в отдельном потоке для видимого диапазона.
 
     Атрибуты
     ------
-    file : str
-        Хранит название картинки, в которой сохранён график.
-    width : int
-        Ширина картинки.
-    height : int
-        Высота картинки.
-    pixmap : QPixmap
-        Хранит само изображение.
-    lbl : QLabel
-        Виджет, выводящий переданное ему изображение на экран.
+    figure : Figure
+        Рисунок matplotlib с графиком.
+    name : str
+        Название графика, предлагается как имя файла при сохранении.
+    series : tuple | None
+        Все точки линейного графика (X, Y), отсортированные по X. None для столбчатой диаграммы.
+    canvas : FigureCanvasQTAgg
+        Виджет, рисующий график.
+    axes : Axes
+        Оси графика.
+    sampler : PlotSampler | None
+        Поток, прореживающий точки для текущего видимого диапазона.
+    resample_timer : QTimer
+        Откладывает прореживание, пока пользователь продолжает приближать или сдвигать график.
+    drag : tuple | None
+        Положение курсора и границы осей в момент нажатия ЛКМ.
 
     Методы
     ------
     initUI() :
         Инициализирует интерфейс.
-    keyPressEvent() :
+    key_pressed() :
         Обрабатывает нажатие клавиш.
-        Работает при нажатии UpArrow и DownArrow (увеличивает/уменьшает масштаб изображения)
-    mousePressEvent() :
-        Обрабатывает нажатие кнопок мыши.
-        Работает если нажата LMB.
-    mouseReleaseEvent() :
-        Обрабатывает событие отпускания кнопки мыши.
-    mouseMoveEvent() :
-        Обрабатывает движение мыши.
-        Работает только при зажатом LMB.
+        UpArrow и DownArrow приближают/отдаляют график, LeftArrow и RightArrow сдвигают его.
+    scrolled() :
+        Приближает/отдаляет график колёсиком мыши вокруг курсора.
+    mouse_pressed() :
+        Начинает сдвиг графика, если нажата ЛКМ.
+    mouse_moved() :
+        Сдвигает график за курсором.
+    mouse_released() :
+        Заканчивает сдвиг графика.
+    zoom() :
+        Меняет видимый диапазон осей вокруг заданной точки.
+    set_limits() :
+        Задаёт видимый диапазон осей и откладывает прореживание точек.
+    resample() :
+        Запускает прореживание точек для видимого диапазона.
+    points_sampled() :
+        Подставляет прореженные точки в линию графика.
+    save_plot() :
+        Сохраняет график в файл.
     """
 
-    def __init__(self, file: str):
+    def __init__(self, figure: 'Figure', name: str, series: tuple = None, note: str = ''):
         super().__init__()
-        self.file = file
-        self.width, self.height = Image.open(self.file).size
-        self.pixmap = QPixmap(self.file)
-        self.lbl = QLabel(self)
-        self.initUI()
+        self.figure = figure
+        self.name = name
+        self.series = series
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.axes = self.figure.axes[0]
+        self.sampler = None
+        self.drag = None
+        self.resample_timer = QTimer(self)
+        self.initUI(note)
+
+    def initUI(self, note: str):
+        """
+        Размещаем холст с графиком на окне
+        :param note: Сообщение для строки состояния
+        """
+
+        self.setWindowTitle(self.name)
+        self.setCentralWidget(self.canvas)
+        self.resize(*(int(size * self.figure.dpi) for size in self.figure.get_size_inches()))
+        self.canvas.setFocusPolicy(Qt.StrongFocus)
+        self.canvas.mpl_connect('key_press_event', self.key_pressed)
+        self.canvas.mpl_connect('scroll_event', self.scrolled)
+        self.canvas.mpl_connect('button_press_event', self.mouse_pressed)
+        self.canvas.mpl_connect('motion_notify_event', self.mouse_moved)
+        self.canvas.mpl_connect('button_release_event', self.mouse_released)
+        self.resample_timer.setSingleShot(True)
+        self.resample_timer.setInterval(RESAMPLE_DELAY)
+        self.resample_timer.timeout.connect(self.resample)
+        if note:
+            self.statusBar().showMessage(note)
+        elif self.series is not None and len(self.axes.lines[0].get_xdata()) < len(self.series[0]):
+            self.statusBar().showMessage(f'Показано точек: {len(self.axes.lines[0].get_xdata())} '
+                                         f'из {len(self.series[0])}')
+        self.shortcut = QShortcut(QKeySequence('Ctrl+S'), self)
+        self.shortcut.activated.connect(self.save_plot)
 
-    def initUI(self):
+    def key_pressed(self, event):
         """
-        Размещаем изображение графика на окне
+        Приближаем график, если нажата стрелка вверх, отдаляем, если нажата стрелка вниз.
+        Стрелки влево и вправо сдвигают график на десятую часть видимого диапазона
         """
 
-        self.setGeometry(30, 30, self.width, self.height)
-        self.lbl.resize(self.width, self.height)
-        self.lbl.move(0, 0)
-        self.lbl.setPixmap(self.pixmap)
-        self.setMouseTracking(True)
-        self.mouse_button = None
-        self.distance = []
+        (x0, x1), (y0, y1) = self.axes.get_xlim(), self.axes.get_ylim()
+        if event.key == 'up':
+            self.zoom(1 / ZOOM_STEP, (x0 + x1) / 2, (y0 + y1) / 2)
+        elif event.key == 'down':
+            self.zoom(ZOOM_STEP, (x0 + x1) / 2, (y0 + y1) / 2)
+        elif event.key in ('left', 'right'):
+            shift = (x1 - x0) / 10 * (1 if event.key == 'right' else -1)
+            self.set_limits((x0 + shift, x1 + shift), (y0, y1))
 
-    def keyPressEvent(self, event):
+    def scrolled(self, event):
         """
-        Увеличиваем картинку, если нажата стрелка вверх,
-        уменьшаем, если нажата стрелка вниз
+        Приближаем или отдаляем график вокруг точки под курсором
         """
 
-        if event.key() == Qt.Key_Up:
-            self.width += int(50 * self.width / self.height)
-            self.height += 50
-        elif event.key() == Qt.Key_Down:
-            self.width -= int(50 * self.width / self.height)
-            self.height -= 50
-        self.lbl.setPixmap(self.pixmap.scaled(self.width, self.height))
-        self.lbl.resize(self.width, self.height)
+        if event.xdata is not None:
+            self.zoom(1 / ZOOM_STEP if event.step > 0 else ZOOM_STEP, event.xdata, event.ydata)
 
-    def mousePressEvent(self, event):
+    def mouse_pressed(self, event):
         """
-        Фиксируем расстояние от курсора до левого верхнего угла картинки
+        Запоминаем положение курсора и видимый диапазон в момент нажатия ЛКМ
         """
 
-        self.mouse_button = event.button()
-        self.distance = [event.x() - self.lbl.x(), event.y() - self.lbl.y()]
+        if event.button == 1 and event.inaxes is self.axes:
+            self.drag = (event.x, event.y, self.axes.get_xlim(), self.axes.get_ylim())
 
-    def mouseReleaseEvent(self, event):
+    def mouse_moved(self, event):
         """
-        Если ЛКМ отжата, то необходимо обнулить переменную, хранящую название нажатой кнопки мыши
+        Сдвигаем график за курсором
         """
 
-        self.mouse_button = None
+        if self.drag is None:
+            return
+        x, y, (x0, x1), (y0, y1) = self.drag
+        box = self.axes.bbox
+        dx = (event.x - x) * (x1 - x0) / box.width
+        dy = (event.y - y) * (y1 - y0) / box.height
+        self.set_limits((x0 - dx, x1 - dx), (y0 - dy, y1 - dy))
 
-    def mouseMoveEvent(self, event):
+    def mouse_released(self, event):
         """
-        Двигаем картинку за курсором
+        Когда ЛКМ отжата, сдвиг графика заканчивается
         """
 
-        if self.mouse_button == Qt.LeftButton:
-            self.lbl.move(event.x() - self.distance[0], event.y() - self.distance[1])
+        self.drag = None
+
+    def zoom(self, factor: float, x: float, y: float):
+        """
+        Меняем видимый диапазон в factor раз так, чтобы точка (x, y) осталась на месте
+        """
 
+        (x0, x1), (y0, y1) = self.axes.get_xlim(), self.axes.get_ylim()
+        self.set_limits((x - (x - x0) * factor, x + (x1 - x) * factor),
+                        (y - (y - y0) * factor, y + (y1 - y) * factor))
 
-def fill_table(table: QTableWidget, titles: list[str], data: list[list[str]]):
+    def set_limits(self, x_limits: tuple, y_limits: tuple):
+        """
+        Сразу перерисовываем график с уже прореженными точками,
+        а прореживание для нового диапазона откладываем до паузы в приближении и сдвиге
+        """
+
+        self.axes.set_xlim(x_limits)
+        self.axes.set_ylim(y_limits)
+        self.canvas.draw_idle()
+        if self.series is not None:
+            self.resample_timer.start()
+
+    def resample(self):
+        """
+        Прореживаем точки для видимого диапазона в отдельном потоке.
+        Результат предыдущего потока, если он ещё работает, больше не нужен
+        """
+
+        if self.sampler is not None:
+            self.sampler.requestInterruption()
+        x0, x1 = sorted(self.axes.get_xlim())
+        sampler = PlotSampler(*self.series, x0, x1, self)
+        sampler.sampled.connect(lambda x, y, total: self.points_sampled(sampler, x, y, total))
+        sampler.finished.connect(sampler.deleteLater)
+        self.sampler = sampler
+        sampler.start()
+
+    def points_sampled(self, sampler: PlotSampler, x, y, total: int):
+        """
+        Подставляем точки в линию графика, если диапазон с тех пор не менялся
+        """
+
+        if sampler is not self.sampler:
+            return
+        self.sampler = None
+        self.axes.lines[0].set_data(x, y)
+        self.canvas.draw_idle()
+        self.statusBar().showMessage(f'Показано точек: {len(x)} из {total}' if len(x) < total else '')
+
+    def save_plot(self):
+        """
+        Сохраняем график в файл, выбранный пользователем
+        """
+
+        file_name = QFileDialog.getSaveFileName(self, 'Сохранить график', f'./plots/{self.name}.png',
+                                                'Images (*.png *.jpg *.svg *.pdf)')[0]
+        if file_name:
+            try:
+                self.figure.savefig(file_name)
+            except (OSError, ValueError) as e:
+                QMessageBox.critical(None, 'Error', f'Не удалось сохранить график\n{e}', QMessageBox.Ok)
+
+    def closeEvent(self, event):
+        """
+        Дожидаемся потока прореживания, чтобы он не остался работать после удаления окна
+        """
+
+        self.resample_timer.stop()
+        if self.sampler is not None:
+            self.sampler.requestInterruption()
+            self.sampler.wait()
+        super().closeEvent(event)
+
+
+def fill_table(table: QTableView, titles: list[str], data: list[list[str]]):
     """
-    Функция заполнения таблицы QTableWidget
+    Функция заполнения таблицы QTableView.
+    Виджеты под каждую ячейку не создаются: представление само запрашивает у модели видимые ячейки.
+    Данные хранятся по столбцам, тип каждого столбца определяется при загрузке
     """
 
-    table.setRowCount(len(data))
-    table.setColumnCount(len(titles))
-    table.setHorizontalHeaderLabels(titles)
-    for y, elem in enumerate(data):
-        for x, val in enumerate(elem):
-            table.setItem(y, x, QTableWidgetItem(str(val)))
+    with profiling.timed('fill_table', rows=len(data)):
+        replace_model(table, ColumnStoreModel(titles, data, table))
 
 
-def get_data_from_table(cur_table_widget: QObject) -> list[list]:
+def replace_model(table: QTableView, model: ListTableModel):
     """
-    Собирает информацию из таблицы
-    :return: Список списков, представляющих собой ряды таблицы
+    Подключает к виджету новую модель, а старую удаляет, чтобы она не держала данные в памяти
     """
 
-    data, half = list(), list()
-    for i in range(cur_table_widget.rowCount()):
-        for j in range(cur_table_widget.columnCount()):
-            half.append(cur_table_widget.item(i, j).text())
-        data.append(half)
-        half = []
-    return data
+    old = table.model()
+    table.setModel(model)
+    # Новая модель не отсортирована
+    table.horizontalHeader().setSortIndicatorShown(False)
+    if old is not None:
+        old.deleteLater()
 
 
 def except_hook(cls, exception, traceback):
     """
-    Ловим ошибки
+    Ловим ошибки и записываем в журнал операций, во время какой операции они возникли
     """
 
+    profiling.log_exception(cls, exception)
     sys.__excepthook__(cls, exception, traceback)
 
 
 # ЗАПУСК
 if __name__ == '__main__':
+    # С аргументами программа работает без окон (см. cli.py)
+    if len(sys.argv) > 1:
+        sys.exit(cli.main(sys.argv[1:]))
+    # Время операций пишется в журнал, а с переменной окружения TIPY_PROFILE весь сеанс профилируется
+    profiling.setup_log()
+    profiling.start_profiling()
     app = QApplication(sys.argv)
     tipy = TableInspector()
     tipy.show()
     sys.excepthook = except_hook
+
+    def started():
+        # Окна уже показаны: записываем время запуска и начинаем загружать библиотеки для графиков
+        profiling.record('startup', time.perf_counter() - profiling.STARTED)
+        tipy.preload_plotting()
+
+    QTimer.singleShot(0, started)
     sys.exit(app.exec())
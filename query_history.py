@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import time
+
+# Файл, в котором хранится история SQL запросов
+HISTORY_PATH = os.path.join(os.path.expanduser('~'), '.tipy_history.sqlite')
+
+# Сколько последних запросов хранится в истории
+HISTORY_LIMIT = 1000
+
+
+class QueryHistory:
+    """
+    История выполненных SQL запросов с их стоимостью.
+    Хранится в отдельной базе SQLite, поэтому переживает перезапуск программы.
+
+    Атрибуты
+    ------
+    path : str
+        Путь к файлу истории.
+    con : sqlite3.Connection | None
+        Соединение с файлом истории или None, если его не удалось открыть.
+
+    Методы
+    ------
+    add() :
+        Записывает выполненный запрос.
+    entries() :
+        Возвращает записи истории, самые дорогие запросы - первыми.
+    close() :
+        Закрывает файл истории.
+    """
+
+    COLUMNS = ['Выполнен', 'Запрос', 'Время, с', 'Рядов', 'Изменено', 'Полный скан', 'База данных']
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self.path = path
+        try:
+            self.con = sqlite3.connect(path)
+            self.con.execute("""CREATE TABLE IF NOT EXISTS history (
+                                    id INTEGER PRIMARY KEY,
+                                    started TEXT NOT NULL,
+                                    sql TEXT NOT NULL,
+                                    elapsed REAL NOT NULL,
+                                    rows_returned INTEGER NOT NULL,
+                                    rows_changed INTEGER NOT NULL,
+                                    full_scan INTEGER NOT NULL,
+                                    db TEXT NOT NULL)""")
+            self.con.commit()
+        except sqlite3.Error:
+            # Без истории окно запросов всё равно должно работать
+            self.con = None
+
+    def add(self, db: str, sql: str, elapsed: float, rows_returned: int, rows_changed: int, full_scan: bool):
+        if self.con is None:
+            return
+        try:
+            self.con.execute('INSERT INTO history(started, sql, elapsed, rows_returned, rows_changed, full_scan, db) '
+                             'VALUES(?, ?, ?, ?, ?, ?, ?)',
+                             [time.strftime('%Y-%m-%d %H:%M:%S'), sql, elapsed, rows_returned, rows_changed,
+                              int(full_scan), db])
+            self.con.execute('DELETE FROM history WHERE id <= (SELECT max(id) FROM history) - ?', [HISTORY_LIMIT])
+            self.con.commit()
+        except sqlite3.Error:
+            self.con.rollback()
+
+    def entries(self) -> list[list]:
+        """
+        :return: Ряды в порядке COLUMNS
+        """
+
+        if self.con is None:
+            return []
+        return [list(x) for x in self.con.execute(
+            'SELECT started, sql, elapsed, rows_returned, rows_changed, full_scan, db '
+            'FROM history ORDER BY elapsed DESC')]
+
+    def close(self):
+        if self.con is not None:
+            self.con.close()
+            self.con = None
@@ -0,0 +1,29 @@
+import sqlite3
+
+
+def quote_name(name: str) -> str:
+    """
+    Экранирует название таблицы или столбца для подстановки в SQL запрос
+    """
+
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def estimated_rows(con: sqlite3.Connection, table: str) -> int | None:
+    """
+    Примерное количество рядов таблицы без полного прохода по ней.
+    Берётся из статистики ANALYZE (sqlite_stat1), а если её нет - из max(rowid),
+    который SQLite находит по индексу, не просматривая таблицу
+    :return: None, если оценить не удалось (например, у таблицы WITHOUT ROWID нет статистики)
+    """
+
+    try:
+        stat = con.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1', (table,)).fetchone()
+    except sqlite3.Error:
+        stat = None
+    if stat and stat[0]:
+        return int(stat[0].split()[0])
+    try:
+        return con.execute(f'SELECT max(rowid) FROM {quote_name(table)}').fetchone()[0] or 0
+    except sqlite3.Error:
+        return None
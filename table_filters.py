@@ -0,0 +1,130 @@
+import operator
+import numpy as np
+from column_store import Column, TEXT
+
+# Операторы, которые можно написать в начале фильтра. Текст без оператора ищется как подстрока
+OPERATORS = ('>=', '<=', '!=', '<>', '=', '>', '<')
+
+# Функции сравнения для операторов фильтра
+COMPARISONS = {'=': operator.eq, '!=': operator.ne, '>': operator.gt, '>=': operator.ge,
+               '<': operator.lt, '<=': operator.le}
+
+
+class ColumnFilter:
+    """
+    Фильтр одного столбца, введённый в строке фильтров.
+    "=5", ">=2.5", "!=abc" сравнивают значение ячейки с тем, что написано после оператора,
+    любой другой текст ищется в ячейках как подстрока (с учётом регистра).
+    Если после оператора написано число, ячейки сравниваются с ним как числа, а ячейки, в которых
+    не число, такой фильтр не проходят.
+    Пустые ячейки не проходят ни один фильтр.
+    Один и тот же фильтр переводится в условие SQL для таблиц БД и проверяется в программе для csv файлов.
+
+    Атрибуты
+    ------
+    text : str
+        Текст фильтра.
+    op : str
+        Оператор сравнения или 'contains' для поиска подстроки.
+    operand : str
+        Текст, с которым сравниваются ячейки.
+    number : int | float | None
+        operand в виде числа, если это число и фильтр - сравнение.
+
+    Методы
+    ------
+    sql() :
+        Условие для WHERE с параметрами.
+    matches() :
+        Проверяет одну ячейку.
+    mask() :
+        Проверяет весь столбец сразу.
+    uses_index() :
+        Проверяет, может ли условие фильтра искаться по индексу БД.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        for op in OPERATORS:
+            if text.startswith(op):
+                self.op, self.operand = ('!=' if op == '<>' else op), text[len(op):].strip()
+                break
+        else:
+            self.op, self.operand = 'contains', text
+        self.number = None
+        if self.op != 'contains':
+            for kind in (int, float):
+                try:
+                    self.number = kind(self.operand)
+                    break
+                except ValueError:
+                    pass
+
+    def sql(self, column: str) -> tuple[str, list]:
+        """
+        :param column: Экранированное название столбца
+        :return: Условие и его параметры
+        """
+
+        if self.op == 'contains':
+            return f'instr({column}, ?) > 0', [self.operand]
+        if self.number is not None:
+            # SQLite считает любой текст больше любого числа, а matches() текст с числом не сравнивает
+            return f"(typeof({column}) IN ('integer', 'real') AND {column} {self.op} ?)", [self.number]
+        return f'{column} {self.op} ?', [self.operand]
+
+    def uses_index(self) -> bool:
+        return self.op not in ('contains', '!=')
+
+    def matches(self, text: str) -> bool:
+        if text == '':
+            return False
+        if self.op == 'contains':
+            return self.operand in text
+        if self.number is None:
+            return COMPARISONS[self.op](text, self.operand)
+        try:
+            return COMPARISONS[self.op](float(text), self.number)
+        except ValueError:
+            return False
+
+    def mask(self, column: Column) -> np.ndarray:
+        """
+        Числовой столбец сравнивается с числом одной операцией NumPy, в текстовом
+        проверяются только разные строки словаря, остальные случаи - по ячейкам
+        :return: Массив bool: True для прошедших фильтр рядов
+        """
+
+        if column.kind != TEXT and self.number is not None:
+            with np.errstate(invalid='ignore'):
+                return COMPARISONS[self.op](column.numeric(), self.number) & ~column.null_mask()
+        if column.kind == TEXT:
+            passed = np.fromiter(map(self.matches, column.strings), dtype=bool, count=len(column.strings))
+            if not len(passed):
+                return np.zeros(column.size, dtype=bool)
+            return passed[np.frombuffer(column.data, dtype=np.uint32)] & ~column.null_mask()
+        return np.fromiter(map(self.matches, column.values()), dtype=bool, count=column.size)
+
+
+def view_order(rows: np.ndarray | None, size: int, column, sort_column: int, descending: bool,
+               filters: dict[int, ColumnFilter]) -> np.ndarray | None:
+    """
+    Порядок показа рядов после фильтров и сортировки - перестановка номеров рядов,
+    по которой модель находит ряд для каждой строки таблицы. Сами данные не переставляются
+    :param rows: Номера рядов, из которых выбираются видимые (None - все size рядов)
+    :param column: Функция, возвращающая Column по номеру столбца (ряды Column совпадают с номерами rows)
+    :param sort_column: Номер столбца для сортировки, -1 - без сортировки
+    :return: Номера видимых рядов в порядке показа или None, если фильтров и сортировки нет
+    """
+
+    if sort_column < 0 and not filters:
+        return None
+    rows = np.arange(size, dtype=np.int64) if rows is None else rows
+    for col, row_filter in filters.items():
+        rows = rows[row_filter.mask(column(col))[rows]]
+    if sort_column >= 0:
+        ranks = column(sort_column).ranks()[rows]
+        # Сортировка устойчивая: равные значения остаются в исходном порядке, пустые ячейки
+        # при сортировке по убыванию идут последними
+        rows = rows[np.argsort(-ranks if descending else ranks, kind='stable')]
+    return rows
@@ -0,0 +1,1311 @@
+import codecs
+import csv
+import io
+import re
+import sqlite3
+from itertools import count, islice
+from array import array
+from bisect import bisect_left
+import numpy as np
+from column_store import Column, ColumnStore, without_rows
+from csv_index import CsvIndex
+from sqlite_schema import estimated_rows, quote_name
+from table_filters import ColumnFilter, view_order
+from text_search import SEARCH_LIMIT, FTS_MIN_LENGTH, fts_phrase
+from write_queue import PendingRowid
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+
+# Сколько рядов БД подгружается в модель за один раз
+FETCH_BATCH = 256
+
+# Сколько рядов БД подгружается за раз, когда поиск переходит к ещё не загруженному ряду
+SEEK_BATCH = 4096
+
+# Номера версий данных моделей. Номера не повторяются между моделями,
+# поэтому версия указывает и на таблицу, и на её состояние
+DATA_VERSIONS = count(1)
+
+# Цвет, которым выделяются запросы и шаги плана с полным просмотром таблицы
+FULL_SCAN_COLOR = QColor(255, 220, 200)
+
+# Параметр таблицы WITHOUT ROWID после закрывающей скобки списка столбцов в CREATE TABLE
+WITHOUT_ROWID = re.compile(r'\bWITHOUT\s+ROWID\b', re.IGNORECASE)
+
+
+class ListTableModel(QAbstractTableModel):
+    """
+    Модель таблицы, все ряды которой хранятся в памяти.
+    Используется для csv файлов и создаваемых таблиц.
+
+    Атрибуты
+    ------
+    titles : list
+        Названия столбцов.
+    rows : list
+        Список рядов таблицы.
+    complete : bool
+        False, если таблица была прочитана из файла не полностью (например, чтение отменили).
+    version : int
+        Номер версии данных, меняется при каждом изменении таблицы.
+    sortable : bool
+        True, если модель умеет сортировать и фильтровать ряды.
+    sort_column : int
+        Столбец, по которому отсортирована таблица, -1 - без сортировки.
+    sort_order : Qt.SortOrder
+        Направление сортировки.
+    filters : dict
+        Фильтры столбцов: номер столбца -> ColumnFilter.
+    cellChanged : pyqtSignal
+        Сигнал, который испускается после изменения ячейки пользователем (ряд, столбец).
+        Повторяет сигнал cellChanged у QTableWidget.
+
+    Методы
+    ------
+    value() :
+        Возвращает текст ячейки.
+    row_values() :
+        Возвращает текст всех ячеек ряда.
+    column_values() :
+        Возвращает текст всех ячеек столбца.
+    set_titles() :
+        Задаёт названия столбцов.
+    append_row() :
+        Добавляет пустой ряд в конец таблицы.
+    append_rows() :
+        Добавляет в конец таблицы порцию уже прочитанных рядов.
+    insert_column() :
+        Добавляет пустой столбец в конец таблицы.
+    remove_row() :
+        Удаляет ряд из таблицы.
+    remove_rows() :
+        Удаляет несколько рядов за одно обновление представления.
+    write_csv() :
+        Записывает таблицу в csv файл.
+    stored_rows() :
+        Все ряды в порядке хранения, без учёта сортировки и фильтров.
+    bump_version() :
+        Выдаёт модели новый номер версии данных.
+    typed_column() :
+        Значения столбца в типизированном виде (Column).
+    total_row_count() :
+        Общее количество рядов (в том числе ещё не загруженных).
+    row_count_label() :
+        Количество рядов для вывода в строке состояния.
+    sort() :
+        Сортирует таблицу по столбцу (вызывается при щелчке по заголовку).
+    set_filter() :
+        Задаёт фильтр столбца.
+    clear_view() :
+        Убирает сортировку и все фильтры.
+    refresh_view() :
+        Заново выбирает видимые ряды после изменения сортировки или фильтров.
+    search() :
+        Ищет ряды, в ячейках которых есть подстрока.
+    hit_row() :
+        Номер ряда таблицы для найденного поиском ряда.
+    """
+
+    cellChanged = pyqtSignal(int, int)
+    sortable = False
+
+    def __init__(self, titles: list[str], rows: list[list] = None, parent=None):
+        super().__init__(parent)
+        self.titles = list(titles)
+        self.rows = rows if rows is not None else []
+        self.complete = True
+        self.version = next(DATA_VERSIONS)
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self.filters = dict()
+        for signal in (self.dataChanged, self.rowsInserted, self.rowsRemoved, self.columnsInserted,
+                       self.modelReset):
+            signal.connect(self.bump_version)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.titles)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.EditRole):
+            return self.value(index.row(), index.column())
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.header(section) if section < len(self.titles) else None
+        return section + 1
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole) -> bool:
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        self.set_value(index.row(), index.column(), str(value))
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.cellChanged.emit(index.row(), index.column())
+        return True
+
+    def header(self, col: int) -> str:
+        return str(self.titles[col])
+
+    def value(self, row: int, col: int) -> str:
+        vals = self.rows[row]
+        return str(vals[col]) if col < len(vals) else ''
+
+    def set_value(self, row: int, col: int, value: str):
+        vals = self.rows[row]
+        if col >= len(vals):
+            vals.extend([''] * (col + 1 - len(vals)))
+        vals[col] = value
+
+    def row_values(self, row: int) -> list[str]:
+        return [self.value(row, col) for col in range(len(self.titles))]
+
+    def column_values(self, col: int) -> list[str]:
+        return [self.value(row, col) for row in range(self.rowCount())]
+
+    def set_titles(self, titles: list[str]):
+        self.beginResetModel()
+        self.titles = list(titles)
+        self.endResetModel()
+
+    def append_rows(self, rows: list[list]):
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def append_row(self) -> int:
+        """
+        Добавляет пустой ряд и возвращает его номер
+        """
+
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.append([''] * len(self.titles))
+        self.endInsertRows()
+        return row
+
+    def insert_column(self, title: str):
+        col = len(self.titles)
+        self.beginInsertColumns(QModelIndex(), col, col)
+        self.titles.append(title)
+        for vals in self.rows:
+            vals.append('')
+        self.endInsertColumns()
+
+    def remove_row(self, row: int):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.endRemoveRows()
+
+    def remove_rows(self, rows: list[int]):
+        self.beginResetModel()
+        self.rows = without_rows(self.rows, rows)
+        self.endResetModel()
+
+    def write_csv(self, f, encoding: str, delimiter: str):
+        """
+        Записывает таблицу ряд за рядом, не собирая её копию в памяти
+        :param f: Файл, открытый на запись в двоичном режиме
+        """
+
+        text = io.TextIOWrapper(f, encoding=encoding, newline='')
+        writer = csv.writer(text, delimiter=delimiter)
+        writer.writerow(self.titles)
+        writer.writerows(self.stored_rows())
+        text.flush()
+        # Файл закрывает тот, кто его открыл
+        text.detach()
+
+    def stored_rows(self):
+        """
+        Генератор по всем рядам таблицы в том порядке, в котором они хранятся (и сохраняются в файл),
+        без учёта сортировки и фильтров
+        """
+
+        return (self.row_values(row) for row in range(self.total_row_count()))
+
+    def bump_version(self, *args):
+        """
+        Вызывается при любом изменении данных, чтобы построенные по ним графики не брались из кэша
+        """
+
+        self.version = next(DATA_VERSIONS)
+
+    def typed_column(self, col: int) -> Column:
+        """
+        Тип столбца определяется по всем его значениям за один проход
+        """
+
+        return Column(self.column_values(col))
+
+    def total_row_count(self) -> int:
+        return len(self.rows)
+
+    def row_count_label(self) -> str:
+        if self.rowCount() != self.total_row_count():
+            return f'{self.rowCount()} из {self.total_row_count()}'
+        return str(self.total_row_count())
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        if not self.sortable:
+            return
+        self.sort_column = column
+        self.sort_order = order
+        self.refresh_view()
+
+    def set_filter(self, col: int, text: str):
+        """
+        :param text: Текст фильтра (см. ColumnFilter), пустая строка убирает фильтр столбца
+        """
+
+        if text == (self.filters[col].text if col in self.filters else ''):
+            return
+        if text:
+            self.filters[col] = ColumnFilter(text)
+        else:
+            del self.filters[col]
+        self.refresh_view()
+
+    def clear_view(self):
+        if self.sort_column < 0 and not self.filters:
+            return
+        self.sort_column = -1
+        self.filters = dict()
+        self.refresh_view()
+
+    def refresh_view(self):
+        pass
+
+    def search(self, text: str):
+        """
+        Подстрока ищется с учётом регистра во всех столбцах видимых рядов
+        :return: Найденные ряды в порядке показа (не больше SEARCH_LIMIT), которые переводятся
+            в номера рядов таблицы через hit_row()
+        """
+
+        hits = (row for row in range(self.rowCount()) if any(text in value for value in self.row_values(row)))
+        return list(islice(hits, SEARCH_LIMIT))
+
+    def hit_row(self, hit) -> int | None:
+        """
+        :return: Номер ряда таблицы или None, если ряда больше нет
+        """
+
+        return int(hit) if hit < self.rowCount() else None
+
+
+class ColumnStoreModel(ListTableModel):
+    """
+    Модель таблицы, которая хранит данные по столбцам (ColumnStore): числа - в типизированных
+    массивах, строки - словарём. Используется для csv файлов, которые нельзя открыть через
+    CsvIndex, и для создаваемых таблиц.
+    Сортировка и фильтры не переставляют данные: модель хранит перестановку номеров рядов.
+
+    Атрибуты
+    ------
+    store : ColumnStore
+        Данные таблицы.
+    order : np.ndarray | None
+        Номера рядов store в том порядке, в котором они показываются.
+        None, пока нет ни сортировки, ни фильтров.
+
+    Методы
+    ------
+    stored() :
+        Переводит номер ряда таблицы в номер ряда store.
+    set_store() :
+        Заменяет данные таблицы готовым ColumnStore.
+    """
+
+    sortable = True
+
+    def __init__(self, titles: list[str], rows: list[list] = None, parent=None):
+        super().__init__(titles, [], parent)
+        self.store = ColumnStore(titles, rows or [])
+        self.order = None
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return self.store.size if self.order is None else len(self.order)
+
+    def stored(self, row: int) -> int:
+        return row if self.order is None else int(self.order[row])
+
+    def value(self, row: int, col: int) -> str:
+        return self.store.value(self.stored(row), col)
+
+    def set_value(self, row: int, col: int, value: str):
+        self.store.set_value(self.stored(row), col, value)
+
+    def row_values(self, row: int) -> list[str]:
+        return self.store.row_values(self.stored(row))
+
+    def column_values(self, col: int) -> list[str]:
+        return self.store.columns[col].values()
+
+    def typed_column(self, col: int) -> Column:
+        return self.store.columns[col]
+
+    def set_titles(self, titles: list[str]):
+        self.beginResetModel()
+        self.titles = list(titles)
+        self.store.set_titles(titles)
+        # Столбцы сменились - сортировка и фильтры сбрасываются
+        self.sort_column = -1
+        self.filters = dict()
+        self.order = None
+        self.endResetModel()
+
+    def set_store(self, store: ColumnStore):
+        """
+        Данные, прочитанные в другом процессе (см. parse_csv_file()), подключаются без копирования
+        """
+
+        self.beginResetModel()
+        self.titles = list(store.titles)
+        self.store = store
+        self.sort_column = -1
+        self.filters = dict()
+        self.order = None
+        self.endResetModel()
+
+    def append_rows(self, rows: list[list]):
+        if not rows:
+            return
+        # Новые ряды показываются в конце таблицы, даже если она отсортирована или отфильтрована
+        first = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        size = self.store.size
+        self.store.append_rows(rows)
+        if self.order is not None:
+            self.order = np.concatenate([self.order, np.arange(size, self.store.size, dtype=np.int64)])
+        self.endInsertRows()
+
+    def append_row(self) -> int:
+        row = self.rowCount()
+        self.append_rows([[]])
+        return row
+
+    def insert_column(self, title: str):
+        col = len(self.titles)
+        self.beginInsertColumns(QModelIndex(), col, col)
+        self.titles.append(title)
+        self.store.insert_column(title)
+        self.endInsertColumns()
+
+    def drop_stored(self, rows: list[int]):
+        """
+        Удаляет ряды store и сдвигает номера оставшихся рядов в order
+        """
+
+        self.store.remove_rows(rows)
+        if self.order is not None:
+            removed = np.unique(np.array(rows, dtype=np.int64))
+            order = self.order[~np.isin(self.order, removed)]
+            self.order = order - np.searchsorted(removed, order)
+
+    def remove_row(self, row: int):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.drop_stored([self.stored(row)])
+        self.endRemoveRows()
+
+    def remove_rows(self, rows: list[int]):
+        self.beginResetModel()
+        self.drop_stored([self.stored(row) for row in rows])
+        self.endResetModel()
+
+    def total_row_count(self) -> int:
+        return self.store.size
+
+    def stored_rows(self):
+        return (self.store.row_values(row) for row in range(self.store.size))
+
+    def refresh_view(self):
+        """
+        Фильтры проверяются по столбцам целиком, сортировка - по местам значений (Column.ranks()),
+        после чего меняется только перестановка order. Представление при этом не пересоздаётся
+        """
+
+        self.beginResetModel()
+        self.order = view_order(None, self.store.size, self.typed_column, self.sort_column,
+                                self.sort_order == Qt.DescendingOrder, self.filters)
+        self.endResetModel()
+
+    def search(self, text: str) -> np.ndarray:
+        """
+        Каждый столбец ищет подстроку в словаре своих значений (Column.search()), а не по ячейкам
+        :return: Номера найденных рядов таблицы по возрастанию (не больше SEARCH_LIMIT)
+        """
+
+        found = np.zeros(self.store.size, dtype=bool)
+        if text:
+            for column in self.store.columns:
+                found |= column.search(text)
+        return np.flatnonzero(found if self.order is None else found[self.order])[:SEARCH_LIMIT]
+
+
+class SQLiteTableModel(ListTableModel):
+    """
+    Модель таблицы БД, которая подгружает ряды порциями по FETCH_BATCH штук
+    только тогда, когда их нужно показать (canFetchMore/fetchMore).
+    Порции выбираются по rowid (keyset pagination), поэтому каждая следующая порция
+    достаётся по индексу, а не перебором всех предыдущих рядов, как при OFFSET.
+    Пока модель не активирована (вкладку ещё не открывали), из БД не читается ни одного ряда,
+    известны только схема таблицы и примерное количество рядов.
+    Сортировка и фильтры переводятся в ORDER BY и WHERE с параметрами, и ряды снова подгружаются
+    порциями по мере прокрутки.
+
+    Атрибуты
+    ------
+    con : sqlite3.Connection
+        Соединение с базой данных.
+    table : str
+        Название таблицы.
+    types : list
+        Объявленные типы столбцов.
+    active : bool
+        True, если модель уже активирована и подгружает ряды.
+    pk : list
+        Названия столбцов объявленного первичного ключа.
+    with_rowid : bool
+        False для таблиц WITHOUT ROWID. Определяется один раз по тексту CREATE TABLE.
+    rowids : list
+        Ключ каждого загруженного ряда: rowid, а для таблиц WITHOUT ROWID - кортеж значений
+        первичного ключа. PendingRowid, если INSERT ряда ещё стоит в очереди записи.
+        None, если ряд добавлен, но ещё не заполнен.
+    fetched : int
+        Количество рядов, загруженных из БД.
+        Ряды, добавленные пользователем, всегда идут после них.
+    inserted : set
+        rowid рядов, записанных в БД из программы. Они уже есть в модели,
+        поэтому при подгрузке следующих порций пропускаются.
+    exhausted : bool
+        True, если из БД загружены все ряды.
+    phase : int
+        При сортировке ряды с пустым значением столбца выбираются отдельно от остальных:
+        0 - первая часть рядов, 1 - вторая.
+    last_rowid : int | None
+        rowid последнего загруженного ряда, от которого ищется следующая порция.
+    last_value
+        Значение столбца сортировки в последнем загруженном ряду.
+    search_table : str | None
+        Полнотекстовый индекс таблицы во временной БД поиска (см. SearchDatabase), None - индекса ещё нет.
+
+    Методы
+    ------
+    activate() :
+        Разрешает подгрузку рядов и достаёт первую порцию.
+    fetch_rows() :
+        Подгружает следующую порцию рядов заданного размера.
+    estimated_row_count() :
+        Примерное количество рядов без полного прохода по таблице.
+    schema_label() :
+        Краткое описание схемы таблицы.
+    fetch_page() :
+        Достаёт из БД следующую порцию рядов.
+    page_query() :
+        Запрос следующей порции рядов с учётом фильтров и сортировки.
+    filter_conditions() :
+        Условия WHERE для фильтров столбцов.
+    view_plan() :
+        План запроса первой порции рядов.
+    index_columns() :
+        Столбцы, индекс по которым ускорил бы текущие фильтры и сортировку.
+    is_new_row() :
+        Проверяет, был ли ряд добавлен пользователем и ещё не записан в БД.
+    mark_inserted() :
+        Запоминает ключ ряда, который был поставлен в очередь на запись в БД.
+    insert_done() :
+        Вызывается после того, как INSERT ряда был выполнен.
+    key_condition() :
+        Условие WHERE, по которому ряд находится в БД по ключу.
+    update_key() :
+        Обновляет ключ ряда после изменения ячейки.
+    delete_statements() :
+        Запросы DELETE, удаляющие из БД сразу много рядов.
+    """
+
+    def __init__(self, con: sqlite3.Connection, table: str, parent=None):
+        self.con = con
+        self.table = table
+        info = con.execute(f'PRAGMA table_info({quote_name(table)})').fetchall()
+        super().__init__([x[1] for x in info], [], parent)
+        self.types = [x[2] for x in info]
+        self.pk = [x[1] for x in sorted(info, key=lambda x: x[5]) if x[5]]
+        self.active = False
+        self.rowids = list()
+        self.fetched = 0
+        self.inserted = set()
+        self.exhausted = False
+        sql = con.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        sql = sql[0] if sql and sql[0] else ''
+        self.with_rowid = not WITHOUT_ROWID.search(sql[sql.rfind(')') + 1:])
+        self.phase = 0
+        self.last_rowid = None
+        self.last_value = None
+        self.search_table = None
+        self.estimate = None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.ToolTipRole and orientation == Qt.Horizontal and section < len(self.types):
+            return self.types[section]
+        return super().headerData(section, orientation, role)
+
+    sortable = True
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self.active and not self.exhausted
+
+    def activate(self):
+        self.active = True
+        self.fetchMore()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self.fetch_rows(FETCH_BATCH)
+
+    def fetch_rows(self, limit: int):
+        page = self.fetch_page(limit)
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), self.fetched, self.fetched + len(page) - 1)
+        self.rows[self.fetched:self.fetched] = [list(x[1:]) for x in page]
+        self.rowids[self.fetched:self.fetched] = [x[0] for x in page]
+        self.fetched += len(page)
+        self.endInsertRows()
+
+    def fetch_page(self, limit: int = FETCH_BATCH) -> list[tuple]:
+        """
+        Достаёт следующую порцию рядов вида (rowid, *значения).
+        У таблиц WITHOUT ROWID вместо rowid - значения первичного ключа
+        """
+
+        page = []
+        while not page and not self.exhausted:
+            page = self.con.execute(*self.page_query(limit)).fetchall()
+            raw_count = len(page)
+            if self.with_rowid:
+                if page:
+                    self.last_rowid = page[-1][0]
+                    if self.sort_column >= 0:
+                        self.last_value = page[-1][self.sort_column + 1]
+                page = [x for x in page if x[0] not in self.inserted]
+            else:
+                page = [(self.pk_values(x),) + x for x in page]
+            if raw_count < limit:
+                if self.with_rowid and self.sort_column >= 0 and self.phase == 0:
+                    self.phase, self.last_rowid, self.last_value = 1, None, None
+                else:
+                    self.exhausted = True
+        return page
+
+    def filter_conditions(self) -> tuple[list[str], list]:
+        """
+        :return: Условия и их параметры
+        """
+
+        conditions, params = [], []
+        for col, row_filter in sorted(self.filters.items()):
+            condition, values = row_filter.sql(quote_name(self.titles[col]))
+            conditions.append(condition)
+            params += values
+        return conditions, params
+
+    def page_query(self, limit: int = FETCH_BATCH) -> tuple[str, list]:
+        """
+        Порции выбираются по ключу последнего загруженного ряда (keyset pagination): без сортировки -
+        по rowid, с сортировкой - по паре (значение столбца, rowid). Поэтому следующая порция
+        находится по индексу, если он есть, а не перебором всех предыдущих рядов, как при OFFSET.
+        Пустые значения не находятся сравнением, поэтому ряды с ними выбираются отдельной фазой:
+        при сортировке по возрастанию - до остальных, по убыванию - после (так их сортирует SQLite).
+        Таблицы WITHOUT ROWID листаются через OFFSET
+        :return: Текст запроса и параметры
+        """
+
+        conditions, params = self.filter_conditions()
+        descending = self.sort_column >= 0 and self.sort_order == Qt.DescendingOrder
+        sign, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+        column = quote_name(self.titles[self.sort_column]) if self.sort_column >= 0 else None
+        if not self.with_rowid:
+            order = f' ORDER BY {column} {direction}' if column else ''
+            where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+            return (f'SELECT * FROM {quote_name(self.table)}{where}{order} LIMIT ? OFFSET ?',
+                    params + [limit, self.fetched])
+        if column is None or (self.phase == 0) != descending:
+            # Без сортировки или фаза рядов с пустым значением столбца
+            if column is not None:
+                conditions.append(f'{column} IS NULL')
+            if self.last_rowid is not None:
+                conditions.append(f'rowid {sign} ?')
+                params.append(self.last_rowid)
+            order = f'rowid {direction}'
+        else:
+            conditions.append(f'{column} IS NOT NULL')
+            if self.last_rowid is not None:
+                conditions.append(f'({column}, rowid) {sign} (?, ?)')
+                params += [self.last_value, self.last_rowid]
+            order = f'{column} {direction}, rowid {direction}'
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return f'SELECT rowid, * FROM {quote_name(self.table)}{where} ORDER BY {order} LIMIT ?', params + [limit]
+
+    def refresh_view(self):
+        """
+        Ряды подгружаются заново с первой порции. Добавленные пользователем ряды,
+        которые ещё не записаны в БД, остаются в конце таблицы
+        """
+
+        self.beginResetModel()
+        pending = [row for row in range(self.fetched, len(self.rows)) if self.rowids[row] is None or
+                   isinstance(self.rowids[row], PendingRowid) and self.rowids[row].rowid is None]
+        self.rows = [self.rows[row] for row in pending]
+        self.rowids = [self.rowids[row] for row in pending]
+        self.fetched = 0
+        self.inserted = set()
+        self.exhausted = False
+        self.phase = 0
+        self.last_rowid = None
+        self.last_value = None
+        self.endResetModel()
+        if self.active:
+            self.fetchMore()
+
+    def view_plan(self) -> list[str]:
+        """
+        Шаги плана (EXPLAIN QUERY PLAN) запроса первой порции рядов с текущими фильтрами и сортировкой
+        """
+
+        phase, last_rowid, last_value = self.phase, self.last_rowid, self.last_value
+        self.phase, self.last_rowid, self.last_value = 0, None, None
+        try:
+            sql, params = self.page_query()
+        finally:
+            self.phase, self.last_rowid, self.last_value = phase, last_rowid, last_value
+        return [str(x[-1]) for x in self.con.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+    def index_columns(self) -> list[str]:
+        """
+        Столбцы для индекса под текущие фильтры и сортировку: сначала столбцы фильтров на равенство,
+        затем столбец сортировки или (без сортировки) первый столбец фильтра-диапазона.
+        Поиск подстроки индекс не ускоряет, поэтому такие фильтры не учитываются
+        """
+
+        columns = [self.titles[col] for col, x in sorted(self.filters.items()) if x.op == '=']
+        if self.sort_column >= 0:
+            last = [self.titles[self.sort_column]]
+        else:
+            last = [self.titles[col] for col, x in sorted(self.filters.items()) if x.uses_index() and x.op != '=']
+        for title in last[:1]:
+            if title not in columns:
+                columns.append(title)
+        return columns
+
+    def search(self, text: str) -> list:
+        """
+        С готовым полнотекстовым индексом (search_table) ряды находятся через MATCH по индексу,
+        без него или для подстроки короче FTS_MIN_LENGTH символов - просмотром таблицы через instr().
+        Фильтры учитываются, а найденные ряды упорядочиваются так же, как показываются в таблице.
+        Ряды, ещё не записанные в БД, не ищутся
+        :return: Ключи найденных рядов: rowid, для таблиц WITHOUT ROWID - значения первичного ключа
+        """
+
+        if not text or not self.titles:
+            return []
+        conditions, params = self.filter_conditions()
+        if self.search_table is not None and self.with_rowid and len(text) >= FTS_MIN_LENGTH:
+            name = self.search_table.split('.')[-1]
+            conditions.append(f'rowid IN (SELECT rowid FROM {self.search_table} WHERE {name} MATCH ?)')
+            params.append(fts_phrase(text))
+        else:
+            conditions.append('(' + ' OR '.join(f'instr(CAST({quote_name(title)} AS TEXT), ?) > 0'
+                                                for title in self.titles) + ')')
+            params += [text] * len(self.titles)
+        column = quote_name(self.titles[self.sort_column]) if self.sort_column >= 0 else None
+        direction = 'DESC' if self.sort_order == Qt.DescendingOrder else 'ASC'
+        if self.with_rowid:
+            key = 'rowid'
+            order = f' ORDER BY {column} {direction}, rowid {direction}' if column else ' ORDER BY rowid'
+        else:
+            key = ', '.join(map(quote_name, self.pk))
+            order = f' ORDER BY {column} {direction}' if column else ''
+        rows = self.con.execute(f'SELECT {key} FROM {quote_name(self.table)} WHERE {" AND ".join(conditions)}'
+                                f'{order} LIMIT ?', params + [SEARCH_LIMIT]).fetchall()
+        return [x[0] for x in rows] if self.with_rowid else [tuple(x) for x in rows]
+
+    def hit_row(self, hit) -> int | None:
+        """
+        Если ряд ещё не загружен, порции по SEEK_BATCH рядов подгружаются, пока он не появится
+        """
+
+        for row, key in enumerate(self.rowids):
+            if (key.rowid if isinstance(key, PendingRowid) else key) == hit:
+                return row
+        while self.canFetchMore():
+            first = self.fetched
+            self.fetch_rows(SEEK_BATCH)
+            for row in range(first, self.fetched):
+                if self.rowids[row] == hit:
+                    return row
+        return None
+
+    def pk_values(self, values) -> tuple:
+        return tuple(values[self.titles.index(col)] for col in self.pk)
+
+    def is_new_row(self, row: int) -> bool:
+        """
+        Ряд, INSERT которого не удался, тоже считается новым: следующее изменение добавит его заново
+        """
+
+        key = self.rowids[row]
+        return row >= self.fetched and (key is None or isinstance(key, PendingRowid) and key.failed)
+
+    def mark_inserted(self, row: int, key: PendingRowid):
+        self.rowids[row] = key if self.with_rowid else self.pk_values(self.rows[row])
+        if self.estimate is not None:
+            self.estimate += 1
+
+    def insert_done(self, key: PendingRowid, cursor: sqlite3.Cursor):
+        key.rowid = cursor.lastrowid
+        self.inserted.add(key.rowid)
+
+    def key_condition(self, row: int) -> tuple[str, list]:
+        """
+        :return: Текст условия для WHERE и его параметры
+        """
+
+        key = self.rowids[row]
+        if isinstance(key, tuple):
+            return ' AND '.join(f'{quote_name(col)} = ?' for col in self.pk), list(key)
+        return 'rowid = ?', [key]
+
+    def update_key(self, row: int, col: int):
+        """
+        Если изменённый столбец входит в ключ ряда, ключ нужно обновить,
+        иначе следующие изменения этого ряда не найдут его в БД
+        """
+
+        if self.titles[col] not in self.pk:
+            return
+        if not self.with_rowid:
+            self.rowids[row] = self.pk_values(self.rows[row])
+        elif len(self.pk) == 1 and self.types[col].upper() == 'INTEGER':
+            # Столбец INTEGER PRIMARY KEY - это и есть rowid
+            try:
+                self.rowids[row] = int(self.rows[row][col])
+            except ValueError:
+                return
+            self.inserted.add(self.rowids[row])
+
+    def append_row(self) -> int:
+        self.rowids.append(None)
+        return super().append_row()
+
+    def remove_row(self, row: int):
+        if row < self.fetched:
+            self.fetched -= 1
+        if not self.is_new_row(row) and self.estimate is not None:
+            self.estimate -= 1
+        del self.rowids[row]
+        super().remove_row(row)
+
+    def remove_rows(self, rows: list[int]):
+        rows = set(rows)
+        if self.estimate is not None:
+            self.estimate -= sum(1 for row in rows if not self.is_new_row(row))
+        self.fetched -= sum(1 for row in rows if row < self.fetched)
+        self.rowids = without_rows(self.rowids, rows)
+        super().remove_rows(rows)
+
+    def delete_statements(self, rows: list[int]) -> list[tuple[str, list]]:
+        """
+        DELETE ... WHERE rowid IN (...) по ключам рядов (для таблиц WITHOUT ROWID - по значениям
+        первичного ключа). Ключи разбиваются на части, чтобы не превысить ограничение SQLite
+        на количество параметров запроса. Ряды, ещё не записанные в БД, пропускаются
+        :return: Пары (текст запроса, параметры)
+        """
+
+        keys = [self.rowids[row] for row in rows if not self.is_new_row(row)]
+        if not keys:
+            return []
+        if self.with_rowid:
+            column, width, placeholder = 'rowid', 1, '?'
+        else:
+            column = '(' + ', '.join(quote_name(col) for col in self.pk) + ')'
+            width = len(self.pk)
+            placeholder = '(' + ', '.join(['?'] * width) + ')'
+        chunk = max(self.con.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER) // width, 1)
+        statements = []
+        for i in range(0, len(keys), chunk):
+            part = keys[i:i + chunk]
+            params = part if self.with_rowid else [x for key in part for x in key]
+            values = ', '.join([placeholder] * len(part))
+            if not self.with_rowid:
+                values = 'VALUES ' + values
+            statements.append((f'DELETE FROM {quote_name(self.table)} WHERE {column} IN ({values})', params))
+        return statements
+
+    def column_values(self, col: int) -> list[str]:
+        """
+        Достаёт весь столбец одним запросом, не загружая ряды в модель
+        """
+
+        order = 'ORDER BY rowid' if self.with_rowid else ''
+        values = [str(x[0]) for x in self.con.execute(f'SELECT {quote_name(self.titles[col])} '
+                                                        f'FROM {quote_name(self.table)} {order}')]
+        return values + [self.value(row, col) for row in range(self.fetched, len(self.rows))
+                         if self.rowids[row] is None]
+
+    def estimated_row_count(self) -> int | None:
+        """
+        Примерное количество рядов (см. estimated_rows()). Запоминается и дальше меняется
+        вместе с добавлением и удалением рядов
+        """
+
+        if self.estimate is None:
+            self.estimate = estimated_rows(self.con, self.table)
+        return self.estimate
+
+    def total_row_count(self) -> int:
+        """
+        Количество рядов без подсчёта через Count(*): точное, если таблица загружена целиком,
+        иначе примерное. С фильтрами - сколько рядов уже загружено
+        """
+
+        pending = sum(1 for row in range(self.fetched, len(self.rows)) if self.rowids[row] is None)
+        if self.exhausted and self.active or self.filters:
+            return len(self.rows)
+        return max(self.estimated_row_count() or 0, self.fetched) + pending
+
+    def row_count_label(self) -> str:
+        if self.exhausted and self.active:
+            return str(self.total_row_count())
+        if self.filters:
+            return f'{self.total_row_count()}+'
+        return f'~{self.total_row_count()}' if self.estimated_row_count() is not None else '?'
+
+    def schema_label(self) -> str:
+        columns = ', '.join(f'{title} {type_}'.strip() for title, type_ in zip(self.titles, self.types))
+        return f'{self.table}({columns}) | Рядов: {self.row_count_label()}'
+
+
+class CsvIndexModel(ListTableModel):
+    """
+    Модель csv файла, открытого через CsvIndex.
+    Ряды файла не хранятся в памяти: модель знает только их номера и читает их из индекса,
+    когда представление запрашивает видимые ячейки.
+    Изменения пользователя хранятся поверх файла.
+    Сортировка и фильтры меняют только перестановку номеров рядов файла (order).
+
+    Атрибуты
+    ------
+    csv_index : CsvIndex
+        Индекс открытого файла.
+    known : int
+        Количество проиндексированных рядов, уже показанных в таблице.
+    kept : array | None
+        Номера оставшихся рядов файла по возрастанию.
+        None, пока ряды идут подряд (ни один не был удалён).
+    order : np.ndarray | None
+        Номера рядов файла в том порядке, в котором они показываются после сортировки и фильтров.
+        None, пока нет ни сортировки, ни фильтров (показываются ряды kept).
+    edits : dict
+        Изменённые ряды файла: номер ряда файла -> значения.
+    added : list
+        Ряды, добавленные пользователем. Показываются после рядов файла.
+    columns : dict
+        Прочитанные для сортировки и фильтров столбцы: номер столбца -> Column по всем рядам файла.
+
+    Методы
+    ------
+    rows_indexed() :
+        Показывает в таблице новые ряды, найденные индексатором.
+    locate() :
+        Переводит номер ряда таблицы в номер ряда файла или добавленного ряда.
+    file_column() :
+        Столбец по всем рядам файла с учётом изменений.
+    typed_column() :
+        Столбец по оставшимся и добавленным рядам (для графиков).
+    file_runs() :
+        Разбивает ряды таблицы на неизменённые участки файла и изменённые ряды.
+    write_csv() :
+        Записывает таблицу, копируя неизменённые ряды из исходного файла как есть.
+    """
+
+    sortable = True
+
+    def __init__(self, index: CsvIndex, parent=None):
+        super().__init__(index.titles, [], parent)
+        self.csv_index = index
+        self.known = 0
+        self.kept = None
+        self.order = None
+        self.edits = dict()
+        self.added = list()
+        self.columns = dict()
+
+    def file_row_count(self) -> int:
+        """
+        Количество видимых рядов файла
+        """
+
+        if self.order is not None:
+            return len(self.order)
+        return self.known if self.kept is None else len(self.kept)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return self.file_row_count() + len(self.added)
+
+    def rows_indexed(self, count: int):
+        if count <= self.known:
+            return
+        first = self.file_row_count()
+        self.beginInsertRows(QModelIndex(), first, first + count - self.known - 1)
+        if self.kept is not None:
+            self.kept.extend(range(self.known, count))
+        if self.order is not None:
+            self.order = np.concatenate([self.order, np.arange(self.known, count, dtype=np.int64)])
+        self.known = count
+        self.columns = dict()
+        self.endInsertRows()
+
+    def locate(self, row: int) -> tuple[int | None, int | None]:
+        """
+        :return: (номер ряда файла, None) или (None, номер добавленного ряда)
+        """
+
+        file_rows = self.file_row_count()
+        if row >= file_rows:
+            return None, row - file_rows
+        if self.order is not None:
+            return int(self.order[row]), None
+        return (row if self.kept is None else self.kept[row]), None
+
+    def row_list(self, row: int) -> list:
+        file_row, added_row = self.locate(row)
+        if file_row is None:
+            return self.added[added_row]
+        vals = self.edits.get(file_row)
+        return vals if vals is not None else self.csv_index.row(file_row)
+
+    def value(self, row: int, col: int) -> str:
+        vals = self.row_list(row)
+        return vals[col] if col < len(vals) else ''
+
+    def set_value(self, row: int, col: int, value: str):
+        file_row, added_row = self.locate(row)
+        if file_row is None:
+            vals = self.added[added_row]
+        else:
+            vals = self.edits.setdefault(file_row, list(self.csv_index.row(file_row)))
+            if col in self.columns:
+                self.columns[col].set(file_row, value)
+        if col >= len(vals):
+            vals.extend([''] * (col + 1 - len(vals)))
+        vals[col] = value
+
+    def padded(self, vals: list) -> list[str]:
+        """
+        Значения ряда, дополненные пустыми ячейками до количества столбцов
+        """
+
+        return [vals[col] if col < len(vals) else '' for col in range(len(self.titles))]
+
+    def row_values(self, row: int) -> list[str]:
+        return self.padded(self.row_list(row))
+
+    def column_values(self, col: int) -> list[str]:
+        return [vals[col] for vals in self.stored_rows()]
+
+    def append_row(self) -> int:
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.added.append([''] * len(self.titles))
+        self.endInsertRows()
+        return row
+
+    def drop_file_rows(self, file_rows: list[int]):
+        """
+        Убирает ряды файла из kept и order
+        """
+
+        if self.kept is None:
+            self.kept = array('Q', range(self.known))
+        for file_row in file_rows:
+            self.edits.pop(file_row, None)
+        positions = [bisect_left(self.kept, file_row) for file_row in file_rows]
+        self.kept = without_rows(self.kept, positions)
+        if self.order is not None:
+            self.order = self.order[~np.isin(self.order, np.array(file_rows, dtype=np.int64))]
+
+    def remove_row(self, row: int):
+        file_row, added_row = self.locate(row)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        if file_row is None:
+            del self.added[added_row]
+        else:
+            self.drop_file_rows([file_row])
+        self.endRemoveRows()
+
+    def remove_rows(self, rows: list[int]):
+        file_rows = self.file_row_count()
+        self.beginResetModel()
+        dropped = [self.locate(row)[0] for row in rows if row < file_rows]
+        self.added = without_rows(self.added, [row - file_rows for row in rows if row >= file_rows])
+        if dropped:
+            self.drop_file_rows(dropped)
+        self.endResetModel()
+
+    def total_row_count(self) -> int:
+        return (self.known if self.kept is None else len(self.kept)) + len(self.added)
+
+    def stored_rows(self):
+        for first, last in self.file_runs():
+            if last is None:
+                yield self.padded(self.edits[first])
+            else:
+                yield from (self.padded(self.csv_index.row(i)) for i in range(first, last))
+        yield from map(self.padded, self.added)
+
+    def file_column(self, col: int) -> Column:
+        """
+        Столбец по всем проиндексированным рядам файла (в том числе удалённым) с учётом изменений.
+        Читается из файла один раз, потом меняется вместе с ячейками
+        """
+
+        column = self.columns.get(col)
+        if column is None:
+            values = self.csv_index.column(col, self.known)
+            for file_row, vals in self.edits.items():
+                if file_row < self.known:
+                    values[file_row] = vals[col] if col < len(vals) else ''
+            column = self.columns[col] = Column(values)
+        return column
+
+    def typed_column(self, col: int) -> Column:
+        """
+        Строится из file_column(), который читается из файла блоками, а не разбором каждого ряда:
+        из его копии убираются удалённые ряды и дописываются добавленные
+        """
+
+        column = self.file_column(col)
+        if self.kept is None and not self.added:
+            return column
+        column = column.copy()
+        if self.kept is not None:
+            kept = np.array(self.kept, dtype=np.int64)
+            column.remove(np.setdiff1d(np.arange(self.known, dtype=np.int64), kept).tolist())
+        column.extend(self.padded(vals)[col] for vals in self.added)
+        return column
+
+    def refresh_view(self):
+        """
+        Столбцы для сортировки и фильтров читаются из файла целиком один раз, дальше
+        каждая сортировка - это только новая перестановка номеров рядов
+        """
+
+        self.beginResetModel()
+        kept = None if self.kept is None else np.array(self.kept, dtype=np.int64)
+        self.order = view_order(kept, self.known, self.file_column, self.sort_column,
+                                self.sort_order == Qt.DescendingOrder, self.filters)
+        self.endResetModel()
+
+    def search(self, text: str) -> np.ndarray:
+        """
+        Неизменённые ряды ищутся прямо в байтах файла по индексу триграмм (CsvIndex.search()),
+        изменённые и добавленные - по их текущим значениям
+        :return: Номера найденных рядов таблицы по возрастанию (не больше SEARCH_LIMIT)
+        """
+
+        if not text:
+            return np.zeros(0, dtype=np.int64)
+        file_rows = self.csv_index.search(text, SEARCH_LIMIT)
+        if self.edits:
+            edited = np.fromiter(self.edits, dtype=np.int64, count=len(self.edits))
+            changed = [file_row for file_row, vals in self.edits.items() if any(text in value for value in vals)]
+            file_rows = np.union1d(file_rows[~np.isin(file_rows, edited)], np.array(changed, dtype=np.int64))
+        file_rows = file_rows[file_rows < self.known]
+        if self.order is not None:
+            rows = np.flatnonzero(np.isin(self.order, file_rows))
+        elif self.kept is not None:
+            # Удалённые ряды файла в kept не найдутся
+            kept = np.array(self.kept, dtype=np.int64)
+            positions = np.searchsorted(kept, file_rows)
+            present = positions < len(kept)
+            present[present] = kept[positions[present]] == file_rows[present]
+            rows = positions[present]
+        else:
+            rows = file_rows
+        added = [self.file_row_count() + i for i, vals in enumerate(self.added) if any(text in value for value in vals)]
+        return np.concatenate([rows, np.array(added, dtype=np.int64)])[:SEARCH_LIMIT]
+
+    def file_runs(self):
+        """
+        Генератор по оставшимся рядам файла в порядке файла (сортировка и фильтры не учитываются):
+        отдаёт (первый, последний + 1) для участков идущих подряд неизменённых рядов
+        и (номер ряда файла, None) для изменённых рядов
+        """
+
+        if self.kept is None:
+            # Ряды идут подряд, поэтому достаточно пройти только по изменённым
+            start = 0
+            for file_row in sorted(x for x in self.edits if x < self.known):
+                if file_row > start:
+                    yield start, file_row
+                yield file_row, None
+                start = file_row + 1
+            if start < self.known:
+                yield start, self.known
+            return
+        first = last = None
+        for file_row in self.kept:
+            if file_row in self.edits:
+                if first is not None:
+                    yield first, last
+                    first = None
+                yield file_row, None
+            elif first is not None and file_row == last:
+                last += 1
+            else:
+                if first is not None:
+                    yield first, last
+                first, last = file_row, file_row + 1
+        if first is not None:
+            yield first, last
+
+    def write_csv(self, f, encoding: str, delimiter: str):
+        """
+        Неизменённые ряды копируются из исходного файла байт в байт, заново записываются
+        только изменённые и добавленные ряды. Если изменились столбцы, кодировка или
+        разделитель, файл записывается целиком
+        """
+
+        index = self.csv_index
+        raw = self.titles == index.titles and delimiter == index.delimiter and \
+            codecs.lookup(encoding).name == codecs.lookup(index.encoding).name
+        if not raw:
+            super().write_csv(f, encoding, delimiter)
+            return
+        index.copy_bytes(f, 0, index.data_start)
+        # Запись в text сразу передаётся в f, поэтому её можно чередовать с копированием байт.
+        # text создаётся после заголовка, чтобы кодировка utf-8-sig не дописала BOM ещё раз
+        text = io.TextIOWrapper(f, encoding=index.encoding, newline='', write_through=True)
+        writer = csv.writer(text, delimiter=delimiter, lineterminator=index.line_terminator())
+        for first, last in self.file_runs():
+            if last is None:
+                writer.writerow(self.padded(self.edits[first]))
+            else:
+                index.copy_rows(f, first, last)
+        writer.writerows(map(self.padded, self.added))
+        text.detach()
+
+
+class QueryResultModel(ListTableModel):
+    """
+    Результат SQL запроса (только для чтения).
+    Ряды приходят из QueryWorker порциями: следующая порция запрашивается,
+    только когда представление долистало до конца уже полученных рядов.
+
+    Атрибуты
+    ------
+    worker : QueryWorker
+        Поток, выполняющий запрос.
+    waiting : bool
+        True, пока запрошенная порция не пришла.
+    exhausted : bool
+        True, если результат получен целиком.
+
+    Методы
+    ------
+    rows_fetched() :
+        Добавляет пришедшую порцию рядов.
+    finish() :
+        Отмечает, что рядов больше не будет.
+    """
+
+    def __init__(self, worker, parent=None):
+        super().__init__([], [], parent)
+        self.worker = worker
+        self.waiting = True
+        self.exhausted = False
+        worker.columns_ready.connect(self.set_titles)
+        worker.rows_ready.connect(self.rows_fetched)
+        worker.exhausted.connect(self.finish)
+        worker.finished.connect(self.finish)
+
+    def flags(self, index):
+        return super().flags(index) & ~Qt.ItemIsEditable
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and not self.waiting and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self.waiting = True
+            self.worker.request_more()
+
+    def rows_fetched(self, rows: list[list]):
+        self.waiting = False
+        self.append_rows(rows)
+
+    def finish(self):
+        self.waiting = False
+        self.exhausted = True
+
+    def row_count_label(self) -> str:
+        return str(len(self.rows)) if self.exhausted else f'{len(self.rows)}+'
+
+
+class HistoryModel(ListTableModel):
+    """
+    История SQL запросов (только для чтения).
+    Ряды хранят исходные значения, поэтому сортировка по времени и количеству рядов - числовая.
+
+    Методы
+    ------
+    sort() :
+        Сортирует историю по столбцу (вызывается представлением при щелчке по заголовку).
+    sql() :
+        Возвращает текст запроса из ряда.
+    """
+
+    # Номера столбцов в QueryHistory.COLUMNS
+    SQL_COL, ELAPSED_COL, FULL_SCAN_COL = 1, 2, 5
+
+    def flags(self, index):
+        return super().flags(index) & ~Qt.ItemIsEditable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role == Qt.BackgroundRole and self.rows[index.row()][self.FULL_SCAN_COL]:
+            return QBrush(FULL_SCAN_COLOR)
+        if index.isValid() and role == Qt.ToolTipRole and index.column() == self.SQL_COL:
+            return self.sql(index.row())
+        return super().data(index, role)
+
+    def value(self, row: int, col: int) -> str:
+        val = self.rows[row][col]
+        if col == self.ELAPSED_COL:
+            return f'{val:.3f}'
+        if col == self.FULL_SCAN_COL:
+            return 'да' if val else ''
+        if col == self.SQL_COL:
+            return ' '.join(str(val).split())
+        return str(val)
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.rows.sort(key=lambda x: x[column], reverse=order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
+
+    def sql(self, row: int) -> str:
+        return str(self.rows[row][self.SQL_COL])
@@ -0,0 +1,132 @@
+import re
+import numpy as np
+
+# Сколько байт данных покрывает одна битовая карта триграмм
+TRIGRAM_BLOCK = 1 << 16
+
+# Сколько бит в битовой карте блока (хэш триграммы - номер бита)
+TRIGRAM_BITS = 1 << 16
+
+# Сколько блоков за раз обрабатывает TrigramIndex.build()
+TRIGRAM_PIECE = 16
+
+# Больше стольких совпадений поиск не возвращает
+SEARCH_LIMIT = 10000
+
+# Индекс FTS5 с токенизатором trigram находит подстроки не короче трёх символов
+FTS_MIN_LENGTH = 3
+
+
+def trigram_hashes(data: np.ndarray) -> np.ndarray:
+    """
+    :param data: Байты в виде массива uint32
+    :return: Хэш (номер бита в карте блока) каждой триграммы data[i:i + 3]
+    """
+
+    codes = data[:-2] << 16 | data[1:-1] << 8 | data[2:]
+    return (codes * np.uint32(2654435761)) >> np.uint32(16)
+
+
+class TrigramIndex:
+    """
+    Индекс триграмм для поиска подстроки в больших байтовых данных (отображённый в память
+    csv файл, склеенный словарь столбца).
+    Данные делятся на блоки по TRIGRAM_BLOCK байт, и для каждого блока хранится битовая карта
+    встречающихся в нём триграмм (TRIGRAM_BITS бит, 1/8 размера блока). Подстрока ищется
+    только в тех блоках, где есть все её триграммы, остальные пропускаются без чтения.
+    Данные после проиндексированной части просматриваются целиком.
+
+    Атрибуты
+    ------
+    data : bytes | mmap
+        Данные, в которых ищется подстрока.
+    bitmaps : np.ndarray
+        Битовые карты блоков, по строке на блок.
+    size : int
+        Количество проиндексированных байт.
+
+    Методы
+    ------
+    build() :
+        Строит битовые карты. Генератор, отдающий количество проиндексированных байт.
+    ranges() :
+        Участки данных, в которых может начинаться подстрока.
+    positions() :
+        Смещения, с которых начинается подстрока.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.bitmaps = np.zeros((0, TRIGRAM_BITS // 8), dtype=np.uint8)
+        self.size = 0
+
+    def build(self):
+        size = len(self.data)
+        blocks = (size + TRIGRAM_BLOCK - 1) // TRIGRAM_BLOCK
+        bitmaps = np.zeros((blocks, TRIGRAM_BITS // 8), dtype=np.uint8)
+        piece = TRIGRAM_BLOCK * TRIGRAM_PIECE
+        for start in range(0, size, piece):
+            stop = min(start + piece, size)
+            # Последние триграммы участка заходят в следующий, в конце данных дополняем нулями
+            data = np.frombuffer(self.data[start:stop + 2], dtype=np.uint8).astype(np.uint32)
+            if len(data) < stop - start + 2:
+                data = np.concatenate([data, np.zeros(stop - start + 2 - len(data), dtype=np.uint32)])
+            count = (stop - start + TRIGRAM_BLOCK - 1) // TRIGRAM_BLOCK
+            seen = np.zeros(count * TRIGRAM_BITS, dtype=bool)
+            block = np.arange(stop - start, dtype=np.int64) // TRIGRAM_BLOCK
+            seen[block * TRIGRAM_BITS + trigram_hashes(data)] = True
+            first = start // TRIGRAM_BLOCK
+            bitmaps[first:first + count] = np.packbits(seen.reshape(count, TRIGRAM_BITS), axis=1, bitorder='little')
+            yield stop
+        self.bitmaps = bitmaps
+        self.size = size
+
+    def ranges(self, pattern: bytes) -> list[tuple[int, int]]:
+        """
+        Совпадение, начавшееся в блоке, целиком лежит в нём и следующем блоке, поэтому
+        блок подходит, если каждая триграмма подстроки есть в нём или в следующем
+        :return: Пары (начало, конец): подстрока может начинаться в байтах начало:конец
+        """
+
+        size = len(self.data)
+        if len(pattern) < 3 or len(pattern) > TRIGRAM_BLOCK or not self.size:
+            return [(0, size)] if size else []
+        found = np.ones(len(self.bitmaps), dtype=bool)
+        for bit in np.unique(trigram_hashes(np.frombuffer(pattern, dtype=np.uint8).astype(np.uint32))):
+            present = (self.bitmaps[:, bit >> 3] >> (bit & 7) & 1).astype(bool)
+            present[:-1] |= present[1:]
+            found &= present
+        ranges = list()
+        for block in np.flatnonzero(found):
+            start, stop = int(block) * TRIGRAM_BLOCK, min((int(block) + 1) * TRIGRAM_BLOCK, self.size)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        if self.size < size:
+            ranges.append((self.size, size))
+        return ranges
+
+    def positions(self, pattern: bytes, limit: int = None) -> np.ndarray:
+        """
+        :param limit: Сколько первых совпадений искать (None - все)
+        :return: Смещения начала совпадений по возрастанию (int64)
+        """
+
+        regex = re.compile(re.escape(pattern))
+        found = list()
+        for start, stop in self.ranges(pattern):
+            end = min(stop + len(pattern) - 1, len(self.data))
+            found.extend(m.start() for m in regex.finditer(self.data, start, end))
+            if limit is not None and len(found) >= limit:
+                del found[limit:]
+                break
+        return np.array(found, dtype=np.int64)
+
+
+def fts_phrase(text: str) -> str:
+    """
+    Подстрока для MATCH: фраза в двойных кавычках, кавычки внутри удваиваются
+    """
+
+    return '"' + text.replace('"', '""') + '"'
@@ -14,15 +14,42 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
-        MainWindow.resize(502, 477)
+        MainWindow.resize(502, 677)
         self.centralwidget = QtWidgets.QWidget(MainWindow)
         self.centralwidget.setObjectName("centralwidget")
         self.sqlTextEdit = QtWidgets.QPlainTextEdit(self.centralwidget)
-        self.sqlTextEdit.setGeometry(QtCore.QRect(0, 30, 501, 401))
+        self.sqlTextEdit.setGeometry(QtCore.QRect(0, 30, 501, 201))
         self.sqlTextEdit.setObjectName("sqlTextEdit")
+        self.resultTabs = QtWidgets.QTabWidget(self.centralwidget)
+        self.resultTabs.setGeometry(QtCore.QRect(0, 240, 501, 391))
+        self.resultTabs.setObjectName("resultTabs")
+        self.resultTab = QtWidgets.QWidget()
+        self.resultTab.setObjectName("resultTab")
+        self.resultView = QtWidgets.QTableView(self.resultTab)
+        self.resultView.setGeometry(QtCore.QRect(0, 0, 495, 365))
+        self.resultView.setObjectName("resultView")
+        self.resultTabs.addTab(self.resultTab, "")
+        self.planTab = QtWidgets.QWidget()
+        self.planTab.setObjectName("planTab")
+        self.planTree = QtWidgets.QTreeWidget(self.planTab)
+        self.planTree.setGeometry(QtCore.QRect(0, 0, 495, 365))
+        self.planTree.setObjectName("planTree")
+        self.resultTabs.addTab(self.planTab, "")
+        self.historyTab = QtWidgets.QWidget()
+        self.historyTab.setObjectName("historyTab")
+        self.historyView = QtWidgets.QTableView(self.historyTab)
+        self.historyView.setGeometry(QtCore.QRect(0, 0, 495, 365))
+        self.historyView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.historyView.setSortingEnabled(True)
+        self.historyView.setObjectName("historyView")
+        self.resultTabs.addTab(self.historyTab, "")
         self.enterButton = QtWidgets.QPushButton(self.centralwidget)
-        self.enterButton.setGeometry(QtCore.QRect(0, 0, 501, 23))
+        self.enterButton.setGeometry(QtCore.QRect(0, 0, 401, 23))
         self.enterButton.setObjectName("enterButton")
+        self.cancelButton = QtWidgets.QPushButton(self.centralwidget)
+        self.cancelButton.setEnabled(False)
+        self.cancelButton.setGeometry(QtCore.QRect(400, 0, 101, 23))
+        self.cancelButton.setObjectName("cancelButton")
         MainWindow.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(MainWindow)
         self.menubar.setGeometry(QtCore.QRect(0, 0, 502, 21))
@@ -33,9 +60,16 @@ class Ui_MainWindow(object):
         MainWindow.setStatusBar(self.statusbar)
 
         self.retranslateUi(MainWindow)
+        self.resultTabs.setCurrentIndex(0)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
         MainWindow.setWindowTitle(_translate("MainWindow", "SQL Form"))
+        self.resultTabs.setTabText(self.resultTabs.indexOf(self.resultTab), _translate("MainWindow", "Результат"))
+        self.planTree.headerItem().setText(0, _translate("MainWindow", "Шаг"))
+        self.resultTabs.setTabText(self.resultTabs.indexOf(self.planTab), _translate("MainWindow", "План запроса"))
+        self.historyView.setToolTip(_translate("MainWindow", "Двойной щелчок - выполнить запрос ещё раз"))
+        self.resultTabs.setTabText(self.resultTabs.indexOf(self.historyTab), _translate("MainWindow", "История"))
         self.enterButton.setText(_translate("MainWindow", "Ввести"))
+        self.cancelButton.setText(_translate("MainWindow", "Отменить"))
@@ -0,0 +1,635 @@
+import csv
+import multiprocessing
+import os
+import queue
+import sqlite3
+import time
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from csv_import import import_csv
+from csv_index import CsvIndex
+from downsampling import visible_points
+from fts_index import build_fts
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# Сколько рядов csv файла передаётся в таблицу за один раз
+CSV_CHUNK = 5000
+
+# Сколько рядов результата SQL запроса передаётся в окно за один раз
+QUERY_CHUNK = 1000
+
+# Как часто (в секундах) поток с пулом процессов проверяет, не пора ли остановиться
+POOL_POLL_INTERVAL = 0.1
+
+# Через сколько шагов виртуальной машины SQLite вызывается обработчик прогресса запроса
+PROGRESS_STEPS = 10000
+
+# Как часто (в секундах) окно узнаёт о ходе выполнения запроса
+PROGRESS_INTERVAL = 0.1
+
+
+def is_full_scan(detail: str) -> bool:
+    """
+    Проверяет, означает ли шаг плана запроса полный просмотр таблицы
+    (SCAN без индекса, а не SEARCH по индексу)
+    :param detail: Текст шага из EXPLAIN QUERY PLAN
+    """
+
+    detail = str(detail)
+    return detail.startswith('SCAN ') and 'USING' not in detail and 'CONSTANT ROW' not in detail
+
+
+class CsvLoader(QThread):
+    """
+    Поток, который читает csv файл порциями и передаёт их в таблицу по мере чтения,
+    чтобы интерфейс не зависал на больших файлах.
+    Ряды не копируются: каждая порция сразу уходит в модель таблицы.
+
+    Атрибуты
+    ------
+    path : str
+        Путь к csv файлу.
+    delimiter : str
+        Разделитель csv файла.
+    encoding : str
+        Кодировка csv файла.
+    titles_loaded : pyqtSignal
+        Испускается, когда прочитана строка с названиями столбцов.
+    rows_loaded : pyqtSignal
+        Испускается с очередной порцией рядов.
+    progress : pyqtSignal
+        Процент прочитанного файла.
+    failed : pyqtSignal
+        Испускается с текстом ошибки, если файл не удалось дочитать.
+    complete : bool
+        True, если файл был прочитан до конца.
+
+    Методы
+    ------
+    run() :
+        Читает файл. Останавливается, если вызван requestInterruption().
+    """
+
+    titles_loaded = pyqtSignal(list)
+    rows_loaded = pyqtSignal(list)
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path: str, delimiter: str, encoding: str, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.complete = False
+
+    def run(self):
+        size = os.path.getsize(self.path) or 1
+        titles = None
+        chunk = list()
+        try:
+            with open(self.path, 'r', encoding=self.encoding, newline='') as f:
+                for row in csv.reader(f, delimiter=self.delimiter, skipinitialspace=True):
+                    if self.isInterruptionRequested():
+                        # Уже прочитанные ряды (в том числе неполная порция) остаются в таблице
+                        break
+                    if not row:
+                        continue
+                    if titles is None:
+                        titles = row
+                        self.titles_loaded.emit(titles)
+                        continue
+                    chunk.append(row)
+                    if len(chunk) >= CSV_CHUNK:
+                        self.rows_loaded.emit(chunk)
+                        chunk = []
+                        self.progress.emit(int(f.buffer.tell() * 100 / size))
+                else:
+                    self.complete = True
+        except UnicodeError:
+            self.failed.emit('Невозможно прочитать файл в данной кодировке')
+        except csv.Error as e:
+            self.failed.emit(f'Ошибка в csv файле: {e}')
+        if chunk:
+            self.rows_loaded.emit(chunk)
+        self.progress.emit(100)
+
+
+class CsvIndexer(QThread):
+    """
+    Поток, который строит CsvIndex: один последовательный проход по файлу
+    без разбора значений. Найденные ряды сразу становятся доступны в таблице.
+    Индекс триграмм для поиска строится потом отдельно (TrigramIndexer), чтобы окно его не ждало.
+
+    Атрибуты
+    ------
+    index : CsvIndex
+        Заполняемый индекс.
+    rows_indexed : pyqtSignal
+        Количество рядов, для которых уже известны границы.
+    progress : pyqtSignal
+        Процент проиндексированного файла.
+    failed : pyqtSignal
+        Испускается с текстом ошибки, если файл не удалось дочитать.
+    complete : bool
+        True, если файл был проиндексирован до конца.
+
+    Методы
+    ------
+    run() :
+        Индексирует файл. Останавливается, если вызван requestInterruption().
+    """
+
+    rows_indexed = pyqtSignal(int)
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, index: CsvIndex, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.complete = False
+
+    def run(self):
+        size = len(self.index.mm) or 1
+        try:
+            for pos in self.index.build():
+                if self.isInterruptionRequested():
+                    return
+                self.rows_indexed.emit(len(self.index))
+                self.progress.emit(int(pos * 100 / size))
+            self.complete = True
+        except OSError as e:
+            self.failed.emit(f'Ошибка чтения файла: {e}')
+
+
+class TrigramIndexer(QThread):
+    """
+    Поток, который строит индекс триграмм csv файла (CsvIndex.trigrams) после того, как найдены границы рядов.
+    Пока индекс не готов, поиск работает и без него, просматривая весь файл.
+    Битовые карты подключаются к индексу только в конце построения, поэтому поиск можно вызывать в любой момент
+
+    Атрибуты
+    ------
+    index : CsvIndex
+        Индекс файла.
+    complete : bool
+        True, если индекс триграмм построен.
+
+    Методы
+    ------
+    run() :
+        Строит индекс. Останавливается, если вызван requestInterruption().
+    """
+
+    def __init__(self, index: CsvIndex, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.complete = False
+
+    def run(self):
+        try:
+            for _ in self.index.trigrams.build():
+                if self.isInterruptionRequested():
+                    return
+            self.complete = True
+        except OSError:
+            # Без индекса триграмм поиск тоже работает, просто просматривает весь файл
+            pass
+
+
+class CsvPoolLoader(QThread):
+    """
+    Поток, который читает несколько csv файлов параллельно в пуле процессов (ProcessPoolExecutor),
+    по процессу на файл, но не больше, чем ядер процессора. Каждый процесс выполняет функцию
+    из csv_pool и возвращает результат через pickle; о каждом готовом файле поток сообщает сразу,
+    не дожидаясь остальных.
+    Процессы запускаются через spawn: fork процесса, в котором уже работают потоки Qt, небезопасен.
+
+    Атрибуты
+    ------
+    jobs : list
+        Пары (функция из csv_pool, аргументы) - по одной на файл.
+    file_loaded : pyqtSignal
+        Номер файла в jobs, результат функции и время её работы в процессе (в секундах).
+    progress : pyqtSignal
+        Процент прочитанных файлов.
+    failed : pyqtSignal
+        Испускается с текстом ошибки, если файл не удалось прочитать.
+    complete : bool
+        True, если все файлы обработаны.
+
+    Методы
+    ------
+    run() :
+        Раздаёт файлы процессам и ждёт результатов. Останавливается, если вызван requestInterruption():
+        ещё не начатые файлы отменяются, а уже читающиеся дочитываются процессами, но не подключаются.
+    """
+
+    file_loaded = pyqtSignal(int, object, float)
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, jobs: list[tuple], parent=None):
+        super().__init__(parent)
+        self.jobs = jobs
+        self.complete = False
+
+    def run(self):
+        workers = max(min(len(self.jobs), os.cpu_count() or 1), 1)
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            futures = {pool.submit(function, *args): i for i, (function, args) in enumerate(self.jobs)}
+            pending = set(futures)
+            while pending:
+                if self.isInterruptionRequested():
+                    return
+                done, pending = wait(pending, timeout=POOL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    number = futures[future]
+                    path = self.jobs[number][1][0]
+                    try:
+                        result, seconds = future.result()
+                    except UnicodeError:
+                        self.failed.emit(f'{path}: невозможно прочитать файл в данной кодировке')
+                    except csv.Error as e:
+                        self.failed.emit(f'{path}: ошибка в csv файле: {e}')
+                    except (OSError, BrokenProcessPool) as e:
+                        self.failed.emit(f'{path}: ошибка чтения файла: {e}')
+                    else:
+                        self.file_loaded.emit(number, result, seconds)
+                self.progress.emit(int((len(self.jobs) - len(pending)) * 100 / len(self.jobs)))
+            self.complete = True
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class QueryWorker(QThread):
+    """
+    Поток, выполняющий SQL запрос через собственное соединение с БД, чтобы окно не зависало.
+    Запрос можно прервать методом cancel() (Connection.interrupt()).
+    Результат читается из курсора запроса порциями через fetchmany(): первая порция - сразу,
+    следующие - только когда окно попросит их методом request_more() (при прокрутке таблицы).
+    Пока результат не дочитан, курсор остаётся открытым в этом потоке.
+
+    Атрибуты
+    ------
+    path : str
+        Путь к файлу БД.
+    sql : str
+        Текст запроса.
+    steps : int
+        Количество шагов виртуальной машины SQLite, выполненных запросом.
+    elapsed : float
+        Время выполнения запроса вместе с чтением первой порции (в секундах).
+    rows_changed : int
+        Количество рядов, изменённых запросом (по total_changes).
+    rows_returned : int
+        Количество прочитанных рядов результата.
+    plan : list
+        План запроса (EXPLAIN QUERY PLAN): кортежи (id, parent, notused, detail).
+    modified_tables : set
+        Таблицы, которые запрос изменяет (собираются через set_authorizer).
+    cancelled : bool
+        True, если запрос был отменён.
+    error : str | None
+        Текст ошибки, если запрос не удалось выполнить.
+    plan_ready : pyqtSignal
+        План запроса, полученный до его выполнения.
+    columns_ready : pyqtSignal
+        Названия столбцов результата (из cursor.description).
+    rows_ready : pyqtSignal
+        Очередная порция рядов результата.
+    exhausted : pyqtSignal
+        Испускается, когда результат дочитан до конца.
+    executed : pyqtSignal
+        Испускается, когда запрос выполнен и первая порция рядов передана.
+    progress : pyqtSignal
+        Прошедшее время (в секундах) и количество выполненных шагов.
+    failed : pyqtSignal
+        Испускается с текстом ошибки.
+
+    Методы
+    ------
+    run() :
+        Выполняет запрос и передаёт результат порциями.
+    explain() :
+        Получает план запроса.
+    full_scan() :
+        Проверяет, есть ли в плане полный просмотр таблицы.
+    request_more() :
+        Просит прочитать следующую порцию рядов.
+    authorize() :
+        Обработчик set_authorizer, запоминающий изменяемые таблицы.
+    cancel() :
+        Прерывает запрос и закрывает курсор.
+    """
+
+    plan_ready = pyqtSignal(list)
+    columns_ready = pyqtSignal(list)
+    rows_ready = pyqtSignal(list)
+    exhausted = pyqtSignal()
+    executed = pyqtSignal()
+    progress = pyqtSignal(float, int)
+    failed = pyqtSignal(str)
+
+    # Действия, о которых SQLite сообщает через set_authorizer, и номер аргумента с названием таблицы
+    WRITE_ACTIONS = {sqlite3.SQLITE_INSERT: 0, sqlite3.SQLITE_UPDATE: 0, sqlite3.SQLITE_DELETE: 0,
+                     sqlite3.SQLITE_DROP_TABLE: 0, sqlite3.SQLITE_ALTER_TABLE: 1}
+
+    def __init__(self, path: str, sql: str, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.sql = sql
+        self.con = None
+        self.requests = queue.Queue()
+        self.steps = 0
+        self.elapsed = 0.0
+        self.rows_changed = 0
+        self.rows_returned = 0
+        self.plan = list()
+        self.modified_tables = set()
+        self.page_rows = list()
+        self.cancelled = False
+        self.error = None
+        self.started_at = 0.0
+        self.reported_at = 0.0
+
+    def run(self):
+        self.started_at = self.reported_at = time.perf_counter()
+        try:
+            self.con = sqlite3.connect(self.path)
+            self.con.set_progress_handler(self.on_progress, PROGRESS_STEPS)
+            if self.cancelled:
+                raise sqlite3.OperationalError('interrupted')
+            self.explain()
+            # Таблицы собираются только при подготовке самого запроса, а не EXPLAIN
+            self.con.set_authorizer(self.authorize)
+            cur = self.con.execute(self.sql)
+            description = cur.description
+            rows = cur
+            if self.modified_tables:
+                # Запрос изменяет БД (например, INSERT ... RETURNING): его ряды дочитываются сразу,
+                # чтобы зафиксировать изменения и не держать блокировку записи, пока окно их листает
+                rows = iter(cur.fetchall() if description is not None else [])
+                self.con.commit()
+            if description is not None:
+                self.columns_ready.emit([x[0] for x in description])
+            self.page(rows)
+            self.elapsed = time.perf_counter() - self.started_at
+            self.rows_changed = self.con.total_changes
+            self.executed.emit()
+            # Ждём, пока окно попросит следующую порцию. False в очереди - запрос отменён
+            while description is not None and len(self.page_rows) == QUERY_CHUNK and self.requests.get():
+                self.page(rows)
+            self.exhausted.emit()
+            self.con.commit()
+        except sqlite3.Error as e:
+            self.error = 'Запрос отменён' if self.cancelled else str(e)
+        finally:
+            self.progress.emit(time.perf_counter() - self.started_at, self.steps)
+            if self.con is not None:
+                self.con.close()
+        if self.error is not None:
+            self.failed.emit(self.error)
+
+    def explain(self):
+        try:
+            self.plan = self.con.execute('EXPLAIN QUERY PLAN ' + self.sql).fetchall()
+        except sqlite3.Error:
+            # Ошибку в самом запросе покажет его выполнение
+            self.plan = []
+        self.plan_ready.emit([list(x) for x in self.plan])
+
+    def full_scan(self) -> bool:
+        return any(is_full_scan(x[-1]) for x in self.plan)
+
+    def page(self, rows):
+        """
+        :param rows: Курсор запроса или итератор уже прочитанных рядов
+        """
+
+        self.page_rows = list(islice(rows, QUERY_CHUNK))
+        self.rows_returned += len(self.page_rows)
+        if self.page_rows:
+            self.rows_ready.emit([list(x) for x in self.page_rows])
+
+    def request_more(self):
+        self.requests.put(True)
+
+    def authorize(self, action: int, arg1, arg2, db_name, trigger) -> int:
+        if action in self.WRITE_ACTIONS:
+            self.modified_tables.add(str((arg1, arg2)[self.WRITE_ACTIONS[action]]).lower())
+        return sqlite3.SQLITE_OK
+
+    def on_progress(self) -> int:
+        """
+        Вызывается SQLite во время выполнения запроса
+        :return: 0, чтобы запрос продолжал выполняться
+        """
+
+        self.steps += PROGRESS_STEPS
+        now = time.perf_counter()
+        if now - self.reported_at >= PROGRESS_INTERVAL:
+            self.reported_at = now
+            self.progress.emit(now - self.started_at, self.steps)
+        return 0
+
+    def cancel(self):
+        self.cancelled = True
+        self.requests.put(False)
+        try:
+            if self.con is not None:
+                self.con.interrupt()
+        except sqlite3.ProgrammingError:
+            # Запрос уже выполнен и соединение закрыто
+            pass
+
+
+class CsvImporter(QThread):
+    """
+    Поток, который загружает csv файлы в таблицы новой БД SQLite, чтобы к ним можно было писать SQL запросы.
+    Соединение с БД открывается в самом потоке, окно потом открывает свое.
+
+    Атрибуты
+    ------
+    db_path : str
+        Путь к файлу БД.
+    sources : list
+        Пары (путь к csv файлу, название таблицы).
+    delimiter : str
+        Разделитель csv файлов.
+    encoding : str
+        Кодировка csv файлов.
+    progress : pyqtSignal
+        Процент загруженного текущего файла.
+    rows_imported : pyqtSignal
+        Количество рядов, загруженных из текущего файла.
+    failed : pyqtSignal
+        Испускается с текстом ошибки, если файл не удалось загрузить.
+    complete : bool
+        True, если все файлы были загружены.
+
+    Методы
+    ------
+    run() :
+        Загружает файлы. Если вызван requestInterruption(), загрузка текущего файла отменяется.
+    """
+
+    progress = pyqtSignal(int)
+    rows_imported = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_path: str, sources: list[tuple[str, str]], delimiter: str, encoding: str, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.sources = sources
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.complete = False
+
+    def on_batch(self, count: int, done: float):
+        if self.isInterruptionRequested():
+            raise InterruptedError
+        self.rows_imported.emit(count)
+        self.progress.emit(int(done * 100))
+
+    def run(self):
+        con = sqlite3.connect(self.db_path)
+        try:
+            for path, table in self.sources:
+                import_csv(con, path, table, self.encoding, self.delimiter, self.on_batch)
+            self.complete = True
+        except InterruptedError:
+            pass
+        except UnicodeError:
+            self.failed.emit('Невозможно прочитать файл в данной кодировке')
+        except (OSError, ValueError, csv.Error, sqlite3.Error) as e:
+            self.failed.emit(f'Не удалось загрузить csv файл в БД\n{e}')
+        finally:
+            con.close()
+        self.progress.emit(100)
+
+
+class SearchIndexer(QThread):
+    """
+    Поток, который строит полнотекстовый индекс (FTS5) таблицы БД во временной БД поиска
+    через собственное соединение (см. build_fts()).
+
+    Атрибуты
+    ------
+    path : str
+        Путь к открытой БД.
+    search_path : str
+        Путь к временной БД с индексами.
+    table : str
+        Название таблицы.
+    name : str
+        Название индекса во временной БД.
+    titles : list
+        Названия столбцов таблицы.
+    progress : pyqtSignal
+        Процент проиндексированных рядов.
+    failed : pyqtSignal
+        Испускается с текстом ошибки, если индекс не удалось построить.
+    complete : bool
+        True, если индекс построен.
+
+    Методы
+    ------
+    run() :
+        Строит индекс. Если вызван requestInterruption(), недостроенный индекс удаляется.
+    """
+
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path: str, search_path: str, table: str, name: str, titles: list[str], parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.search_path = search_path
+        self.table = table
+        self.name = name
+        self.titles = titles
+        self.complete = False
+
+    def run(self):
+        steps = build_fts(self.path, self.search_path, self.table, self.name, self.titles)
+        try:
+            for percent in steps:
+                if self.isInterruptionRequested():
+                    steps.close()
+                    return
+                self.progress.emit(percent)
+            self.complete = True
+        except sqlite3.Error as e:
+            self.failed.emit(f'Не удалось построить индекс для поиска\n{e}')
+
+
+class PlotSampler(QThread):
+    """
+    Поток, который заново прореживает точки линейного графика для видимого диапазона оси X.
+    Запускается после изменения масштаба или сдвига графика, чтобы при приближении
+    появлялись точки, выброшенные при прореживании всего ряда.
+
+    Атрибуты
+    ------
+    x : np.ndarray
+        Все значения по оси X, отсортированные по возрастанию.
+    y : np.ndarray
+        Все значения по оси Y.
+    x_min : float
+        Левая граница видимого диапазона.
+    x_max : float
+        Правая граница видимого диапазона.
+    sampled : pyqtSignal
+        Испускается с прореженными точками (X, Y) и количеством точек в видимом диапазоне.
+
+    Методы
+    ------
+    run() :
+        Прореживает точки. Если вызван requestInterruption(), результат не передаётся.
+    """
+
+    sampled = pyqtSignal(object, object, int)
+
+    def __init__(self, x, y, x_min: float, x_max: float, parent=None):
+        super().__init__(parent)
+        self.x = x
+        self.y = y
+        self.x_min = x_min
+        self.x_max = x_max
+
+    def run(self):
+        x, y = visible_points(self.x, self.y, self.x_min, self.x_max)
+        total = int(self.x.searchsorted(self.x_max, 'right') - self.x.searchsorted(self.x_min, 'left'))
+        if not self.isInterruptionRequested():
+            self.sampled.emit(x, y, total)
+
+
+class PlotPreloader(QThread):
+    """
+    Поток, который заранее загружает seaborn и matplotlib, пока пользователь выбирает файл.
+    Тогда первый график строится без паузы на импорт.
+
+    Атрибуты
+    ------
+    loaded : pyqtSignal
+        Испускается со временем загрузки в секундах.
+
+    Методы
+    ------
+    run() :
+        Импортирует библиотеки для графиков. Если их не удалось импортировать, ошибка появится при построении графика.
+    """
+
+    loaded = pyqtSignal(float)
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            import plotting
+            plotting.preload()
+            import matplotlib.backends.backend_qt5agg
+        except ImportError:
+            return
+        self.loaded.emit(time.perf_counter() - start)
@@ -0,0 +1,160 @@
+import sqlite3
+import time
+import profiling
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+# Через сколько миллисекунд после первого изменения очередь записывается в БД
+FLUSH_INTERVAL = 2000
+
+# Сколько изменений может накопиться в очереди до принудительной записи
+FLUSH_SIZE = 500
+
+
+class PendingRowid:
+    """
+    rowid ряда, INSERT которого ещё стоит в очереди.
+    Подставляется в параметры следующих изменений этого ряда и становится известен при записи очереди.
+    Если INSERT не удался, failed = True, и изменения, которым нужен этот ряд, не выполняются
+    """
+
+    def __init__(self):
+        self.rowid = None
+        self.failed = False
+
+
+class Change:
+    """
+    Одно изменение в очереди. Может состоять из нескольких запросов,
+    которые записываются или отменяются вместе
+
+    Атрибуты
+    ------
+    statements : list
+        Пары (текст запроса, параметры). Параметры могут содержать PendingRowid.
+    description : str
+        Описание изменения для сообщения об ошибке.
+    on_done : callable | None
+        Вызывается с курсором последнего запроса после успешного выполнения изменения.
+    creates : PendingRowid | None
+        rowid ряда, который добавляет это изменение.
+    missing_ok : bool
+        True, если изменение можно выполнить, даже когда ряд, на который оно ссылается,
+        не удалось добавить (например, удаление: такого ряда и так нет в БД).
+
+    Методы
+    ------
+    lost_rows() :
+        Проверяет, ссылается ли изменение на ряд, INSERT которого не удался.
+    """
+
+    def __init__(self, statements: list[tuple[str, list]], description: str, on_done=None,
+                 creates: PendingRowid = None, missing_ok: bool = False):
+        self.statements = statements
+        self.description = description
+        self.on_done = on_done
+        self.creates = creates
+        self.missing_ok = missing_ok
+
+    def lost_rows(self) -> bool:
+        return any(isinstance(x, PendingRowid) and x.failed for _, params in self.statements for x in params)
+
+
+class WriteQueue(QObject):
+    """
+    Очередь изменений БД с отложенной записью.
+    Изменения копятся в памяти и записываются одной транзакцией: по таймеру, при накоплении
+    FLUSH_SIZE изменений или по вызову flush() (Ctrl+S, закрытие окна).
+    Каждое изменение выполняется в своей точке сохранения (SAVEPOINT), поэтому ошибка в одном
+    изменении не отменяет остальные и сообщается отдельно.
+
+    Атрибуты
+    ------
+    con : sqlite3.Connection
+        Соединение с базой данных.
+    changes : list
+        Изменения, ещё не записанные в БД.
+    pending_changed : pyqtSignal
+        Испускается с количеством незаписанных изменений.
+    failed : pyqtSignal
+        Испускается со списком сообщений об изменениях, которые не удалось записать.
+
+    Методы
+    ------
+    add() :
+        Ставит изменение в очередь.
+    add_statements() :
+        Ставит в очередь изменение из нескольких запросов.
+    flush() :
+        Записывает все изменения одной транзакцией.
+    """
+
+    pending_changed = pyqtSignal(int)
+    failed = pyqtSignal(list)
+
+    def __init__(self, con: sqlite3.Connection, parent=None, interval: int = FLUSH_INTERVAL, size: int = FLUSH_SIZE):
+        super().__init__(parent)
+        self.con = con
+        self.size = size
+        self.changes = list()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def add(self, sql: str, params: list, description: str, on_done=None, creates: PendingRowid = None,
+            missing_ok: bool = False):
+        self.add_statements([(sql, params)], description, on_done, creates, missing_ok)
+
+    def add_statements(self, statements: list[tuple[str, list]], description: str, on_done=None,
+                       creates: PendingRowid = None, missing_ok: bool = False):
+        self.changes.append(Change(statements, description, on_done, creates, missing_ok))
+        self.pending_changed.emit(len(self.changes))
+        if len(self.changes) >= self.size:
+            self.flush()
+        elif not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self) -> bool:
+        """
+        :return: True, если все изменения записаны
+        """
+
+        self.timer.stop()
+        if not self.changes:
+            return True
+        changes, self.changes = self.changes, []
+        errors = list()
+        start = time.perf_counter()
+        try:
+            if not self.con.in_transaction:
+                self.con.execute('BEGIN')
+            for change in changes:
+                if not change.missing_ok and change.lost_rows():
+                    # Без rowid запрос не нашёл бы ни одного ряда, и изменение молча пропало бы
+                    errors.append(f'{change.description}: ряд не был добавлен в БД')
+                    continue
+                self.con.execute('SAVEPOINT change')
+                try:
+                    for sql, params in change.statements:
+                        cur = self.con.execute(sql, [x.rowid if isinstance(x, PendingRowid) else x for x in params])
+                except sqlite3.Error as e:
+                    self.con.execute('ROLLBACK TO change')
+                    errors.append(f'{change.description}: {e}')
+                    if change.creates is not None:
+                        change.creates.failed = True
+                else:
+                    if change.on_done is not None:
+                        change.on_done(cur)
+                self.con.execute('RELEASE change')
+            self.con.commit()
+        except sqlite3.Error as e:
+            # Не удалось записать транзакцию целиком (например, БД заблокирована) - оставляем всё в очереди
+            if self.con.in_transaction:
+                self.con.rollback()
+            self.changes = changes + self.changes
+            errors = [f'{change.description}: {e}' for change in changes]
+        profiling.record('db_commit', time.perf_counter() - start, changes=len(changes), errors=len(errors))
+        self.pending_changed.emit(len(self.changes))
+        if errors:
+            self.failed.emit(errors)
+        return not errors